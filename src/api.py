@@ -1,14 +1,20 @@
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import os
 import time
+import asyncio
+import uuid
+import base64
+import mimetypes
 import logging
 
 # Importo la logica de workflow y la configuración 
 from . import main as workflow
 from . import config
+from . import llm_cache
+from . import llm_policy
 
 # --- Establezco logging
 logging.basicConfig(
@@ -39,9 +45,72 @@ class ChartRequest(BaseModel):
     instruction: str
 
 
+def _data_url(image: bytes, image_basename: str) -> str:
+    media_type = mimetypes.guess_type(image_basename)[0] or "image/png"
+    return f"data:{media_type};base64,{base64.b64encode(image).decode('ascii')}"
+
+
+def _add_chart_urls(results: dict) -> dict:
+    """
+    Convierte las rutas de archivo locales en URLs públicas bajo /static.
+    Si los gráficos no se guardaron en disco (PERSIST_CHARTS = False), los
+    bytes capturados en memoria se devuelven como data URLs.
+    """
+    images = results.pop("chart_images", None) or {}
+    for version in ("v1", "v2"):
+        path = results.get(f"chart_{version}_path")
+        if not results.get(f"{version}_success"):
+            continue
+        if path:
+            results[f"chart_{version}_url"] = f"/static/{os.path.basename(path)}"
+        elif images.get(version) is not None:
+            results[f"chart_{version}_url"] = _data_url(images[version], f"chart_{version}.png")
+    return results
+
+
+def _sweep_charts(now: float | None = None) -> int:
+    """
+    Borra los gráficos de la API que superan API_CHART_RETENTION_SECONDS y,
+    después, los más antiguos que excedan API_CHART_MAX_FILES. Solo toca los
+    archivos con el prefijo API_IMAGE_BASENAME. Devuelve cuántos se borraron.
+    """
+    now = time.time() if now is None else now
+    prefix = f"{config.API_IMAGE_BASENAME}_"
+    try:
+        with os.scandir(config.CHARTS_DIR) as entries:
+            charts = [(entry.stat().st_mtime, entry.path) for entry in entries
+                      if entry.is_file() and entry.name.startswith(prefix)]
+    except OSError as e:
+        logger.warning(f"Lumina API Warning: Could not list charts for cleanup: {e}")
+        return 0
+
+    charts.sort()
+    expired = []
+    if config.API_CHART_RETENTION_SECONDS is not None:
+        expired = [path for mtime, path in charts if now - mtime > config.API_CHART_RETENTION_SECONDS]
+    kept = len(charts) - len(expired)
+    if config.API_CHART_MAX_FILES is not None and kept > config.API_CHART_MAX_FILES:
+        expired += [path for _, path in charts[len(expired):len(expired) + kept - config.API_CHART_MAX_FILES]]
+
+    removed = 0
+    for path in expired:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass  # Otro worker lo borró antes
+        except OSError as e:
+            logger.warning(f"Lumina API Warning: Could not remove chart {path}: {e}")
+    if removed:
+        logger.info(f"Lumina API: Removed {removed} expired chart files.")
+    return removed
+
+
 # 4. Definir el endpoint principal de la API
+# Es asíncrono: mientras el workflow espera al LLM no ocupa ningún hilo del
+# threadpool, así un solo proceso mantiene cientos de peticiones en vuelo.
 @app.post("/generate-chart/")
-def generate_chart_endpoint(request: ChartRequest):
+async def generate_chart_endpoint(request: ChartRequest):
     """
     Ejecuta el workflow completo para generar y refinar un gráfico.
 
@@ -64,22 +133,19 @@ def generate_chart_endpoint(request: ChartRequest):
     )
 
     try:
-        # Llama a la función refactorizada del workflow, que ahora es más simple
-        results = workflow.run_workflow(
+        # Llama a la versión asíncrona del workflow
+        results = await workflow.run_workflow_async(
             user_instructions=request.instruction,
             generation_model=config.GENERATION_MODEL,
             reflection_model=config.REFLECTION_MODEL,
-            image_basename=config.API_IMAGE_BASENAME,
+            # Nombre único por petición: con varias peticiones en vuelo no se pisan los archivos
+            image_basename=f"{config.API_IMAGE_BASENAME}_{uuid.uuid4().hex[:12]}",
         )
 
         # Convierte las rutas de archivo locales en URLs públicas
-        if results.get("chart_v1_path") and results.get("v1_success"):
-            v1_filename = os.path.basename(results["chart_v1_path"])
-            results["chart_v1_url"] = f"/static/{v1_filename}"
-
-        if results.get("chart_v2_path") and results.get("v2_success"):
-            v2_filename = os.path.basename(results["chart_v2_path"])
-            results["chart_v2_url"] = f"/static/{v2_filename}"
+        results = _add_chart_urls(results)
+        # Los nombres únicos por petición no se reutilizan: se borran los antiguos
+        await asyncio.to_thread(_sweep_charts)
 
         processing_time = time.time() - start_time
         logger.info(
@@ -96,6 +162,51 @@ def generate_chart_endpoint(request: ChartRequest):
         raise
 
 
+# Formatos admitidos al volver a renderizar un gráfico
+RENDER_FORMATS = ("png", "jpg", "svg", "pdf")
+
+
+# Re-renderizado del gráfico final con otra resolución o formato
+@app.get("/charts/{chart_id}/render")
+async def render_chart_endpoint(
+    chart_id: str,
+    dpi: int | None = Query(default=None, ge=10, le=600),
+    format: str = Query(default="png"),
+):
+    """
+    Vuelve a renderizar el gráfico V2 de una petición anterior (sin llamar al
+    LLM), por ejemplo a más resolución para descargarlo o imprimirlo.
+
+    Args:
+        chart_id: El "chart_id" devuelto por /generate-chart/.
+        dpi: Resolución (por defecto la del perfil final).
+        format: Formato de la imagen: png, jpg, svg o pdf.
+
+    Returns:
+        La imagen, con su tipo MIME. 404 si el chart_id no se conoce.
+    """
+    if format not in RENDER_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(RENDER_FORMATS)}")
+    image = await workflow.rerender_chart_async(chart_id, dpi=dpi, image_format=format)
+    if image is None:
+        raise HTTPException(status_code=404, detail=f"Chart '{chart_id}' not found or could not be rendered")
+    media_type = mimetypes.guess_type(f"chart.{format}")[0] or "application/octet-stream"
+    return Response(content=image, media_type=media_type)
+
+
+# Métricas de las llamadas al LLM de este proceso
+@app.get("/metrics/llm")
+def llm_metrics():
+    """
+    Devuelve las métricas de la política de llamadas (por modelo) y de la caché
+    de respuestas del LLM.
+
+    Returns:
+        Un diccionario {"policy": {...}, "cache": {...}}.
+    """
+    return {"policy": llm_policy.get_metrics(), "cache": llm_cache.get_cache_stats()}
+
+
 # Endpoint raíz para verificar que la API está funcionando
 @app.get("/")
 def read_root():
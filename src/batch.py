@@ -0,0 +1,252 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Ejecutar muchas instrucciones en lote: lee un JSONL/CSV de instrucciones,
+# carga el dataset una sola vez, ejecuta los workflows asíncronos con
+# concurrencia acotada, guarda resultados y gráficos por elemento, permite
+# reanudar un lote interrumpido y resume el rendimiento al final.
+#
+# Uso:
+#   python -m src.batch instrucciones.jsonl --output outputs/batch/informe --concurrency 8
+#   python -m src.batch instrucciones.csv --output outputs/batch/informe --resume
+# =============================================================================
+
+import re
+import csv
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+from . import config
+from . import data_processing
+from . import exec_pool
+from . import main as workflow
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+RESULTS_FILENAME = "results.jsonl"
+SUMMARY_FILENAME = "summary.json"
+# Campos del resultado del workflow que se guardan por elemento
+_RESULT_FIELDS = (
+    "status", "v1_success", "v2_success", "chart_v1_path", "chart_v2_path", "feedback", "memo", "message", "profile",
+)
+
+
+def _item_id(raw_id, index: int) -> str:
+    """Identificador del elemento apto para nombres de archivo."""
+    item_id = str(raw_id) if raw_id not in (None, "") else f"{index:05d}"
+    return re.sub(r"[^\w.-]", "_", item_id)
+
+
+def load_instructions(path: str) -> list[dict]:
+    """
+    Lee las instrucciones del lote.
+
+    - JSONL: una instrucción por línea, como cadena JSON o como objeto con
+      "instruction" y opcionalmente "id".
+    - CSV: columna "instruction" y opcionalmente "id".
+
+    Sin "id", el identificador es la posición (00001, 00002...), así que para
+    reanudar un lote el archivo no debe reordenarse.
+
+    Returns:
+        Una lista de {"id": str, "instruction": str}.
+
+    Raises:
+        ValueError: Si falta la instrucción o hay identificadores repetidos.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items, seen = [], set()
+    for index, row in enumerate(rows, start=1):
+        if isinstance(row, str):
+            row = {"instruction": row}
+        instruction = (row.get("instruction") or "").strip()
+        if not instruction:
+            raise ValueError(f"Elemento {index} de {path.name} sin instrucción.")
+        item_id = _item_id(row.get("id"), index)
+        if item_id in seen:
+            raise ValueError(f"Identificador repetido en {path.name}: {item_id}")
+        seen.add(item_id)
+        items.append({"id": item_id, "instruction": instruction})
+    return items
+
+
+def _load_results(results_path: Path) -> dict[str, dict]:
+    """Resultados ya escritos por elemento (la última línea de cada id gana)."""
+    done = {}
+    if results_path.exists():
+        with open(results_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Última línea a medias de un lote interrumpido
+                done[record["id"]] = record
+    return done
+
+
+def _percentiles(latencies: list[float]) -> dict:
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+
+async def _run_item(item: dict, charts_dir: Path, semaphore: asyncio.Semaphore, models: tuple[str, str]) -> dict:
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            results = await workflow.run_workflow_async(
+                item["instruction"], *models, image_basename=item["id"], output_dir=str(charts_dir),
+                persist_charts=True, use_data_cache=True,
+            )
+        except Exception as e:
+            logger.exception(f"Lumina Batch Error: Item {item['id']} raised an exception.")
+            results = {"status": "Exception", "message": f"{type(e).__name__}: {e}"}
+        latency = time.perf_counter() - start
+
+    record = {"id": item["id"], "instruction": item["instruction"], "latency_s": round(latency, 3)}
+    record.update({field: results[field] for field in _RESULT_FIELDS if field in results})
+    return record
+
+
+async def run_batch(
+    items: list[dict],
+    output_dir: str,
+    concurrency: int | None = None,
+    resume: bool = False,
+    retry_failed: bool = False,
+    generation_model: str | None = None,
+    reflection_model: str | None = None,
+) -> dict:
+    """
+    Ejecuta un lote de instrucciones con concurrencia acotada.
+
+    Los gráficos se guardan en `<output_dir>/charts/<id>_v1.png` / `_v2.png` y
+    cada elemento terminado se añade a `<output_dir>/results.jsonl` en cuanto
+    acaba, de modo que un lote interrumpido conserva lo ya hecho.
+
+    Args:
+        items: Elementos de `load_instructions`.
+        output_dir: Directorio del lote.
+        concurrency: Workflows simultáneos (por defecto BATCH_CONCURRENCY).
+        resume: Omitir los elementos que ya tienen resultado.
+        retry_failed: Al reanudar, repetir los que no terminaron en "Completed".
+        generation_model: Modelo de generación (por defecto GENERATION_MODEL).
+        reflection_model: Modelo de reflexión (por defecto REFLECTION_MODEL).
+
+    Returns:
+        El resumen del lote (también se guarda en `<output_dir>/summary.json`).
+    """
+    concurrency = concurrency or config.BATCH_CONCURRENCY
+    models = (generation_model or config.GENERATION_MODEL, reflection_model or config.REFLECTION_MODEL)
+    output_dir = Path(output_dir)
+    charts_dir = output_dir / "charts"
+    charts_dir.mkdir(parents=True, exist_ok=True)
+    results_path = output_dir / RESULTS_FILENAME
+
+    done = _load_results(results_path) if resume else {}
+    if not resume and results_path.exists():
+        results_path.unlink()
+    pending = [
+        item for item in items
+        if item["id"] not in done or (retry_failed and done[item["id"]].get("status") != "Completed")
+    ]
+    logger.info(f"Lumina Batch: {len(pending)} items to run, {len(items) - len(pending)} already done, concurrency {concurrency}.")
+
+    # El dataset se carga una sola vez: todos los workflows lo reciben de la caché de datos.
+    # Los gráficos del lote siempre se guardan en disco.
+    df = await asyncio.to_thread(data_processing.load_configured_data, True)
+    if config.EXECUTION_MODE == "pool" and df is not None and not df.empty:
+        # Los trabajadores reciben el dataset antes del primer trabajo
+        aggs = data_processing.get_aggregate_cube(df) if config.AGGREGATE_CUBE_ENABLED else None
+        await asyncio.to_thread(exec_pool.get_pool().preload, df, aggs)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    records = []
+    with open(results_path, "a", encoding="utf-8") as results_file:
+        tasks = [asyncio.ensure_future(_run_item(item, charts_dir, semaphore, models)) for item in pending]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                record = await finished
+                records.append(record)
+                results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                results_file.flush()
+                logger.info(f"Lumina Batch: [{len(records)}/{len(pending)}] {record['id']} -> {record['status']} ({record['latency_s']}s)")
+        finally:
+            for task in tasks:
+                task.cancel()
+    wall_time = time.perf_counter() - start
+
+    statuses = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    summary = {
+        "items": len(items),
+        "run": len(records),
+        "skipped": len(items) - len(pending),
+        "statuses": statuses,
+        "concurrency": concurrency,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_per_min": round(len(records) / wall_time * 60, 2) if wall_time > 0 else None,
+        "latency_s": _percentiles([record["latency_s"] for record in records]),
+    }
+    (output_dir / SUMMARY_FILENAME).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    return summary
+
+
+def _format_summary(summary: dict) -> str:
+    latency = summary["latency_s"]
+    statuses = ", ".join(f"{status}: {count}" for status, count in summary["statuses"].items()) or "-"
+    return "\n".join([
+        "--- LUMINA BATCH RESUMEN ---",
+        f"Elementos: {summary['items']} (ejecutados {summary['run']}, omitidos {summary['skipped']})",
+        f"Estados: {statuses}",
+        f"Tiempo total: {summary['wall_time_s']}s con concurrencia {summary['concurrency']}",
+        f"Rendimiento: {summary['throughput_per_min']} workflows/min",
+        f"Latencia por workflow (s): p50 {latency['p50']}, p95 {latency['p95']}, p99 {latency['p99']}",
+    ])
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(description="Ejecuta un lote de instrucciones de Lumina AI Workflow.")
+    parser.add_argument("instructions", help="Archivo JSONL o CSV con las instrucciones")
+    parser.add_argument("--output", required=True, help="Directorio del lote (resultados y gráficos)")
+    parser.add_argument("--concurrency", type=int, default=config.BATCH_CONCURRENCY, help="Workflows simultáneos")
+    parser.add_argument("--resume", action="store_true", help="Omitir los elementos que ya tienen resultado")
+    parser.add_argument("--retry-failed", action="store_true", help="Con --resume, repetir los que no terminaron en Completed")
+    parser.add_argument("--generation-model", default=config.GENERATION_MODEL)
+    parser.add_argument("--reflection-model", default=config.REFLECTION_MODEL)
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(run_batch(
+        load_instructions(args.instructions),
+        args.output,
+        concurrency=args.concurrency,
+        resume=args.resume,
+        retry_failed=args.retry_failed,
+        generation_model=args.generation_model,
+        reflection_model=args.reflection_model,
+    ))
+    print(_format_summary(summary))
+    return summary
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger("openai").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("matplotlib").setLevel(logging.WARNING)
+    main()
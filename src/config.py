@@ -6,6 +6,8 @@
 # el usuario.
 # =============================================================================
 
+import os
+import hashlib
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -37,9 +39,266 @@ REFLECTION_MODEL = "o4-mini-2025-04-16"  # Para reflexionar y mejorar
 # Instrucción por defecto para el proceso de generación de gráficos
 DEFAULT_WORKFLOW_INSTRUCTION = "Create a plot comparing Q1 sales in 2024 and 2025."
 
+# ---- MongoDB ----
+# Tamaño de lote del cursor: los documentos se vuelcan por lotes a columnas
+# en lugar de materializar una lista de diccionarios.
+MONGO_BATCH_SIZE = 5000
+# Conexiones máximas del cliente compartido (uno por URI, reutilizado entre peticiones).
+MONGO_MAX_POOL_SIZE = 20
+# Filtro opcional evaluado en el servidor, p. ej. {"cash_type": "card"}.
+MONGO_QUERY = None
+# Rango de fechas opcional [inicio, fin) sobre el campo "date", evaluado en el
+# servidor. Los valores deben tener el mismo tipo que en la colección,
+# p. ej. ("2024-01-01", "2026-01-01").
+MONGO_DATE_RANGE = None
+# Refresco incremental: con la caché activa, solo se leen los documentos cuyo
+# campo marca de agua (high-water mark) supera el último valor visto. El campo
+# debe existir en todos los documentos y crecer de forma monótona ("_id" o un
+# timestamp de actualización).
+MONGO_INCREMENTAL_REFRESH = True
+MONGO_WATERMARK_FIELD = "_id"
+# Campo que identifica un documento dentro del DataFrame. Si se define, las
+# filas que reaparecen en el delta (documentos modificados) se reemplazan en
+# lugar de duplicarse. Con None, el delta solo añade filas nuevas.
+MONGO_KEY_FIELD = None
+
+# ---- Caché de Datos ----
+# Mantiene en memoria el DataFrame ya preparado y solo lo recarga cuando cambia
+# la fuente (mtime/tamaño del CSV o versión de la colección de MongoDB).
+DATA_CACHE_ENABLED = True
+
+# ---- Formato Columnar ----
+# Convierte el CSV una sola vez a un archivo columnar tipado junto al original
+# (<nombre>.lumina.feather/.parquet/.pkl) con las columnas de fecha ya derivadas.
+# Se regenera automáticamente cuando el CSV es más reciente.
+COLUMNAR_SIDECAR_ENABLED = True
+
+# ---- Tipos de Datos ----
+# Reduce la memoria del DataFrame eligiendo el tipo más barato y seguro por
+# columna (categorías para textos repetidos, enteros pequeños para el calendario,
+# float32 cuando no hay pérdida). El esquema que ve el LLM no cambia.
+OPTIMIZE_DTYPES = True
+# Una columna de texto se convierte en categoría si sus valores distintos no
+# superan esta fracción del número de filas ni CATEGORY_MAX_UNIQUES. Con
+# categorías, groupby(observed=False) devuelve también los grupos vacíos, así
+# que solo compensa en columnas de verdad repetitivas.
+CATEGORY_MAX_RATIO = 0.05
+CATEGORY_MAX_UNIQUES = 1000
+
+# ---- Agregados Precalculados ----
+# Al cargar los datos se precalculan sumas, conteos y medias por año/trimestre/mes
+# (y cruzados con cada columna categórica). El código generado los recibe en el
+# diccionario `aggs` junto a `df`.
+AGGREGATE_CUBE_ENABLED = True
+# Las columnas categóricas con más valores distintos que este límite no se cruzan.
+AGGREGATE_MAX_CATEGORIES = 50
+# Columnas numéricas que se suman y promedian. Con None se usan todas salvo los
+# identificadores: enteros con un valor distinto por fila o cuyo nombre acaba
+# en "id" ("transaction id", "customer_id", "OrderID").
+AGGREGATE_MEASURE_COLUMNS = None
+
+# ---- Perfil del Dataset ----
+# El esquema que recibe el LLM incluye valores distintos de las columnas de baja
+# cardinalidad, rangos de fechas, años/trimestres presentes y nulos. Se calcula
+# una vez por versión del dataset. Si es False, solo columnas y tipos.
+SCHEMA_PROFILE_ENABLED = True
+# Las columnas con más valores distintos que este límite no los listan
+SCHEMA_PROFILE_MAX_DISTINCT = 20
+# Presupuesto aproximado de tokens del perfil (sin contar los agregados)
+SCHEMA_PROFILE_TOKEN_BUDGET = 600
+
+# ---- Validación del Código Generado ----
+# Antes de ejecutarlo, el código se analiza con `ast` y se rechaza (con el
+# motivo y la línea) si lee archivos, usa la red o el sistema, llama a
+# plt.show(), recorre df fila a fila o contiene un `while True` sin salida.
+CODE_VALIDATION_ENABLED = True
+# Objetos de código compilados que se guardan en memoria (por contenido)
+COMPILE_CACHE_SIZE = 256
+
+# ---- DataFrames Copy-on-Write ----
+# Cada ejecución recibe una copia perezosa de 'df' (modo copy-on-write de
+# pandas): el código puede añadir columnas o filtrar con inplace=True sin que
+# el V2 (ni el siguiente workflow) vea los cambios del V1, y solo se copian los
+# bloques que el código modifica. El modo copy-on-write es una opción global de
+# pandas: se activa una vez para todo el proceso al importar el ejecutor y
+# afecta a todo su código pandas (encadenar asignaciones como df[col][i] = x
+# deja de modificar 'df').
+DATAFRAME_COPY_ON_WRITE = True
+
+# ---- Perfilado del Código Generado ----
+# Perfila cada ejecución (cProfile, pico de memoria con tracemalloc y tiempo por
+# fases: datos, dibujo y guardado) y deja un resumen en exec_info["profile"].
+# Desactivado por defecto: ralentiza la ejecución y serializa las perfiladas.
+EXEC_PROFILING_ENABLED = False
+# Funciones más costosas (por tiempo propio) que se incluyen en el resumen
+EXEC_PROFILE_TOP_N = 5
+# Guardar además el perfil completo (formato pstats) en EXEC_PROFILE_DIR
+EXEC_PROFILE_DUMP = False
+
+# ---- Poda de Columnas ----
+# Antes de ejecutar el código generado se analiza con `ast` qué columnas de `df`
+# usa, y se ejecuta solo con esas. Si el análisis no es concluyente se usa el
+# DataFrame completo.
+COLUMN_PRUNING_ENABLED = True
+
+# ---- Reducción de Series al Dibujar ----
+# Durante la ejecución del código generado, las líneas (ax.plot) con más puntos
+# que PLOT_POINT_BUDGET se reducen con LTTB o min/max por cubetas, y los
+# scatter con una muestra reservoir. El informe de puntos descartados se
+# devuelve en los resultados del workflow.
+DOWNSAMPLING_ENABLED = True
+PLOT_POINT_BUDGET = 5000
+# "lttb" (conserva la forma) o "minmax" (conserva los picos)
+DOWNSAMPLING_LINE_METHOD = "lttb"
+
+# ---- Gráficos en Memoria ----
+# El savefig del código generado renderiza en un buffer en memoria: los bytes
+# van directamente al reflector y a la respuesta, sin escribir y releer el PNG.
+FIGURE_CAPTURE_ENABLED = True
+# Escribir además los gráficos en CHARTS_DIR (en segundo plano). Con False no
+# se escribe nada en disco y la API devuelve los gráficos como data URLs
+# (sistemas de archivos de solo lectura o efímeros).
+PERSIST_CHARTS = True
+
+# ---- Perfiles de Renderizado ----
+# El executor impone el perfil a cada savefig, pida el código el dpi que pida.
+# "draft": el V1, que solo ve el reflector (el modelo de visión lo reduce a
+# ~1024 px igualmente), con trazados simplificados. "final": el gráfico que se
+# entrega. "rc" son parámetros de matplotlib aplicados durante la ejecución.
+RENDER_PROFILES_ENABLED = True
+RENDER_PROFILES = {
+    "draft": {"dpi": 100, "rc": {"path.simplify": True, "path.simplify_threshold": 1.0}},
+    "final": {"dpi": 300, "rc": {}},
+}
+V1_RENDER_PROFILE = "draft"
+V2_RENDER_PROFILE = "final"
+# Gráficos finales que se pueden volver a renderizar a otra resolución
+# (GET /charts/{chart_id}/render); se guarda su código en memoria.
+RERENDER_CACHE_SIZE = 256
+
+# ---- Renderizado Concurrente ----
+# Figuras de pyplot propias de cada hilo: varias ejecuciones del código generado
+# pueden renderizar a la vez en un mismo proceso. El plt.style.use('<estilo>')
+# del nivel superior se aplica con los rc de la ejecución; el resto del código
+# que cambia los rc (rcParams, plt.rc...) se ejecuta en exclusiva.
+PYPLOT_THREAD_ISOLATION = True
+# Hilos del workflow asíncrono para ejecutar el código generado (en modo
+# "inline"); sin PYPLOT_THREAD_ISOLATION se usa uno solo.
+EXEC_THREADS = 4
+
+# ---- Ejecución del Código Generado ----
+# "inline": en el propio proceso (por defecto).
+# "pool": en un pool de procesos trabajadores precalentados (pandas, matplotlib
+# y el dataset ya cargados), con límite de tiempo y de memoria por trabajo.
+EXECUTION_MODE = "inline"
+EXEC_POOL_SIZE = 2
+# Segundos máximos por trabajo; al superarlos el trabajador se mata y se reemplaza
+EXEC_POOL_TIMEOUT = 30.0
+# Límite del espacio de direcciones de cada trabajador (RLIMIT_AS, solo Unix).
+# Cuenta memoria virtual, no residente: un trabajador vacío ya ocupa ~400 MB.
+# None = sin límite.
+EXEC_POOL_MEMORY_LIMIT_MB = 2048
+# Un trabajador se recicla tras este número de trabajos (fugas de memoria)
+EXEC_POOL_MAX_JOBS_PER_WORKER = 100
+# "forkserver" (recomendado en Unix) o "spawn"
+EXEC_POOL_START_METHOD = "forkserver"
+
+# ---- Dataset Compartido entre Procesos ----
+# Con varios workers de uvicorn, publica el DataFrame preparado una sola vez en
+# un archivo Arrow mapeado en memoria (solo lectura) que todos los workers
+# comparten. Requiere pyarrow, DATA_CACHE_ENABLED = True y
+# DATAFRAME_COPY_ON_WRITE = True (sin él se ignora y se avisa en el log).
+SHARED_DATASET_ENABLED = False
+
+# ---- Cliente OpenAI Asíncrono ----
+# Pool de conexiones HTTP del cliente asíncrono compartido (workflow async y API).
+# Cada workflow en vuelo solo ocupa una conexión mientras espera al modelo.
+OPENAI_MAX_CONNECTIONS = 200
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 50
+OPENAI_KEEPALIVE_EXPIRY = 30.0
+# Tiempo máximo (segundos) de una llamada al modelo
+OPENAI_TIMEOUT = 120.0
+
+# ---- Streaming del LLM ----
+# Las respuestas del generador y del reflector se reciben por streaming: el
+# código se ejecuta en cuanto se cierra </execute_python> y el feedback del
+# reflector se entrega en cuanto llega su línea JSON.
+LLM_STREAMING_ENABLED = True
+
+# ---- Imagen para el Reflector ----
+# El gráfico V1 se envía al modelo de visión reducido y recomprimido en memoria;
+# el PNG a resolución completa del usuario no se modifica.
+VISION_PREPROCESS_ENABLED = True
+# Lado mayor en px. En detalle "high" el modelo reduce el lado corto a 768 px,
+# así que 1024 conserva lo que ve de un gráfico 4:3 con menos bytes.
+VISION_MAX_EDGE = 1024
+# Formato de envío: "png", "jpeg" o "webp" (None conserva el original)
+VISION_IMAGE_FORMAT = "webp"
+VISION_IMAGE_QUALITY = 85
+# Nivel de detalle: "low" (coste fijo, 512 px), "high" o "auto" ("low" si la
+# imagen cabe en 512 px)
+VISION_DETAIL = "auto"
+
+# ---- Política de Llamadas al LLM ----
+# Máximo de peticiones simultáneas por modelo (el resto espera su turno)
+LLM_MAX_CONCURRENCY_PER_MODEL = 16
+# Reintentos ante errores transitorios (conexión, timeout, 429, 5xx) con
+# backoff exponencial con jitter: hasta BASE * 2^intento, acotado por MAX (segundos)
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BASE_DELAY = 0.5
+LLM_RETRY_MAX_DELAY = 8.0
+# Hedging: si una llamada tarda más que el p95 reciente del modelo, se lanza una
+# petición duplicada y gana la primera respuesta. Duplica tokens en la cola lenta.
+LLM_HEDGING_ENABLED = False
+# Retardo usado mientras no haya LLM_HEDGE_MIN_SAMPLES latencias, y retardo mínimo (segundos)
+LLM_HEDGE_DEFAULT_DELAY = 20.0
+LLM_HEDGE_MIN_DELAY = 1.0
+LLM_HEDGE_MIN_SAMPLES = 20
+
+# ---- Transporte del LLM (benchmarks sin red) ----
+# "network" usa la API real. "record" la usa y graba cada petición/respuesta con
+# su latencia en LLM_RECORDINGS_DIR; "replay" sirve lo grabado con esa latencia;
+# "synthetic" devuelve código válido para el esquema del prompt. Se puede elegir
+# con la variable de entorno LUMINA_LLM_TRANSPORT. Para medir el pipeline
+# conviene desactivar la caché de respuestas (LLM_CACHE_ENABLED = False).
+LLM_TRANSPORT = os.getenv("LUMINA_LLM_TRANSPORT", "network")
+# Multiplicador de las latencias reproducidas y sintéticas (0 = sin esperas)
+LLM_TRANSPORT_LATENCY_SCALE = 1.0
+# Latencia sintética log-normal: mediana (segundos) y dispersión
+LLM_TRANSPORT_SYNTHETIC_LATENCY = 2.0
+LLM_TRANSPORT_SYNTHETIC_SIGMA = 0.5
+# Semilla de las latencias sintéticas, para que los benchmarks sean repetibles
+LLM_TRANSPORT_SEED = 0
+
+# ---- Caché de Respuestas del LLM ----
+# Las respuestas se guardan por hash de modelo + prompt + imagen: un prompt
+# repetido se sirve desde memoria (LRU) o desde disco sin llamar a la API.
+LLM_CACHE_ENABLED = True
+LLM_CACHE_MEMORY_ENTRIES = 256
+# Caducidad de las entradas (segundos) y tamaño máximo del nivel en disco (bytes)
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+LLM_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# ---- Memoización de Workflows ----
+# Si una instrucción (normalizada) ya se resolvió con los mismos modelos y el
+# mismo esquema de datos, se reutiliza el resultado sin llamar al LLM: con los
+# mismos datos se sirven los gráficos guardados y, si los datos cambiaron, se
+# re-ejecuta el código V1/V2 guardado.
+WORKFLOW_MEMO_ENABLED = True
+
 # ---- API (gráficos web) ----
 # Nombre base para archivos generados por la API web
 API_IMAGE_BASENAME = "api_chart_comparison"
+# Cada petición escribe sus gráficos con un nombre único; tras cada petición se
+# borran los de la API más antiguos que este número de segundos y, si aun así
+# quedan más de API_CHART_MAX_FILES, los más antiguos. None = sin límite.
+API_CHART_RETENTION_SECONDS = 3600
+API_CHART_MAX_FILES = 1000
+
+# ---- Ejecución en Lote ----
+# Workflows simultáneos por defecto de `python -m src.batch` (--concurrency).
+# Las llamadas al LLM siguen limitadas por LLM_MAX_CONCURRENCY_PER_MODEL.
+BATCH_CONCURRENCY = 8
 
 # =============================================================================
 # CONFIGURACIÓN AUTOMÁTICA (No tocar)
@@ -62,3 +321,24 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 OUTPUTS_DIR = PROJECT_ROOT / "outputs"
 CHARTS_DIR = OUTPUTS_DIR / "charts"
+
+# 3. `SHARED_DATASET_DIR`: Directorio del dataset compartido entre workers.
+#    En Linux se usa /dev/shm (memoria) para que el mapeo no toque el disco.
+_SHM_DIR = Path("/dev/shm")
+SHARED_DATASET_DIR = (
+    _SHM_DIR / f"lumina-{hashlib.sha256(str(PROJECT_ROOT).encode()).hexdigest()[:8]}"
+    if _SHM_DIR.is_dir()
+    else OUTPUTS_DIR / "shared"
+)
+
+# 4. `LLM_CACHE_DIR`: Nivel en disco de la caché de respuestas del LLM.
+LLM_CACHE_DIR = OUTPUTS_DIR / ".llm_cache"
+
+# 5. `WORKFLOW_MEMO_DIR`: Workflows memorizados (código, feedback y gráficos).
+WORKFLOW_MEMO_DIR = OUTPUTS_DIR / ".workflow_memo"
+
+# 6. `LLM_RECORDINGS_DIR`: Peticiones y respuestas grabadas del transporte del LLM.
+LLM_RECORDINGS_DIR = OUTPUTS_DIR / "llm_recordings"
+
+# 7. `EXEC_PROFILE_DIR`: Perfiles completos de las ejecuciones (EXEC_PROFILE_DUMP).
+EXEC_PROFILE_DIR = OUTPUTS_DIR / "profiles"
@@ -4,31 +4,132 @@
 # =============================================================================
 
 import os
+import re
+import atexit
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
+from pathlib import Path
 from pymongo import MongoClient
 from . import config
+from . import shared_dataset
+
+try:
+    import pyarrow  # noqa: F401  Opcional: habilita los formatos Feather y Parquet
+except ImportError:
+    pyarrow = None
 
 # Configurar logger para este módulo
 logger = logging.getLogger(__name__)
 
+# =============================================================================
+# CACHÉ DE PROCESO
+# El DataFrame preparado se guarda una sola vez por proceso. La clave se divide
+# en identidad de la fuente (ruta del CSV o URI/db/colección) y un token de
+# versión (mtime/tamaño o conteo/marca de agua), de modo que solo se recarga
+# cuando la fuente cambia realmente. Las fuentes que lo admiten (MongoDB) se
+# refrescan de forma incremental en lugar de recargarse enteras.
+# =============================================================================
+
+# _cache_lock protege solo el diccionario; la carga se serializa con el lock de
+# su fuente, de modo que leer una fuente no bloquea los aciertos de otra
+_cache_lock = threading.Lock()
+_source_locks: dict = {}
+_data_cache: dict = {"source_id": None, "version": None, "df": None}
+_cache_stats = {"hits": 0, "misses": 0, "reloads": 0, "refreshes": 0}
+
 
-def load_configured_data() -> pd.DataFrame | None:
+def _count(stat: str) -> None:
+    with _cache_lock:
+        _cache_stats[stat] += 1
+
+
+def _cache_lookup(source_id: tuple, version) -> pd.DataFrame | None:
     """
-    Carga datos desde la fuente configurada (MongoDB o CSV).
+    Devuelve una copia superficial del DataFrame en caché si corresponde a
+    esta fuente y versión (contando el acierto), o None.
+    """
+    with _cache_lock:
+        cached = _data_cache["df"]
+        if cached is None or _data_cache["source_id"] != source_id:
+            return None
+        if version is not None and _data_cache["version"] != version:
+            return None
+        _cache_stats["hits"] += 1
+    if version is None:
+        logger.warning("Lumina Data Warning: Source version unknown, serving cached data.")
+    logger.debug("Lumina Data: Cache hit, reusing prepared DataFrame.")
+    return cached.copy(deep=False)
 
-    Utiliza la variable `USE_MONGO_DB` en `config.py` para decidir.
 
-    Args:
-        None: Esta función no toma argumentos directos, ya que su comportamiento
-              se rige por la configuración definida en `config.py` y las variables
-              de entorno para la conexión a MongoDB.
+def get_cache_stats() -> dict:
+    """
+    Devuelve una copia de los contadores de la caché de datos.
 
     Returns:
-        pd.DataFrame | None: Un DataFrame de pandas con los datos cargados y preparados,
-                             o `None` si ocurre un error durante la carga de datos
-                             (por ejemplo, archivo no encontrado, credenciales de MongoDB
-                             faltantes o incorrectas).
+        Un diccionario con las claves 'hits', 'misses', 'reloads' y 'refreshes'
+        (refrescos incrementales).
+    """
+    with _cache_lock:
+        return dict(_cache_stats)
+
+
+def clear_data_cache() -> None:
+    """
+    Vacía la caché de datos y reinicia sus contadores.
+    """
+    with _cache_lock:
+        _data_cache.update(source_id=None, version=None, df=None)
+        for counter in _cache_stats:
+            _cache_stats[counter] = 0
+
+
+def _csv_version_token(csv_path) -> tuple[int, int]:
+    """
+    Token de versión barato para un CSV: (mtime en nanosegundos, tamaño en bytes).
+    """
+    stat = os.stat(csv_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _mongo_version_token(
+    uri: str, db_name: str, collection_name: str, watermark_field: str = "_id"
+) -> tuple | None:
+    """
+    Token de versión para una colección de MongoDB: (número de documentos, marca de agua).
+
+    La marca de agua es el valor máximo de `watermark_field`. Solo se realizan
+    dos consultas ligeras, sin leer los documentos. Devuelve None si no se puede
+    consultar el servidor.
+    """
+    try:
+        collection = _get_mongo_client(uri)[db_name][collection_name]
+        count = collection.estimated_document_count()
+        last = next(
+            iter(collection.find({}, {watermark_field: 1}).sort(watermark_field, -1).limit(1)),
+            None,
+        )
+        return count, last.get(watermark_field) if last else None
+    except Exception as e:
+        logger.warning(f"Lumina Data Warning: Could not read MongoDB version token: {e}")
+        return None
+
+
+def _resolve_source(use_cache: bool):
+    """
+    Determina la fuente configurada (MongoDB o CSV). Sin `use_cache` no se
+    consulta la versión de la fuente (solo la necesita la caché).
+
+    Returns:
+        Una tupla (source_id, version, loader, refresher) o None si la
+        configuración no es válida (el error ya queda registrado).
+        - `loader()` carga y prepara el DataFrame completo.
+        - `refresher(df, previous_version)` devuelve el DataFrame actualizado
+          leyendo solo los cambios, o None si hace falta una recarga completa.
+          Es None para las fuentes que no admiten refresco incremental.
     """
     if config.USE_MONGO_DB:
         logger.debug("Lumina Data: Configuration set to use MongoDB.")
@@ -42,15 +143,69 @@ def load_configured_data() -> pd.DataFrame | None:
             )
             return None
 
-        logger.debug(f"Lumina Data: Loading data from MongoDB: {db_name}.{collection_name}")
-        return load_and_prepare_data_from_mongo(mongo_uri, db_name, collection_name)
+        source_id = (
+            "mongo", mongo_uri, db_name, collection_name,
+            repr(config.MONGO_QUERY), repr(config.MONGO_DATE_RANGE),
+            config.MONGO_WATERMARK_FIELD,
+        )
+        field = config.MONGO_WATERMARK_FIELD
+        version = None
+        if use_cache:
+            version = _mongo_version_token(mongo_uri, db_name, collection_name, field)
+        watermark = version[1] if version else None
+
+        def read(low=None):
+            # La lectura queda acotada a (low, watermark] para que los documentos
+            # insertados durante la lectura no se pierdan ni se dupliquen.
+            bounds = (field, low, watermark) if watermark is not None else None
+            return load_and_prepare_data_from_mongo(
+                mongo_uri,
+                db_name,
+                collection_name,
+                optimize=config.OPTIMIZE_DTYPES and low is None,
+                query=config.MONGO_QUERY,
+                date_range=config.MONGO_DATE_RANGE,
+                watermark=bounds,
+            )
+
+        def loader():
+            logger.debug(f"Lumina Data: Loading data from MongoDB: {db_name}.{collection_name}")
+            return read()
+
+        def refresher(df, previous_version):
+            if not config.MONGO_INCREMENTAL_REFRESH or not previous_version or not version:
+                return None
+            previous_count, previous_watermark = previous_version
+            count = version[0]
+            if previous_watermark is None or watermark is None or count < previous_count:
+                # Colección vacía antes o documentos borrados: hace falta recarga completa
+                return None
+            logger.debug(f"Lumina Data: Refreshing MongoDB data after {field}={previous_watermark}.")
+            delta = read(low=previous_watermark)
+            refreshed = append_rows(df, delta, key_field=config.MONGO_KEY_FIELD)
+            unfiltered = config.MONGO_QUERY is None and config.MONGO_DATE_RANGE is None
+            if unfiltered and count != previous_count + len(refreshed) - len(df):
+                # El conteo no cuadra con las filas añadidas: hubo borrados o el
+                # delta no se pudo leer, así que se recarga todo
+                return None
+            return refreshed
+
+        return source_id, version, loader, refresher
     else:
         logger.debug("Lumina Data: Configuration set to use local CSV.")
         if config.DATA_FILENAME:
             csv_path = config.DATA_DIR / config.DATA_FILENAME
             if csv_path.exists():
-                logger.debug(f"Lumina Data: Loading data from CSV: {csv_path}")
-                return load_and_prepare_data(str(csv_path))
+
+                def loader():
+                    logger.debug(f"Lumina Data: Loading data from CSV: {csv_path}")
+                    return load_and_prepare_data(
+                        str(csv_path),
+                        use_sidecar=config.COLUMNAR_SIDECAR_ENABLED,
+                        optimize=config.OPTIMIZE_DTYPES,
+                    )
+
+                return ("csv", str(csv_path)), _csv_version_token(csv_path), loader, None
             else:
                 logger.error(
                     f"Lumina Data Error: CSV file not found at {csv_path}."
@@ -61,7 +216,592 @@ def load_configured_data() -> pd.DataFrame | None:
             return None
 
 
-def load_and_prepare_data(csv_path: str) -> pd.DataFrame:
+def _dataset_version(source_id: tuple, version) -> str:
+    """
+    Huella corta y estable de una versión concreta de la fuente de datos.
+    """
+    raw = repr((source_id, version)).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def load_configured_data(use_cache: bool | None = None) -> pd.DataFrame | None:
+    """
+    Carga datos desde la fuente configurada (MongoDB o CSV).
+
+    Utiliza la variable `USE_MONGO_DB` en `config.py` para decidir. Si
+    `DATA_CACHE_ENABLED` está activo, el DataFrame preparado se reutiliza entre
+    llamadas y solo se recarga cuando cambia la fuente; con MongoDB se leen
+    únicamente los documentos nuevos (`MONGO_INCREMENTAL_REFRESH`). Cada
+    llamada recibe una copia superficial, de modo que añadir columnas no altera
+    la caché. Con `SHARED_DATASET_ENABLED`, la versión cargada se comparte con
+    los demás procesos a través de `shared_dataset`.
+
+    Args:
+        use_cache: Usar la caché de datos (por defecto `DATA_CACHE_ENABLED`).
+                   El resto del comportamiento se rige por `config.py` y las
+                   variables de entorno para la conexión a MongoDB.
+
+    Returns:
+        pd.DataFrame | None: Un DataFrame de pandas con los datos cargados y preparados,
+                             o `None` si ocurre un error durante la carga de datos
+                             (por ejemplo, archivo no encontrado, credenciales de MongoDB
+                             faltantes o incorrectas).
+    """
+    if use_cache is None:
+        use_cache = config.DATA_CACHE_ENABLED
+    source = _resolve_source(use_cache)
+    if source is None:
+        return None
+    source_id, version, loader, refresher = source
+
+    if not use_cache:
+        return loader()
+
+    hit = _cache_lookup(source_id, version)
+    if hit is not None:
+        return hit
+
+    # La carga se serializa por fuente: el lock global solo protege el diccionario
+    with _cache_lock:
+        source_lock = _source_locks.setdefault(source_id, threading.Lock())
+    with source_lock:
+        # Otro hilo pudo cargar esta versión mientras se esperaba
+        hit = _cache_lookup(source_id, version)
+        if hit is not None:
+            return hit
+        with _cache_lock:
+            cached = _data_cache["df"]
+            same_source = cached is not None and _data_cache["source_id"] == source_id
+            cached_version = _data_cache["version"]
+
+        def build():
+            df = None
+            if same_source and refresher is not None:
+                df = refresher(cached, cached_version)
+                if df is not None:
+                    _count("refreshes")
+                    logger.info(f"Lumina Data: Data source refreshed incrementally ({len(df) - len(cached):+d} rows).")
+
+            if df is None:
+                if same_source:
+                    _count("reloads")
+                    logger.info("Lumina Data: Data source changed, reloading.")
+                else:
+                    _count("misses")
+                df = loader()
+            return df
+
+        dataset_version = _dataset_version(source_id, version)
+        if config.SHARED_DATASET_ENABLED and version is not None and shared_dataset.is_available():
+            # Solo un worker lee la fuente; el resto mapea la versión ya publicada
+            df = shared_dataset.load_or_publish(dataset_version, build)
+        else:
+            df = build()
+
+        if df is None or df.empty:
+            # No se cachean cargas fallidas para reintentar en la próxima llamada
+            return df
+
+        df.attrs["dataset_version"] = dataset_version
+        with _cache_lock:
+            _data_cache.update(source_id=source_id, version=version, df=df)
+        return df.copy(deep=False)
+
+
+# =============================================================================
+# DATOS DERIVADOS POR VERSIÓN
+# Artefactos calculados a partir del DataFrame (agregados, perfiles...) que se
+# guardan junto a la caché, indexados por `df.attrs["dataset_version"]`, para
+# calcularlos una sola vez por versión del dataset.
+# =============================================================================
+
+_DERIVED_CACHE_SIZE = 8
+_derived_lock = threading.Lock()
+_derived_cache: OrderedDict = OrderedDict()
+
+
+def _get_derived(df: pd.DataFrame, kind: str, build):
+    """
+    Devuelve el artefacto `kind` del DataFrame, construyéndolo con `build(df)`
+    solo la primera vez para cada versión del dataset. Los DataFrames sin
+    versión (p. ej. caché desactivada) se calculan siempre.
+    """
+    dataset_version = df.attrs.get("dataset_version")
+    if dataset_version is None:
+        return build(df)
+
+    key = (kind, dataset_version)
+    with _derived_lock:
+        if key in _derived_cache:
+            _derived_cache.move_to_end(key)
+            return _derived_cache[key]
+
+    value = build(df)
+    with _derived_lock:
+        _derived_cache[key] = value
+        while len(_derived_cache) > _DERIVED_CACHE_SIZE:
+            _derived_cache.popitem(last=False)
+    return value
+
+
+def _build_fingerprint(df: pd.DataFrame) -> dict:
+    logical = df.attrs.get("logical_dtypes", {})
+    schema = "\n".join(f"{c}:{logical.get(c, dt)}" for c, dt in df.dtypes.items())
+    content = hashlib.sha256(schema.encode("utf-8"))
+    content.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return {
+        "schema": hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16],
+        "content": content.hexdigest()[:16],
+    }
+
+
+def get_dataset_fingerprint(df: pd.DataFrame) -> dict:
+    """
+    Huella del DataFrame: un hash del esquema (columnas y tipos lógicos) y otro
+    del contenido (esquema + valores de todas las filas). Se calcula una sola
+    vez por versión del dataset.
+
+    Args:
+        df: El DataFrame preparado.
+
+    Returns:
+        Un diccionario {"schema": str, "content": str}.
+    """
+    return _get_derived(df, "fingerprint", _build_fingerprint)
+
+
+# =============================================================================
+# AGREGADOS PRECALCULADOS
+# La mayoría de las instrucciones terminan en un groupby por año/trimestre/mes.
+# Se precalculan una vez por versión del dataset para que el código generado
+# pueda graficar desde tablas pequeñas en lugar de reagrupar todas las filas.
+# =============================================================================
+
+AGGREGATE_KEYS = ("year", "quarter", "month")
+# Nombres de columna de identificadores: "id", "transaction id", "customer_id", "OrderID"
+_ID_NAME = re.compile(r"(?:^|[\s_\-])(?:id|Id|ID)$|[a-z](?:Id|ID)$")
+
+
+def _cube_categories(df: pd.DataFrame) -> list[str]:
+    """
+    Columnas categóricas que se cruzan con las claves de calendario.
+    """
+    categories = []
+    for col in df.columns:
+        if col in AGGREGATE_KEYS:
+            continue
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype) or dtype == object:
+            if df[col].nunique(dropna=True) <= config.AGGREGATE_MAX_CATEGORIES:
+                categories.append(col)
+    return categories
+
+
+def _is_identifier(series: pd.Series) -> bool:
+    """
+    Indica si una columna entera es un identificador (sumarlo no tiene
+    sentido): su nombre acaba en "id" o tiene un valor distinto por fila.
+    """
+    if not pd.api.types.is_integer_dtype(series):
+        return False
+    if _ID_NAME.search(str(series.name)):
+        return True
+    return len(series) > 1 and series.is_unique
+
+
+def _cube_measures(df: pd.DataFrame) -> list[str]:
+    """
+    Columnas numéricas que se suman y promedian en el cubo
+    (AGGREGATE_MEASURE_COLUMNS o, si es None, las que no son identificadores).
+    """
+    if config.AGGREGATE_MEASURE_COLUMNS is not None:
+        return [col for col in config.AGGREGATE_MEASURE_COLUMNS if col in df.columns]
+    return [
+        col for col in df.columns
+        if col not in AGGREGATE_KEYS
+        and pd.api.types.is_numeric_dtype(df[col])
+        and not pd.api.types.is_bool_dtype(df[col])
+        and not _is_identifier(df[col])
+    ]
+
+
+def build_aggregate_cube(df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Precalcula agregados por año, trimestre y mes, solos y cruzados con cada
+    columna categórica de baja cardinalidad.
+
+    Cada tabla es un DataFrame plano con las claves como columnas, `count`
+    (número de filas) y `<columna>_sum` / `<columna>_mean` por cada columna
+    numérica que no sea un identificador (ver `_cube_measures`). Las tablas se nombran `by_year_quarter_month` y
+    `by_year_quarter_month_<categoría>`.
+
+    Args:
+        df: El DataFrame preparado (con 'year', 'quarter' y 'month').
+
+    Returns:
+        Un diccionario {nombre: DataFrame}, vacío si no hay columnas de calendario.
+    """
+    keys = [key for key in AGGREGATE_KEYS if key in df.columns]
+    if not keys:
+        return {}
+
+    numeric = _cube_measures(df)
+
+    cube = {}
+    for extra in [None] + _cube_categories(df):
+        group_keys = keys + ([extra] if extra else [])
+        grouped = df.groupby(group_keys, observed=True, dropna=True)
+        table = grouped.size().rename("count").to_frame()
+        if numeric:
+            stats = grouped[numeric].agg(["sum", "mean"])
+            stats.columns = [f"{col}_{stat}" for col, stat in stats.columns]
+            table = table.join(stats)
+        table = table.reset_index()
+        # Claves de calendario como enteros normales para el código generado
+        for key in keys:
+            table[key] = table[key].astype("int64")
+        cube["by_" + "_".join(group_keys)] = table
+
+    return cube
+
+
+def get_aggregate_cube(df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Devuelve los agregados precalculados del DataFrame, calculándolos solo una
+    vez por versión del dataset.
+
+    Args:
+        df: El DataFrame devuelto por `load_configured_data`.
+
+    Returns:
+        El diccionario de agregados de `build_aggregate_cube`.
+    """
+    return _get_derived(df, "aggregate_cube", build_aggregate_cube)
+
+
+# =============================================================================
+# PERFIL DEL DATASET
+# Además de columnas y tipos, el LLM recibe los valores válidos de las columnas
+# de baja cardinalidad, los rangos de fechas, los años/trimestres presentes y
+# los nulos, para que no invente columnas, categorías ni años. El texto se
+# recorta a un presupuesto de tokens y se calcula una vez por versión del dataset.
+# =============================================================================
+
+# Estimación aproximada de tokens a partir de la longitud del texto
+PROFILE_CHARS_PER_TOKEN = 4
+# Límites de valores listados por columna que se prueban hasta caber en el presupuesto
+_PROFILE_VALUE_LIMITS = (None, 10, 5, 2, 0)
+
+
+def _profile_value(value) -> str:
+    return repr(value) if isinstance(value, str) else str(value)
+
+
+def _profile_stats(df: pd.DataFrame) -> dict:
+    """
+    Estadísticas del perfil por columna: tipo lógico, nulos, rango de fechas y
+    valores distintos (de más a menos frecuente) si la cardinalidad es baja.
+    """
+    logical = df.attrs.get("logical_dtypes", {})
+    nulls = df.isna().sum()
+    has_periods = "year" in df.columns and "quarter" in df.columns
+    columns = {}
+    for col, dtype in df.dtypes.items():
+        stats = {"dtype": logical.get(col, dtype), "nulls": int(nulls[col])}
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            if series.notna().any():
+                stats["range"] = (series.min(), series.max())
+        elif not pd.api.types.is_float_dtype(series) and not (has_periods and col in CALENDAR_COLUMNS):
+            counts = series.value_counts(dropna=True)
+            if len(counts) <= config.SCHEMA_PROFILE_MAX_DISTINCT:
+                stats["values"] = counts.index.tolist()
+        columns[col] = stats
+
+    periods = {}
+    if has_periods:
+        pairs = df[["year", "quarter"]].dropna().drop_duplicates()
+        for year, quarter in sorted(pairs.astype("int64").itertuples(index=False)):
+            periods.setdefault(year, []).append(quarter)
+    return {"columns": columns, "periods": periods}
+
+
+def _render_profile(stats: dict, max_values: int | None, details: bool = True) -> str:
+    """
+    Texto del perfil. `max_values` limita los valores listados por columna
+    (None: todos; 0: solo su número); sin `details` queda el esquema básico.
+    """
+    lines = []
+    for col, info in stats["columns"].items():
+        parts = [f"- {col}: {info['dtype']}"]
+        if details:
+            if "range" in info:
+                start, end = info["range"]
+                parts.append(f"range {start:%Y-%m-%d} to {end:%Y-%m-%d}")
+            if "values" in info:
+                values = info["values"]
+                shown = values if max_values is None else values[:max_values]
+                if shown:
+                    more = f", ... (+{len(values) - len(shown)} more)" if len(shown) < len(values) else ""
+                    parts.append(f"values: {', '.join(map(_profile_value, shown))}{more}")
+                else:
+                    parts.append(f"{len(values)} distinct values")
+            if info["nulls"]:
+                parts.append(f"{info['nulls']} nulls")
+        lines.append("; ".join(parts))
+
+    if details and stats["periods"]:
+        periods = "; ".join(
+            f"{year}: {' '.join(f'Q{q}' for q in quarters)}" for year, quarters in stats["periods"].items()
+        )
+        lines.append(f"Years and quarters present in the data: {periods}")
+    return "\n".join(lines)
+
+
+def build_dataset_profile(df: pd.DataFrame, token_budget: int | None = None) -> str:
+    """
+    Construye el perfil de texto del DataFrame para el LLM, recortado a un
+    presupuesto de tokens.
+
+    Si el perfil completo no cabe, se listan cada vez menos valores por
+    columna; en último caso queda solo el esquema (columnas y tipos), que
+    nunca se recorta.
+
+    Args:
+        df: El DataFrame preparado.
+        token_budget: Tokens máximos (por defecto SCHEMA_PROFILE_TOKEN_BUDGET).
+
+    Returns:
+        Una cadena multilínea con una columna por línea.
+    """
+    token_budget = token_budget or config.SCHEMA_PROFILE_TOKEN_BUDGET
+    stats = _profile_stats(df)
+    for max_values in _PROFILE_VALUE_LIMITS:
+        text = _render_profile(stats, max_values)
+        if len(text) <= token_budget * PROFILE_CHARS_PER_TOKEN:
+            return text
+    logger.warning("Lumina Data Warning: Dataset profile exceeds the token budget; sending the bare schema.")
+    return _render_profile(stats, 0, details=False)
+
+
+def get_dataset_profile(df: pd.DataFrame) -> str:
+    """
+    Devuelve el perfil de `build_dataset_profile`, calculándolo solo una vez
+    por versión del dataset (y presupuesto de tokens).
+
+    Args:
+        df: El DataFrame devuelto por `load_configured_data`.
+
+    Returns:
+        El perfil de texto del DataFrame.
+    """
+    kind = f"profile_{config.SCHEMA_PROFILE_TOKEN_BUDGET}_{config.SCHEMA_PROFILE_MAX_DISTINCT}"
+    return _get_derived(df, kind, build_dataset_profile)
+
+
+# =============================================================================
+# FORMATO COLUMNAR (SIDECAR)
+# Conversión única del CSV a un archivo tipado que ya incluye las columnas de
+# fecha derivadas. Los formatos se prueban del más rápido al más lento y solo
+# se usan los que tienen su dependencia instalada.
+# =============================================================================
+
+SIDECAR_EXTENSIONS = {"feather": "feather", "parquet": "parquet", "pickle": "pkl"}
+
+
+def _available_sidecar_formats() -> list[str]:
+    """
+    Formatos de sidecar disponibles, ordenados del más rápido al más lento.
+    """
+    formats = ["feather", "parquet"] if pyarrow is not None else []
+    return formats + ["pickle"]
+
+
+def _sidecar_path(csv_path: str, fmt: str) -> Path:
+    """
+    Ruta del sidecar para un CSV: `ventas.csv` -> `ventas.lumina.feather`.
+    """
+    path = Path(csv_path)
+    return path.with_name(f"{path.stem}.lumina.{SIDECAR_EXTENSIONS[fmt]}")
+
+
+def _read_sidecar(csv_path: str) -> pd.DataFrame | None:
+    """
+    Lee el sidecar más rápido que exista y no sea más antiguo que el CSV.
+    Devuelve None si no hay ninguno utilizable.
+    """
+    csv_mtime = os.stat(csv_path).st_mtime_ns
+    for fmt in _available_sidecar_formats():
+        path = _sidecar_path(csv_path, fmt)
+        try:
+            if path.stat().st_mtime_ns < csv_mtime:
+                logger.debug(f"Lumina Data: Sidecar {path.name} is stale, ignoring it.")
+                continue
+            if fmt == "feather":
+                df = pd.read_feather(path)
+            elif fmt == "parquet":
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_pickle(path)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.warning(f"Lumina Data Warning: Could not read sidecar {path.name}: {e}")
+            continue
+        df.attrs["source_format"] = fmt
+        return df
+    return None
+
+
+def _write_sidecar(df: pd.DataFrame, csv_path: str, csv_mtime: int) -> str | None:
+    """
+    Escribe el DataFrame preparado en el formato más rápido disponible.
+
+    La escritura es atómica (archivo temporal + `os.replace`) para que otro
+    proceso nunca lea un sidecar a medias. El sidecar hereda el mtime que tenía
+    el CSV al leerlo, así cualquier edición posterior del CSV lo deja obsoleto.
+    Devuelve el formato usado o None.
+    """
+    for fmt in _available_sidecar_formats():
+        path = _sidecar_path(csv_path, fmt)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            if fmt == "feather":
+                df.to_feather(tmp_path)
+            elif fmt == "parquet":
+                df.to_parquet(tmp_path, index=False)
+            else:
+                df.to_pickle(tmp_path)
+            os.utime(tmp_path, ns=(csv_mtime, csv_mtime))
+            os.replace(tmp_path, path)
+            logger.info(f"Lumina Data: Columnar sidecar written to {path} ({fmt}).")
+            return fmt
+        except Exception as e:
+            logger.warning(f"Lumina Data Warning: Could not write {fmt} sidecar: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+    return None
+
+
+def _add_date_parts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte la columna 'date' a datetime y deriva 'quarter', 'month' y 'year'.
+    No hace nada si no existe la columna 'date'.
+    """
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        df["quarter"] = df["date"].dt.quarter
+        df["month"] = df["date"].dt.month
+        df["year"] = df["date"].dt.year
+    return df
+
+
+# =============================================================================
+# PLANIFICACIÓN DE TIPOS
+# Elige el tipo más barato que conserva exactamente los valores de cada
+# columna. Los tipos originales se guardan en `df.attrs["logical_dtypes"]`
+# para que `utils.make_schema_text` siga describiendo el mismo esquema.
+# =============================================================================
+
+CALENDAR_COLUMNS = ("quarter", "month", "year")
+
+
+def plan_dtypes(df: pd.DataFrame) -> dict[str, str]:
+    """
+    Calcula el tipo más barato y seguro para cada columna del DataFrame.
+
+    - Textos con pocos valores distintos (CATEGORY_MAX_RATIO de las filas y
+      como mucho CATEGORY_MAX_UNIQUES) -> 'category'.
+    - Columnas de calendario enteras -> int8/int16.
+    - Otros enteros -> int32 si el rango lo permite (se evita bajar más para
+      no provocar desbordamientos en la aritmética del código generado).
+    - Flotantes -> float32 solo si la conversión es exacta.
+
+    Args:
+        df: El DataFrame a analizar.
+
+    Returns:
+        Un diccionario {columna: tipo} solo con las columnas que cambian.
+    """
+    plan = {}
+    n_rows = len(df)
+    if n_rows == 0:
+        return plan
+
+    for col in df.columns:
+        series = df[col]
+        dtype = series.dtype
+        if not isinstance(dtype, np.dtype):
+            continue
+
+        if dtype == object:
+            if pd.api.types.infer_dtype(series, skipna=True) != "string":
+                continue
+            uniques = series.nunique(dropna=True)
+            if uniques <= min(n_rows * config.CATEGORY_MAX_RATIO, config.CATEGORY_MAX_UNIQUES):
+                plan[col] = "category"
+
+        elif pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            candidates = ("int8", "int16", "int32") if col in CALENDAR_COLUMNS else ("int32",)
+            low, high = series.min(), series.max()
+            for candidate in candidates:
+                info = np.iinfo(candidate)
+                if np.dtype(candidate).itemsize >= dtype.itemsize:
+                    break
+                if info.min <= low and high <= info.max:
+                    plan[col] = candidate
+                    break
+
+        elif pd.api.types.is_float_dtype(dtype) and dtype.itemsize > 4:
+            values = series.to_numpy()
+            downcast = values.astype("float32")
+            with np.errstate(over="ignore"):
+                if np.array_equal(downcast.astype(dtype), values, equal_nan=True):
+                    plan[col] = "float32"
+
+    return plan
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aplica `plan_dtypes` al DataFrame y registra la memoria ahorrada.
+
+    El informe queda en `df.attrs["memory_report"]` y los tipos originales de las
+    columnas modificadas en `df.attrs["logical_dtypes"]`.
+
+    Args:
+        df: El DataFrame preparado.
+
+    Returns:
+        El DataFrame con los tipos optimizados (o el mismo si no hay cambios).
+    """
+    plan = plan_dtypes(df)
+    if not plan:
+        return df
+
+    bytes_before = int(df.memory_usage(deep=True).sum())
+    logical = {col: str(df[col].dtype) for col in plan}
+    df = df.astype(plan)
+    bytes_after = int(df.memory_usage(deep=True).sum())
+
+    # Si la columna ya se había optimizado antes, se conserva su tipo original
+    df.attrs["logical_dtypes"] = {**logical, **df.attrs.get("logical_dtypes", {})}
+    df.attrs["memory_report"] = {
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "saved_bytes": bytes_before - bytes_after,
+        "columns": plan,
+    }
+    saved_pct = 100 * (bytes_before - bytes_after) / bytes_before if bytes_before else 0.0
+    logger.info(
+        f"Lumina Data: Dtype optimization {bytes_before / 1e6:.2f} MB -> {bytes_after / 1e6:.2f} MB ({saved_pct:.0f}% saved)."
+    )
+    return df
+
+
+def load_and_prepare_data(
+    csv_path: str, use_sidecar: bool = False, optimize: bool = False
+) -> pd.DataFrame:
     """
     Carga datos desde un archivo CSV y los prepara para el análisis.
     Normaliza nombre de columnas a minusculas y elimina espacios.
@@ -70,77 +810,238 @@ def load_and_prepare_data(csv_path: str) -> pd.DataFrame:
     automáticamente 'quarter', 'month' y 'year' en nuevas columnas para
     facilitar la creación de gráficos temporales.
 
+    Con `use_sidecar=True` se lee directamente el sidecar columnar si está al
+    día; si no existe o el CSV es más reciente, se parsea el CSV y se regenera.
+    El formato efectivamente leído queda en `df.attrs["source_format"]`.
+
+    Con `optimize=True` se aplican los tipos de `plan_dtypes` antes de escribir
+    el sidecar, de modo que las cargas siguientes ya llegan optimizadas.
+
     Args:
         csv_path: La ruta al archivo CSV que se va a cargar.
+        use_sidecar: Si se debe usar (y mantener) el sidecar columnar.
+        optimize: Si se deben reducir los tipos de datos con `optimize_dtypes`.
 
     Returns:
         Un DataFrame de pandas con los datos cargados y procesados.
     """
+    if use_sidecar:
+        df = _read_sidecar(csv_path)
+        if df is not None:
+            logger.info(f"Lumina Data: Loaded {csv_path} from {df.attrs['source_format']} sidecar.")
+            return df
+
+    csv_mtime = os.stat(csv_path).st_mtime_ns if use_sidecar else 0
     df = pd.read_csv(csv_path)
     
     # Normalizar todas la columnas 
     df.columns = df.columns.str.lower().str.strip()
 
     # Procesa la columna 'date' solo si existe
-    if "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df["quarter"] = df["date"].dt.quarter
-        df["month"] = df["date"].dt.month
-        df["year"] = df["date"].dt.year
+    df = _add_date_parts(df)
+
+    if optimize:
+        df = optimize_dtypes(df)
+
+    if use_sidecar:
+        _write_sidecar(df, csv_path, csv_mtime)
 
+    df.attrs["source_format"] = "csv"
+    logger.info(f"Lumina Data: Loaded {csv_path} from csv.")
     return df
 
 
+# =============================================================================
+# MONGODB
+# Un único MongoClient por URI, reutilizado entre peticiones (el driver ya
+# gestiona su propio pool de conexiones). Los documentos se leen por lotes y
+# se vuelcan directamente a columnas.
+# =============================================================================
+
+_mongo_lock = threading.Lock()
+_mongo_clients: dict[str, MongoClient] = {}
+
+
+def _get_mongo_client(uri: str) -> MongoClient:
+    """
+    Devuelve el cliente compartido para una URI, creándolo la primera vez.
+    """
+    with _mongo_lock:
+        client = _mongo_clients.get(uri)
+        if client is None:
+            client = MongoClient(uri, maxPoolSize=config.MONGO_MAX_POOL_SIZE)
+            # Verificar la conexión solo al crear el cliente
+            client.admin.command("ping")
+            logger.info("Lumina Data: MongoDB Atlas connection successful.")
+            _mongo_clients[uri] = client
+        return client
+
+
+def close_mongo_clients() -> None:
+    """
+    Cierra todos los clientes de MongoDB compartidos.
+    Se registra con `atexit`, pero puede llamarse manualmente (p. ej. en tests).
+    """
+    with _mongo_lock:
+        for client in _mongo_clients.values():
+            client.close()
+        if _mongo_clients:
+            logger.info("Lumina Data: MongoDB connections closed.")
+        _mongo_clients.clear()
+
+
+atexit.register(close_mongo_clients)
+
+
+def _build_mongo_filter(
+    query: dict | None, date_range: tuple | None, watermark: tuple | None = None
+) -> dict:
+    """
+    Combina el filtro opcional, el rango de fechas [inicio, fin) y el rango de
+    marca de agua (campo, mínimo exclusivo, máximo inclusivo) en un filtro que
+    se evalúa en el servidor.
+    """
+    mongo_filter = dict(query or {})
+    if watermark is not None:
+        field, low, high = watermark
+        bounds = {"$lte": high}
+        if low is not None:
+            bounds["$gt"] = low
+        mongo_filter[field] = bounds
+    if date_range is not None:
+        start, end = date_range
+        date_filter = {}
+        if start is not None:
+            date_filter["$gte"] = start
+        if end is not None:
+            date_filter["$lt"] = end
+        if date_filter:
+            mongo_filter["date"] = date_filter
+    return mongo_filter
+
+
+def _cursor_to_frame(cursor) -> pd.DataFrame:
+    """
+    Vuelca un cursor de documentos a un DataFrame columna a columna.
+
+    Cada documento se descarta en cuanto sus valores pasan a los buffers de
+    columnas, así nunca se mantiene en memoria la lista completa de diccionarios.
+    Los campos ausentes en algún documento se rellenan con None.
+    """
+    columns: dict[str, list] = {}
+    n_rows = 0
+    for document in cursor:
+        for key, value in document.items():
+            buffer = columns.get(key)
+            if buffer is None:
+                buffer = columns[key] = [None] * n_rows
+            buffer.append(value)
+        n_rows += 1
+        if len(document) != len(columns):
+            for buffer in columns.values():
+                if len(buffer) < n_rows:
+                    buffer.append(None)
+    return pd.DataFrame(columns)
+
+
+def append_rows(df: pd.DataFrame, delta: pd.DataFrame, key_field: str | None = None) -> pd.DataFrame:
+    """
+    Añade al DataFrame preparado las filas de un delta ya preparado.
+
+    El delta se convierte a los tipos del DataFrame existente (ampliando las
+    categorías cuando aparecen valores nuevos) para que la concatenación no
+    devuelva columnas `object`. Si se indica `key_field`, las filas existentes
+    con la misma clave se sustituyen por las del delta.
+
+    Args:
+        df: El DataFrame en caché.
+        delta: Las filas nuevas o modificadas, con las fechas ya procesadas.
+        key_field: Columna que identifica cada documento, o None.
+
+    Returns:
+        Un nuevo DataFrame con los mismos `attrs` que `df`.
+    """
+    if delta.empty:
+        return df
+
+    base = df
+    if key_field is not None and key_field in df.columns and key_field in delta.columns:
+        base = df[~df[key_field].isin(delta[key_field])]
+
+    delta = delta.copy()
+    base_dtypes = {}
+    for col in delta.columns.intersection(base.columns):
+        dtype = base[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            new_values = delta[col].dropna().unique()
+            missing = pd.Index(new_values).difference(dtype.categories)
+            if len(missing):
+                dtype = pd.CategoricalDtype(dtype.categories.append(missing))
+                base_dtypes[col] = dtype
+        try:
+            delta[col] = delta[col].astype(dtype)
+        except (TypeError, ValueError):
+            # p. ej. NaN en un entero pequeño: se deja que concat elija un tipo común
+            pass
+
+    if base_dtypes:
+        base = base.astype(base_dtypes)
+
+    result = pd.concat([base, delta], ignore_index=True)
+    result.attrs = dict(df.attrs)
+    return result
+
+
 def load_and_prepare_data_from_mongo(
-    uri: str, db_name: str, collection_name: str
+    uri: str,
+    db_name: str,
+    collection_name: str,
+    optimize: bool = False,
+    query: dict | None = None,
+    date_range: tuple | None = None,
+    batch_size: int | None = None,
+    watermark: tuple | None = None,
 ) -> pd.DataFrame:
     """
     Carga datos desde una colección de MongoDB y los prepara para el análisis.
 
-    Realiza el mismo procesamiento de fechas que `load_and_prepare_data` y
-    elimina la columna `_id` de MongoDB. Maneja la conexión de forma segura.
+    Realiza el mismo procesamiento de fechas que `load_and_prepare_data`.
+    Usa el cliente compartido de `_get_mongo_client`, excluye `_id` en el
+    servidor mediante proyección y lee el cursor por lotes.
 
     Args:
         uri: La cadena de conexión de MongoDB.
         db_name: El nombre de la base de datos.
         collection_name: El nombre de la colección.
+        optimize: Si se deben reducir los tipos de datos con `optimize_dtypes`.
+        query: Filtro opcional de MongoDB evaluado en el servidor.
+        date_range: Tupla opcional (inicio, fin) sobre el campo 'date'.
+        batch_size: Documentos por lote del cursor (por defecto `MONGO_BATCH_SIZE`).
+        watermark: Tupla opcional (campo, mínimo exclusivo, máximo inclusivo) que
+                   acota la lectura; se usa para los refrescos incrementales.
 
     Returns:
         Un DataFrame de pandas con los datos o un DataFrame vacío si ocurre un error.
     """
-    client = None  # Inicializamos client a None
     try:
-        # Conexión a MongoDB
-        client = MongoClient(uri)
-        db = client[db_name]
-        collection = db[collection_name]
+        collection = _get_mongo_client(uri)[db_name][collection_name]
 
-        # Verificar la conexión
-        db.command("ping")
-        logger.info("Lumina Data: MongoDB Atlas connection successful.")
-
-        # Leer los datos y convertirlos a un DataFrame
-        documents = list(collection.find({}))
-        df = pd.DataFrame(documents)
+        # Leer los datos por lotes, sin _id, filtrando en el servidor
+        cursor = collection.find(
+            _build_mongo_filter(query, date_range, watermark),
+            {"_id": 0},
+            batch_size=batch_size or config.MONGO_BATCH_SIZE,
+        )
+        df = _cursor_to_frame(cursor)
 
         # Procesamiento de fechas
-        if "date" in df.columns:
-            df["date"] = pd.to_datetime(df["date"], errors="coerce")
-            df["quarter"] = df["date"].dt.quarter
-            df["month"] = df["date"].dt.month
-            df["year"] = df["date"].dt.year
+        df = _add_date_parts(df)
 
-        # Eliminar la columna _id de MongoDB si no se necesita
-        if "_id" in df.columns:
-            df = df.drop(columns=["_id"])
+        if optimize:
+            df = optimize_dtypes(df)
 
         return df
 
     except Exception as e:
         logger.error(f"Lumina Data Error: Failed to connect or read from MongoDB: {e}")
         return pd.DataFrame()  # Devuelve un DataFrame vacío en caso de error
-    finally:
-        # Asegurarse de que la conexión se cierre siempre
-        if client:
-            client.close()
-            logger.info("Lumina Data: MongoDB connection closed.")
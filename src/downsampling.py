@@ -0,0 +1,259 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Reducir las series demasiado grandes antes de que lleguen a matplotlib.
+# Mientras está activo (por hilo), Axes.plot reduce las líneas con LTTB o
+# min/max por cubetas y Axes.scatter toma una muestra reservoir, de modo que
+# el tiempo de renderizado con Agg no crece con el número de filas.
+# NOTA: fuera de `active()` los métodos de matplotlib se comportan igual que siempre.
+# =============================================================================
+
+import logging
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from matplotlib.axes import Axes
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+LINE_METHODS = ("lttb", "minmax")
+
+# Estado por hilo: presupuesto de puntos, método y el informe en curso
+_state = threading.local()
+_install_lock = threading.Lock()
+_originals: dict = {}
+
+
+# ---------- Algoritmos de reducción (devuelven índices ordenados) ----------
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: conserva la forma visual de una serie
+    eligiendo en cada cubeta el punto que forma el triángulo de mayor área con
+    el punto elegido anterior y la media de la cubeta siguiente.
+
+    Args:
+        x: Valores del eje X (numéricos y ordenados).
+        y: Valores del eje Y.
+        n_out: Número de puntos a conservar (>= 3).
+
+    Returns:
+        Los índices de los puntos conservados, incluidos el primero y el último.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64, copy=False)
+    y = y.astype(np.float64, copy=False)
+    # Cubetas para los n - 2 puntos interiores
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Min/max por cubetas: conserva el mínimo y el máximo de cada cubeta, lo que
+    preserva los picos de la serie.
+
+    Args:
+        y: Valores del eje Y.
+        n_out: Número aproximado de puntos a conservar.
+
+    Returns:
+        Los índices de los puntos conservados, en orden.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        bucket = y[start:end]
+        indices.append(start + int(bucket.argmin()))
+        indices.append(start + int(bucket.argmax()))
+    return np.unique(np.asarray(indices, dtype=np.int64))
+
+
+def reservoir_indices(n: int, k: int, seed: int = 0) -> np.ndarray:
+    """
+    Muestreo reservoir (algoritmo R) vectorizado: cada punto tiene la misma
+    probabilidad k/n de quedar en la muestra.
+
+    Args:
+        n: Número total de puntos.
+        k: Tamaño de la muestra.
+        seed: Semilla, para que el mismo código produzca el mismo gráfico.
+
+    Returns:
+        Los índices muestreados, en orden.
+    """
+    if k >= n:
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+    reservoir = np.arange(k)
+    positions = np.arange(k, n)
+    # El elemento i sustituye a la posición j del depósito si j < k
+    slots = (rng.random(n - k) * (positions + 1)).astype(np.int64)
+    replaces = slots < k
+    # Si varios elementos caen en la misma posición, gana el último (el de mayor índice)
+    np.maximum.at(reservoir, slots[replaces], positions[replaces])
+    return np.sort(reservoir)
+
+
+# ---------- Integración con matplotlib ----------
+
+def _as_numeric_axis(values: np.ndarray) -> np.ndarray | None:
+    """Convierte el eje X a números para LTTB, o None si no es ordenable."""
+    if np.issubdtype(values.dtype, np.datetime64) or np.issubdtype(values.dtype, np.timedelta64):
+        return values.astype("int64")
+    if np.issubdtype(values.dtype, np.number):
+        return values
+    return None
+
+
+def _take(values, indices: np.ndarray):
+    """Selecciona posiciones conservando el tipo (Series, Index o array)."""
+    if isinstance(values, pd.Series):
+        return values.iloc[indices]
+    if isinstance(values, (pd.Index, np.ndarray)):
+        return values[indices]
+    return np.asarray(values)[indices]
+
+
+def _record(kind: str, points_in: int, points_out: int) -> None:
+    report = _state.report
+    report["series"] += 1
+    report["points_in"] += points_in
+    report["points_out"] += points_out
+    report["points_dropped"] += points_in - points_out
+    report[kind] += 1
+
+
+def _reduce_line(args: tuple) -> tuple:
+    """Reduce una llamada plot(y), plot(x, y) o plot(x, y, fmt) si supera el presupuesto."""
+    data = [a for a in args if not isinstance(a, str)]
+    fmt = [a for a in args if isinstance(a, str)]
+    if len(data) not in (1, 2) or len(fmt) > 1 or (fmt and not isinstance(args[-1], str)):
+        return args  # Varias series en una llamada: se dibujan tal cual
+
+    y = np.asarray(data[-1])
+    n = len(y) if y.ndim == 1 else 0
+    budget = _state.budget
+    if n <= budget or not np.issubdtype(y.dtype, np.number) or not np.isfinite(y).all():
+        return args
+
+    if len(data) == 2:
+        x_numeric = _as_numeric_axis(np.asarray(data[0]))
+        if x_numeric is None or x_numeric.ndim != 1 or len(x_numeric) != n or not (np.diff(x_numeric) >= 0).all():
+            return args  # Solo series ordenadas en X
+    else:
+        x_numeric = np.arange(n)
+
+    if _state.method == "minmax":
+        indices = minmax_indices(y, budget)
+    else:
+        indices = lttb_indices(x_numeric, y, budget)
+
+    _record("lines", n, len(indices))
+    reduced = [_take(a, indices) for a in data]
+    return tuple(reduced + fmt)
+
+
+def _reduce_scatter(x, y, kwargs: dict):
+    """Toma una muestra reservoir de un scatter si supera el presupuesto."""
+    n = np.shape(x)[0] if np.ndim(x) == 1 else 0
+    budget = _state.budget
+    if n <= budget or np.shape(y) != (n,):
+        return x, y, kwargs
+
+    indices = reservoir_indices(n, budget)
+    kwargs = dict(kwargs)
+    # Tamaños y colores por punto deben seguir la misma muestra
+    for key in ("s", "c", "color", "sizes"):
+        value = kwargs.get(key)
+        if value is not None and not isinstance(value, str) and np.ndim(value) >= 1 and np.shape(value)[0] == n:
+            kwargs[key] = _take(value, indices)
+
+    _record("scatters", n, len(indices))
+    return _take(x, indices), _take(y, indices), kwargs
+
+
+def _plot(self, *args, **kwargs):
+    if getattr(_state, "budget", None) is not None and "data" not in kwargs:
+        args = _reduce_line(args)
+    return _originals["plot"](self, *args, **kwargs)
+
+
+def _scatter(self, x, y, *args, **kwargs):
+    if getattr(_state, "budget", None) is not None and "data" not in kwargs:
+        x, y, kwargs = _reduce_scatter(x, y, kwargs)
+    return _originals["scatter"](self, x, y, *args, **kwargs)
+
+
+def install() -> None:
+    """
+    Sustituye Axes.plot y Axes.scatter por las versiones que reducen puntos.
+    Es idempotente y no cambia nada fuera de `active()`.
+    """
+    with _install_lock:
+        if _originals:
+            return
+        _originals["plot"] = Axes.plot
+        _originals["scatter"] = Axes.scatter
+        Axes.plot = _plot
+        Axes.scatter = _scatter
+
+
+def empty_report() -> dict:
+    return {"series": 0, "lines": 0, "scatters": 0, "points_in": 0, "points_out": 0, "points_dropped": 0}
+
+
+@contextmanager
+def active(budget: int, method: str = "lttb"):
+    """
+    Activa la reducción de puntos en el hilo actual.
+
+    Args:
+        budget: Máximo de puntos por serie.
+        method: "lttb" o "minmax" para las líneas (los scatter usan reservoir).
+
+    Yields:
+        El informe con las series reducidas y los puntos descartados.
+    """
+    if method not in LINE_METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}', expected one of {LINE_METHODS}")
+
+    install()
+    report = empty_report()
+    _state.budget, _state.method, _state.report = budget, method, report
+    try:
+        yield report
+    finally:
+        _state.budget = None
+        if report["series"]:
+            logger.info(
+                f"Lumina Downsampling: Reduced {report['series']} series, "
+                f"dropped {report['points_dropped']} of {report['points_in']} points."
+            )
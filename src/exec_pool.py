@@ -0,0 +1,351 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Ejecutar el código generado fuera del proceso principal, en un pool de
+# procesos trabajadores que ya tienen pandas, matplotlib y el ejecutor
+# importados y el dataset cargado. Cada trabajo tiene un límite de tiempo y de
+# memoria; un trabajador que se cuelga, se queda sin memoria o muere se
+# reemplaza, y cada trabajador se recicla tras un número de trabajos.
+# NOTA: los trabajadores se crean desde un forkserver que precarga este
+# módulo, así que arrancar uno nuevo no repite las importaciones.
+# =============================================================================
+
+import os
+import time
+import queue
+import atexit
+import signal
+import logging
+import threading
+import multiprocessing
+
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from . import config
+from . import executor
+
+try:
+    import resource
+except ImportError:  # Windows: sin límite de memoria por proceso
+    resource = None
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+STATUSES = ("ok", "error", "rejected", "timeout", "memory_exceeded", "crashed")
+COUNTERS = ("jobs", "timeouts", "memory_exceeded", "crashes", "recycled", "dataset_transfers")
+
+
+# ---------- Proceso trabajador ----------
+
+def _limit_memory(limit_mb: int | None) -> None:
+    if limit_mb and resource is not None:
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, memory_limit_mb: int | None) -> None:
+    """
+    Bucle del trabajador. Mensajes:
+    - ("load", dataset): guarda (clave, df, aggs) y responde "loaded".
+    - ("run", código, prune_columns, capture, render_profile, dataset):
+      ejecuta y responde con el estado del trabajo (y los gráficos
+      capturados si `capture`).
+      `dataset` es None para reutilizar el ya cargado.
+    - ("stop",): termina.
+    """
+    # Ctrl+C lo gestiona el proceso principal, que termina el pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Los errores llegan al proceso principal en la respuesta, que los registra
+    logging.getLogger().addHandler(logging.NullHandler())
+    _limit_memory(memory_limit_mb)
+    df, aggs = None, None
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message[0] == "stop":
+            break
+        if message[0] == "load":
+            _, df, aggs = message[1]
+            conn.send("loaded")
+            continue
+
+        _, code_response, prune_columns, capture, render_profile, dataset = message
+        if dataset is not None:
+            _, df, aggs = dataset
+
+        exec_info, figures = {}, ({} if capture else None)
+        try:
+            success = executor.extract_and_execute_code(
+                code_response, df, aggs, prune_columns=prune_columns, exec_info=exec_info,
+                figures=figures, render_profile=render_profile,
+            )
+        except MemoryError as e:  # Fuera del exec (p. ej. al podar columnas)
+            success, exec_info["error"] = False, f"MemoryError: {e}"
+        finally:
+            plt.close("all")
+
+        error = exec_info.get("error")
+        if success:
+            status = "ok"
+        elif error and error.startswith("MemoryError"):
+            status = "memory_exceeded"
+        elif error and error.startswith("CodeRejected"):
+            status = "rejected"
+        else:
+            status = "error"
+        try:
+            conn.send({"status": status, "success": success, "error": error, "exec_info": exec_info, "figures": figures})
+        except MemoryError:
+            conn.send({"status": "memory_exceeded", "success": False, "error": "MemoryError", "exec_info": {}, "figures": None})
+
+
+# ---------- Pool ----------
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, config.EXEC_POOL_MEMORY_LIMIT_MB),
+            name="lumina-exec-worker",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.dataset_key = None
+
+    def stop(self, kill: bool = False) -> None:
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(("stop",))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ExecPool:
+    """
+    Pool de procesos trabajadores para ejecutar el código generado.
+
+    Args:
+        size: Número de trabajadores (por defecto EXEC_POOL_SIZE).
+        start_method: Método de multiprocessing (por defecto
+                      EXEC_POOL_START_METHOD; "forkserver" si está disponible).
+    """
+
+    def __init__(self, size: int | None = None, start_method: str | None = None):
+        self.size = size or config.EXEC_POOL_SIZE
+        method = start_method or config.EXEC_POOL_START_METHOD
+        if method not in multiprocessing.get_all_start_methods():
+            method = "spawn"
+        self._context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            self._context.set_forkserver_preload([__name__])
+
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        self._workers: list[_Worker] = []
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._closed = False
+        for _ in range(self.size):
+            self._add_worker()
+        logger.info(f"Lumina Exec Pool: Started {self.size} workers ({method}).")
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _add_worker(self) -> None:
+        worker = _Worker(self._context)
+        with self._lock:
+            self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker: _Worker, kill: bool = False) -> None:
+        """Detiene un trabajador y arranca otro en su lugar."""
+        with self._lock:
+            self._workers.remove(worker)
+        worker.stop(kill=kill)
+        if not self._closed:
+            self._add_worker()
+
+    def stats(self) -> dict:
+        """Contadores del pool: trabajos, timeouts, memoria agotada, caídas, reciclados y envíos del dataset."""
+        with self._lock:
+            return {**self._counters, "workers": len(self._workers)}
+
+    def _dataset_for(self, worker: _Worker, df: pd.DataFrame, aggs: dict | None):
+        """El dataset solo se envía si el trabajador no tiene ya esa versión."""
+        version = df.attrs.get("dataset_version")
+        key = (version, aggs is not None)
+        if version is not None and worker.dataset_key == key:
+            return None
+        return key, df, aggs
+
+    def _loaded(self, worker: _Worker, dataset) -> None:
+        """
+        Registra que el trabajador ya tiene el dataset. Solo se llama cuando el
+        trabajador ha respondido: si el envío falla, la siguiente vez se repite.
+        """
+        if dataset is not None:
+            worker.dataset_key = dataset[0]
+            self._count("dataset_transfers")
+
+    def preload(self, df: pd.DataFrame, aggs: dict | None = None) -> None:
+        """
+        Envía el dataset a los trabajadores libres para que su primer trabajo
+        no tenga que esperar la transferencia.
+        """
+        workers = []
+        while True:
+            try:
+                workers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            for worker in workers:
+                dataset = self._dataset_for(worker, df, aggs)
+                if dataset is not None:
+                    worker.conn.send(("load", dataset))
+                    worker.conn.recv()
+                    self._loaded(worker, dataset)
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+
+    def run(
+        self,
+        code_response: str,
+        df: pd.DataFrame,
+        aggs: dict | None = None,
+        prune_columns: bool = False,
+        timeout: float | None = None,
+        capture: bool = False,
+        render_profile: dict | None = None,
+    ) -> dict:
+        """
+        Ejecuta una respuesta del LLM en un trabajador libre (espera si no hay).
+
+        Args:
+            code_response: La respuesta con el bloque <execute_python>.
+            df: El DataFrame disponible para el código.
+            aggs: Agregados precalculados opcionales.
+            prune_columns: Ejecutar solo con las columnas referenciadas.
+            timeout: Segundos máximos del trabajo (por defecto EXEC_POOL_TIMEOUT).
+            capture: Capturar los gráficos en memoria en vez de escribirlos.
+            render_profile: Perfil de renderizado impuesto a los savefig.
+
+        Returns:
+            Un diccionario con status (uno de STATUSES), success, error,
+            exec_info, figures ({ruta: bytes} o None), elapsed_s y worker_pid.
+        """
+        timeout = timeout or config.EXEC_POOL_TIMEOUT
+        worker = self._idle.get()
+        start = time.perf_counter()
+        self._count("jobs")
+        dataset = self._dataset_for(worker, df, aggs)
+        try:
+            worker.conn.send(("run", code_response, prune_columns, capture, render_profile, dataset))
+            if worker.conn.poll(timeout):
+                reply = worker.conn.recv()
+                # El trabajador carga el dataset antes de ejecutar: si responde, ya lo tiene
+                self._loaded(worker, dataset)
+            else:
+                reply = {"status": "timeout", "success": False, "error": f"Timeout after {timeout}s",
+                         "exec_info": {}, "figures": None}
+        except (EOFError, OSError) as e:
+            worker.process.join(timeout=1)
+            reply = {"status": "crashed", "success": False,
+                     "error": f"Worker exited ({worker.process.exitcode}): {e!r}", "exec_info": {}, "figures": None}
+
+        result = {
+            **reply,
+            "elapsed_s": round(time.perf_counter() - start, 4),
+            "worker_pid": worker.process.pid,
+        }
+        worker.jobs += 1
+        status = reply["status"]
+        if status in ("timeout", "memory_exceeded", "crashed"):
+            self._count({"timeout": "timeouts", "memory_exceeded": "memory_exceeded", "crashed": "crashes"}[status])
+            logger.warning(f"Lumina Exec Pool Warning: Job {status} in worker {worker.process.pid}; replacing it.")
+            self._retire(worker, kill=True)
+        elif worker.jobs >= config.EXEC_POOL_MAX_JOBS_PER_WORKER:
+            self._count("recycled")
+            self._retire(worker)
+        else:
+            self._idle.put(worker)
+        return result
+
+    def shutdown(self) -> None:
+        """Detiene todos los trabajadores."""
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool: ExecPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ExecPool:
+    """Devuelve el pool compartido del proceso, creándolo la primera vez."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExecPool()
+        return _pool
+
+
+def execute(
+    code_response: str,
+    df: pd.DataFrame,
+    aggs: dict | None = None,
+    prune_columns: bool = False,
+    exec_info: dict | None = None,
+    figures: dict | None = None,
+    render_profile: dict | None = None,
+) -> bool:
+    """
+    Equivalente a `executor.extract_and_execute_code`, pero en el pool.
+    `exec_info` recibe la información de la ejecución y, en 'pool', el estado
+    del trabajo (status, error, elapsed_s y worker_pid); `figures`, los
+    gráficos capturados en el trabajador.
+    """
+    result = get_pool().run(
+        code_response, df, aggs, prune_columns=prune_columns, capture=figures is not None, render_profile=render_profile
+    )
+    if figures is not None and result["figures"]:
+        figures.update(result["figures"])
+    if exec_info is not None:
+        exec_info.update(result["exec_info"])
+        exec_info["pool"] = {key: result[key] for key in ("status", "error", "elapsed_s", "worker_pid")}
+    if result["status"] != "ok":
+        logger.error(f"Lumina Exec Pool Error: Job finished with status '{result['status']}': {result['error']}")
+    return result["success"]
+
+
+def shutdown() -> None:
+    """Detiene el pool compartido, si existe."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+atexit.register(shutdown)
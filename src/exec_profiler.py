@@ -0,0 +1,160 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Perfilar la ejecución del código generado (opcional, EXEC_PROFILING_ENABLED):
+# cProfile, pico de memoria con tracemalloc y el tiempo de reloj repartido en
+# tres fases: datos (pandas/numpy), dibujo (matplotlib) y guardado (savefig:
+# renderizado y codificación). Deja un resumen compacto en exec_info["profile"]
+# y, con EXEC_PROFILE_DUMP, el perfil completo en EXEC_PROFILE_DIR.
+# NOTA: cProfile y tracemalloc son globales del proceso, así que las
+# ejecuciones perfiladas se serializan entre sí.
+# =============================================================================
+
+import os
+import time
+import pstats
+import cProfile
+import hashlib
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from . import config
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+# Rutas de las funciones de dibujo (matplotlib, df.plot y la reducción de series)
+_PLOT_PATHS = (
+    f"{os.sep}matplotlib{os.sep}",
+    f"{os.sep}pandas{os.sep}plotting{os.sep}",
+    f"{os.sep}downsampling.py",
+)
+
+_profile_lock = threading.Lock()
+# Estado por hilo: los perfiladores y tiempos de la ejecución perfilada en curso
+_state = threading.local()
+
+
+def _is_plot(func: tuple) -> bool:
+    return any(path in func[0] for path in _PLOT_PATHS)
+
+
+def _label(func: tuple) -> str:
+    filename, line, name = func
+    return f"{os.path.basename(filename)}:{line}({name})" if line else name
+
+
+def _summarize(run: dict, wall: float) -> tuple[dict, list, pstats.Stats]:
+    """
+    Reparte el tiempo de reloj entre fases:
+    - save: lo medido dentro de savefig (renderizado y codificación);
+    - plot: el tiempo propio de las funciones de dibujo fuera de savefig;
+    - data: el resto (pandas, numpy y el propio código generado).
+    Se usa el tiempo propio (no el acumulado) porque no depende de que cProfile
+    reconstruya bien la pila de llamadas.
+    Devuelve (fases, funciones más costosas, estadísticas completas).
+    """
+    stats = pstats.Stats(run["profiler"])
+    plot = sum(tt for func, (_, _, tt, _, _) in stats.stats.items() if _is_plot(func))
+    if run["saves"]:
+        stats.add(run["save_profiler"])
+    phases = {"data_s": max(wall - plot - run["save_s"], 0.0), "plot_s": plot, "save_s": run["save_s"]}
+
+    hottest = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[: config.EXEC_PROFILE_TOP_N]
+    top = [
+        {"function": _label(func), "calls": nc, "tottime_s": round(tt, 4), "cumtime_s": round(ct, 4)}
+        for func, (_, nc, tt, ct, _) in hottest
+    ]
+    return {name: round(value, 4) for name, value in phases.items()}, top, stats
+
+
+@contextmanager
+def saving():
+    """
+    Marca un savefig (lo usa figure_capture). Dentro de una ejecución
+    perfilada su tiempo cuenta como fase 'save' y sus llamadas se perfilan
+    aparte; fuera, no hace nada.
+    """
+    run = getattr(_state, "run", None)
+    if run is None:
+        yield
+        return
+    if run["profiler"] is not None:
+        run["profiler"].disable()
+        run["save_profiler"].enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run["save_s"] += time.perf_counter() - start
+        run["saves"] += 1
+        if run["profiler"] is not None:
+            run["save_profiler"].disable()
+            run["profiler"].enable()
+
+
+def _dump(stats: pstats.Stats, code: str) -> str | None:
+    """Guarda el perfil completo (formato pstats) y devuelve su ruta."""
+    try:
+        config.EXEC_PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{hashlib.sha256(code.encode('utf-8')).hexdigest()[:12]}.prof"
+        path = config.EXEC_PROFILE_DIR / name
+        stats.dump_stats(path)
+        return str(path)
+    except OSError as e:
+        logger.warning(f"Lumina Exec Profiler Warning: Could not write profile: {e}")
+        return None
+
+
+@contextmanager
+def active(exec_info: dict, code: str):
+    """
+    Perfila el bloque (la ejecución del código generado) y deja el resumen en
+    exec_info["profile"]:
+
+        {"wall_s", "phases": {"data_s", "plot_s", "save_s"}, "peak_mb",
+         "top": [{"function", "calls", "tottime_s", "cumtime_s"}, ...], "dump"}
+
+    Args:
+        exec_info: Diccionario de la ejecución.
+        code: El código ejecutado (da nombre al perfil guardado).
+    """
+    with _profile_lock:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        run = {"profiler": cProfile.Profile(), "save_profiler": cProfile.Profile(), "save_s": 0.0, "saves": 0}
+        try:
+            run["profiler"].enable()
+        except ValueError:  # Otro perfilador activo (p. ej. el proceso corre bajo cProfile)
+            logger.warning("Lumina Exec Profiler Warning: Another profiler is active; recording only time and memory.")
+            run["profiler"] = None
+
+        _state.run = run
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            _state.run = None
+            if run["profiler"] is not None:
+                run["profiler"].disable()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+
+            summary = {"wall_s": round(wall, 4), "phases": None, "peak_mb": round((peak - baseline) / 2**20, 2),
+                       "top": [], "dump": None}
+            if run["profiler"] is not None:
+                summary["phases"], summary["top"], stats = _summarize(run, wall)
+                if config.EXEC_PROFILE_DUMP:
+                    summary["dump"] = _dump(stats, code)
+            else:
+                summary["phases"] = {"data_s": round(max(wall - run["save_s"], 0.0), 4), "plot_s": None,
+                                     "save_s": round(run["save_s"], 4)}
+            exec_info["profile"] = summary
+            logger.debug(f"Lumina Exec Profiler: {summary['wall_s']}s, phases {summary['phases']}, peak {summary['peak_mb']} MB")
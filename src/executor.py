@@ -2,7 +2,12 @@
 # RESPONSABILIDAD ÚNICA DE ESTE MODULO
 # Tomar un bloque de texto, extraer el código python de él y ejecutarlo
 # NOTA IMPORTANTE:
-# Configure el backend de Matplotlib a uno no interactivo para evitar errores en hilos
+# Configure el backend de Matplotlib a uno no interactivo para evitar errores en hilos.
+# Con PYPLOT_THREAD_ISOLATION cada ejecución tiene sus propias figuras de pyplot
+# (pyplot_state), así que se pueden ejecutar varios códigos a la vez en hilos.
+# Con DATAFRAME_COPY_ON_WRITE pandas trabaja en modo copy-on-write en todo el
+# proceso (se activa al importar este módulo) y cada ejecución recibe su propia
+# copia perezosa del DataFrame.
 # =============================================================================
 
 
@@ -11,12 +16,43 @@ import matplotlib
 matplotlib.use("Agg")
 
 import re
+import ast
+import hashlib
+import threading
 import pandas as pd
 import logging
+import matplotlib.pyplot as plt
+from collections import OrderedDict
+from contextlib import nullcontext
+from . import config
+from . import downsampling
+from . import exec_profiler
+from . import figure_capture
+from . import pyplot_state
 
 # Configurar logger para este módulo
 logger = logging.getLogger(__name__)
 
+
+def enable_copy_on_write() -> None:
+    """
+    Activa "mode.copy_on_write" de pandas para todo el proceso si
+    DATAFRAME_COPY_ON_WRITE está activo. Se llama una vez al importar el
+    ejecutor (al arrancar la API, el CLI, los lotes o un trabajador del pool):
+    la opción es global, así que activarla y desactivarla por ejecución
+    cambiaría el comportamiento de pandas en los demás hilos a mitad de su
+    trabajo. Con copy-on-write las copias superficiales no comparten
+    escrituras: es lo que permite dar a cada ejecución su propio 'df' sin
+    copiar los datos.
+    """
+    if config.DATAFRAME_COPY_ON_WRITE and not pd.get_option("mode.copy_on_write"):
+        pd.set_option("mode.copy_on_write", True)
+        logger.info("Lumina Executor: pandas copy-on-write mode enabled for this process.")
+
+
+enable_copy_on_write()
+
+
 # =============================================================================
 # FUNCIONES INTERNAS ( Refactorizadas)
 # Estas funciones hacen el trabajo pesado y seróan probadas individualmente
@@ -45,33 +81,498 @@ def _extract_code(llm_response_text: str) -> str | None:
     
     return code_to_execute
 
-def _execute_code(code_to_execute: str, df: pd.DataFrame) -> bool:
+# ---------- Validación y compilación ----------
+# El código se compila una sola vez por contenido (hash) y se guarda el objeto
+# de código: las re-ejecuciones (memo, lotes, V2 repetidos) no vuelven a
+# compilar. Antes de ejecutarlo se rechazan con un motivo preciso las
+# construcciones que el prompt prohíbe y que de otro modo fallarían (o
+# colgarían) en mitad de un renderizado lento.
+
+# Llamadas a funciones integradas no permitidas
+_FORBIDDEN_CALLS = {
+    "open": "file access", "input": "interactive input", "breakpoint": "debugger",
+    "exec": "dynamic code", "eval": "dynamic code", "compile": "dynamic code",
+    "__import__": "dynamic import", "globals": "namespace access", "locals": "namespace access",
+    "vars": "namespace access", "exit": "process exit", "quit": "process exit",
+}
+# Módulos de sistema, archivos, red y procesos
+_FORBIDDEN_MODULES = {
+    "os", "sys", "subprocess", "shutil", "pathlib", "glob", "tempfile", "io", "pickle", "shelve",
+    "socket", "ssl", "http", "urllib", "requests", "httpx", "aiohttp", "ftplib", "smtplib",
+    "ctypes", "multiprocessing", "threading", "asyncio", "signal", "importlib", "builtins",
+}
+# Métodos que leen o escriben archivos (el único archivo permitido es el savefig)
+_FORBIDDEN_METHODS = {
+    "show": "interactive display",
+    "to_csv": "file write", "to_excel": "file write", "to_parquet": "file write",
+    "to_pickle": "file write", "to_sql": "database write", "to_feather": "file write",
+    "to_hdf": "file write", "read_text": "file access", "read_bytes": "file access",
+    "write_text": "file write", "write_bytes": "file write",
+}
+# Bucles fila a fila sobre el dataset completo
+_ROW_LOOPS = {"iterrows", "itertuples"}
+
+_COMPILE_CACHE_FILENAME = "<lumina-generated>"
+_compile_lock = threading.Lock()
+_compile_cache: OrderedDict = OrderedDict()
+_compile_stats = {"hits": 0, "misses": 0, "rejected": 0}
+
+
+def get_compile_cache_stats() -> dict:
+    """
+    Devuelve una copia de los contadores de la caché de compilación.
+
+    Returns:
+        Un diccionario con las claves 'hits', 'misses', 'rejected' y 'size'.
+    """
+    with _compile_lock:
+        return {**_compile_stats, "size": len(_compile_cache)}
+
+
+def clear_compile_cache() -> None:
+    """Vacía la caché de compilación y reinicia sus contadores."""
+    with _compile_lock:
+        _compile_cache.clear()
+        for counter in _compile_stats:
+            _compile_stats[counter] = 0
+
+
+def _validate_code(tree: ast.AST) -> str | None:
+    """
+    Busca en el AST construcciones no permitidas.
+    Devuelve el motivo del rechazo ("line N: ...") o None si el código es válido.
+    """
+    for node in ast.walk(tree):
+        reason = None
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            for name in names:
+                if name.split(".")[0] in _FORBIDDEN_MODULES:
+                    reason = f"import of '{name}' is not allowed"
+                    break
+        elif isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name) and func.id in _FORBIDDEN_CALLS:
+                reason = f"{_FORBIDDEN_CALLS[func.id]} ({func.id}) is not allowed"
+            elif isinstance(func, ast.Attribute):
+                if func.attr in _FORBIDDEN_METHODS:
+                    reason = f"{_FORBIDDEN_METHODS[func.attr]} (.{func.attr}) is not allowed"
+                elif func.attr.startswith("read_"):
+                    reason = f"data loading (.{func.attr}) is not allowed; use 'df'"
+                elif func.attr in _ROW_LOOPS and isinstance(func.value, ast.Name) and func.value.id == "df":
+                    reason = f"row-by-row loop over the full dataset (df.{func.attr}); use vectorized pandas operations"
+        elif isinstance(node, ast.Attribute) and node.attr.startswith("__") and node.attr.endswith("__"):
+            reason = f"dunder attribute access ({node.attr}) is not allowed"
+        elif isinstance(node, ast.While) and isinstance(node.test, ast.Constant) and node.test.value:
+            if not any(isinstance(n, (ast.Break, ast.Return)) for n in ast.walk(node)):
+                reason = "infinite loop (while True without break)"
+        if reason:
+            return f"line {node.lineno}: {reason}"
+    return None
+
+
+def _compile_code(code: str) -> tuple:
+    """
+    Compila y valida el código una sola vez por contenido.
+
+    Returns:
+        (objeto de código o None, motivo del rechazo o None, si cambia los rc
+        globales, rc de su plt.style.use() de nivel superior). Un error de
+        sintaxis devuelve (None, motivo, False, {}).
+    """
+    key = (hashlib.sha256(code.encode("utf-8")).hexdigest(), config.CODE_VALIDATION_ENABLED)
+    with _compile_lock:
+        if key in _compile_cache:
+            _compile_cache.move_to_end(key)
+            _compile_stats["hits"] += 1
+            return _compile_cache[key]
+
+    try:
+        tree = ast.parse(code, _COMPILE_CACHE_FILENAME)
+        entry = (
+            compile(tree, _COMPILE_CACHE_FILENAME, "exec"),
+            _validate_code(tree) if config.CODE_VALIDATION_ENABLED else None,
+            pyplot_state.changes_rc(tree),
+            pyplot_state.style_rc(tree),
+        )
+    except SyntaxError as e:
+        entry = (None, f"line {e.lineno}: syntax error ({e.msg})", False, {})
+
+    with _compile_lock:
+        _compile_stats["misses"] += 1
+        if entry[1] is not None:
+            _compile_stats["rejected"] += 1
+        _compile_cache[key] = entry
+        while len(_compile_cache) > config.COMPILE_CACHE_SIZE:
+            _compile_cache.popitem(last=False)
+    return entry
+
+
+# ---------- Análisis estático de columnas ----------
+# Se recorre el AST del código generado para saber qué columnas de 'df' usa.
+# El análisis es conservador: ante cualquier uso que pueda depender de todas las
+# columnas (df.sum(), df.columns, df.dropna() sin subset, pasar df a otra
+# función...) se declara no concluyente y se usa el DataFrame completo.
+
+# Métodos que devuelven un marco con las mismas columnas (se sigue la cadena)
+_FRAME_PRESERVING = {
+    "copy", "head", "tail", "sort_values", "sort_index", "reset_index", "set_index",
+    "fillna", "rename", "groupby", "resample", "rolling", "expanding", "sample",
+    "nlargest", "nsmallest", "loc", "iloc", "astype", "round", "abs",
+}
+# Métodos que solo usan todas las columnas si no reciben un subconjunto explícito
+_SUBSET_KWARGS = {"dropna": "subset", "drop_duplicates": "subset", "duplicated": "subset",
+                  "pivot": "values", "pivot_table": "values", "plot": "y"}
+# Atributos que no dependen del contenido de las columnas
+_SHAPE_ATTRS = {"shape", "empty", "index", "ndim", "size", "ngroups", "groups"}
+
+
+def _is_column_key(node: ast.AST) -> bool:
+    """Un literal de texto o una lista/tupla de literales de texto."""
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return all(isinstance(e, ast.Constant) and isinstance(e.value, str) for e in node.elts)
+    return False
+
+
+def _frame_use(node: ast.AST, parents: dict, columns: set):
+    """
+    Sigue la cadena de atributos/llamadas/subíndices que parte de un nombre que
+    apunta a 'df' (o a un alias). Devuelve:
+    - "column": la cadena selecciona columnas concretas antes de usarse.
+    - "frame": la expresión resultante sigue siendo un marco con todas las columnas
+      (la devuelve junto con el nodo final para poder registrar alias).
+    - None: uso no concluyente.
+    """
+    current = node
+    while True:
+        parent = parents.get(current)
+        if isinstance(parent, ast.Attribute) and parent.value is current:
+            if parent.attr in columns:
+                return "column", parent
+            if parent.attr in _SHAPE_ATTRS:
+                return "column", parent
+            call = parents.get(parent)
+            is_call = isinstance(call, ast.Call) and call.func is parent
+            if parent.attr in _FRAME_PRESERVING:
+                current = call if is_call else parent
+                continue
+            if parent.attr in _SUBSET_KWARGS and is_call:
+                if any(k.arg == _SUBSET_KWARGS[parent.attr] for k in call.keywords):
+                    current = call
+                    continue
+                return None, parent
+            if parent.attr in ("agg", "aggregate") and is_call:
+                # agg({'col': ...}) o agg(total=('col', 'sum')) solo usan esas columnas
+                if (call.args and isinstance(call.args[0], ast.Dict)) or (
+                    not call.args and call.keywords
+                    and all(isinstance(k.value, ast.Tuple) for k in call.keywords)
+                ):
+                    return "column", call
+            return None, parent
+        if isinstance(parent, ast.Subscript) and parent.value is current:
+            key = parent.slice
+            if _is_column_key(key):
+                return "column", parent
+            if isinstance(key, ast.Tuple) and len(key.elts) == 2:
+                # .loc[filas, columnas]
+                rows, cols = key.elts
+                if _is_column_key(cols):
+                    return "column", parent
+                if isinstance(cols, ast.Slice) and cols.lower is cols.upper is cols.step is None:
+                    current = parent
+                    continue
+                return None, parent
+            if isinstance(key, (ast.JoinedStr, ast.BinOp)) and any(
+                isinstance(n, ast.Constant) and isinstance(n.value, str) for n in ast.walk(key)
+            ):
+                # Nombres de columna construidos dinámicamente
+                return None, parent
+            # Filtro de filas (máscara, variable...): sigue siendo un marco
+            current = parent
+            continue
+        if isinstance(parent, ast.Call) and parent.func is not current:
+            if isinstance(parent.func, ast.Name) and parent.func.id == "len":
+                return "column", parent
+            return None, parent
+        if isinstance(parent, (ast.Assign, ast.AnnAssign, ast.For, ast.comprehension)):
+            return "frame", current
+        if isinstance(parent, ast.Expr):
+            return "column", current
+        return None, parent
+
+
+def _referenced_columns(code: str, columns) -> set[str] | None:
+    """
+    Determina qué columnas de 'df' referencia el código generado.
+
+    Args:
+        code: El código Python extraído de la respuesta del LLM.
+        columns: Las columnas del DataFrame.
+
+    Returns:
+        El conjunto de columnas referenciadas, o None si el análisis no es
+        concluyente y debe usarse el DataFrame completo.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    column_set = {str(c) for c in columns}
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+
+    # Alias de 'df': nombres asignados desde una expresión que sigue siendo un marco
+    # (q1 = df[df.quarter == 1]) o variables de grupo (for name, g in df.groupby(...)).
+    aliases = {"df"}
+    changed = True
+    while changed:
+        changed = False
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Name) and node.id in aliases and isinstance(node.ctx, ast.Load)):
+                continue
+            use, end = _frame_use(node, parents, column_set)
+            if use != "frame":
+                continue
+            holder = parents.get(end)
+            targets = []
+            if isinstance(holder, ast.Assign):
+                targets = holder.targets
+            elif isinstance(holder, ast.AnnAssign):
+                targets = [holder.target]
+            elif isinstance(holder, (ast.For, ast.comprehension)) and holder.iter is end:
+                # for nombre, grupo in df.groupby(...): solo 'grupo' es un marco
+                target = holder.target
+                targets = [target.elts[-1] if isinstance(target, ast.Tuple) and target.elts else target]
+            for target in targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name) and name.id not in aliases:
+                        aliases.add(name.id)
+                        changed = True
+
+    referenced = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value in column_set:
+            referenced.add(node.value)
+        elif isinstance(node, ast.Attribute) and node.attr in column_set:
+            referenced.add(node.attr)
+        elif isinstance(node, ast.Name) and node.id in aliases:
+            if isinstance(node.ctx, ast.Store):
+                continue
+            use, end = _frame_use(node, parents, column_set)
+            if use is None:
+                logger.debug(f"Lumina Executor: Column analysis inconclusive at line {getattr(end, 'lineno', '?')}.")
+                return None
+            if use == "frame":
+                holder = parents.get(end)
+                if isinstance(holder, (ast.For, ast.comprehension)) and holder.iter is end:
+                    # Iterar un marco directamente recorre sus columnas
+                    if not (isinstance(end, ast.Call) and isinstance(end.func, ast.Attribute)
+                            and end.func.attr == "groupby"):
+                        return None
+    return referenced
+
+
+def _build_exec_globals(df: pd.DataFrame, aggs: dict[str, pd.DataFrame] | None) -> dict:
+    """
+    Define el entorno de ejecución. Solo el DataFrame 'df' (y 'aggs') estarán disponibles.
+    Con DATAFRAME_COPY_ON_WRITE 'df' es una copia perezosa: comparte los datos
+    con el original hasta que el código escribe en ella.
+    """
+    exec_globals = {"df": df.copy(deep=False) if config.DATAFRAME_COPY_ON_WRITE else df}
+    if aggs is not None:
+        # Copias superficiales: el código puede añadir columnas sin tocar la caché
+        exec_globals["aggs"] = {name: table.copy(deep=False) for name, table in aggs.items()}
+    return exec_globals
+
+
+def _run_code(
+    code_to_execute: str,
+    df: pd.DataFrame,
+    aggs: dict[str, pd.DataFrame] | None,
+    exec_info: dict | None,
+    figures: dict | None = None,
+    render_profile: dict | None = None,
+    program: tuple | None = None,
+) -> None:
+    """
+    Ejecuta el código (lanzando sus excepciones). Si está activada, la reducción
+    de puntos se aplica durante la ejecución y su informe se deja en `exec_info`.
+    Con `figures`, los savefig se capturan en ese diccionario en vez de en disco.
+    Con `render_profile`, sus parámetros rc se aplican durante la ejecución y su
+    dpi/formato se imponen en savefig.
+    Con PYPLOT_THREAD_ISOLATION la ejecución usa figuras propias de este hilo,
+    el estilo de su plt.style.use() se aplica con los rc de la ejecución y, si
+    el código cambia los rc de otra forma, no se solapa con otras ejecuciones.
+    Con EXEC_PROFILING_ENABLED el perfil de la ejecución queda en
+    exec_info["profile"].
+    `program` es el resultado de _compile_code si el llamador ya lo tiene.
+    """
+    if config.DOWNSAMPLING_ENABLED:
+        context = downsampling.active(config.PLOT_POINT_BUDGET, config.DOWNSAMPLING_LINE_METHOD)
+    else:
+        context = nullcontext(None)
+    if figures is not None:
+        # Un reintento (p. ej. tras la poda) empieza sin las capturas del anterior
+        figures.clear()
+    if figures is not None or render_profile is not None:
+        capture = figure_capture.active(figures, render_profile)
+    else:
+        capture = nullcontext()
+    rc = render_profile.get("rc") if render_profile else None
+    compiled, _, changes_rc, style = program if program is not None else _compile_code(code_to_execute)
+    if config.PYPLOT_THREAD_ISOLATION:
+        # El estilo se aplica después de los rc del perfil, como en el código
+        isolation = pyplot_state.active({**(rc or {}), **style}, exclusive=changes_rc)
+    else:
+        isolation = matplotlib.rc_context(rc) if rc else nullcontext()
+    if config.EXEC_PROFILING_ENABLED and exec_info is not None:
+        # La fase de guardado se mide en el savefig interceptado
+        figure_capture.install()
+        profiling = exec_profiler.active(exec_info, code_to_execute)
+    else:
+        profiling = nullcontext()
+    with context as report, capture, isolation, profiling:
+        try:
+            # Sin objeto de código (error de sintaxis), exec lanza el SyntaxError
+            exec(compiled if compiled is not None else code_to_execute, _build_exec_globals(df, aggs))
+        finally:
+            if exec_info is not None and report is not None:
+                exec_info["downsampling"] = report
+
+
+def _record_error(exec_info: dict | None, error: BaseException) -> None:
+    """Deja el error de la ejecución en `exec_info` ("Tipo: mensaje")."""
+    if exec_info is not None:
+        exec_info["error"] = f"{type(error).__name__}: {error}"
+
+
+def _execute_code(
+    code_to_execute: str,
+    df: pd.DataFrame,
+    aggs: dict[str, pd.DataFrame] | None = None,
+    exec_info: dict | None = None,
+    figures: dict | None = None,
+    render_profile: dict | None = None,
+    program: tuple | None = None,
+) -> bool:
     """
     Responsabilidad 2: Ejecución
     Ejecuta un string de código python en un entorno controlado
     Devuelve True si tiene éxito, False si falla.
+    Si se pasan agregados precalculados, quedan disponibles como 'aggs'.
+    Si se pasa `exec_info`, se rellena con datos de la ejecución (p. ej. los
+    puntos descartados por la reducción de series o el error si falla).
+    Si se pasa `figures`, los gráficos guardados se capturan en él, y con
+    `render_profile` se renderizan con ese perfil.
     """
     try:
-        # Define el entorno de ejecución. Solo el DataFrame 'df' estará disponible.
-        exec_globals = {"df": df}
-        exec(code_to_execute, exec_globals)
+        _run_code(code_to_execute, df, aggs, exec_info, figures, render_profile, program)
         logger.debug(">>> Code executed successfully.")
         return True
     except Exception as e:
         logger.error(f"Lumina _execute_code Error: Error during code execution: {e}")
+        _record_error(exec_info, e)
         return False
 
+def _execute_pruned(
+    code_to_execute: str,
+    df: pd.DataFrame,
+    aggs: dict[str, pd.DataFrame] | None,
+    exec_info: dict | None = None,
+    figures: dict | None = None,
+    render_profile: dict | None = None,
+    program: tuple | None = None,
+) -> bool | None:
+    """
+    Ejecuta el código solo con las columnas que referencia.
+
+    Devuelve el resultado de la ejecución, o None si no se pudo podar (análisis
+    no concluyente) o si la ejecución podada falló porque falta una de las
+    columnas quitadas; en ese caso el llamador repite con el DataFrame completo.
+    """
+    columns = _referenced_columns(code_to_execute, df.columns)
+    if columns is None or len(columns) >= len(df.columns) or not df.columns.is_unique:
+        return None
+
+    # Se construye columna a columna sin copiar: df[[...]] copia los datos
+    # cuando pandas no está en modo copy-on-write
+    pruned = pd.DataFrame({c: df[c] for c in df.columns if str(c) in columns}, copy=False)
+    dropped = {c for c in df.columns if str(c) not in columns}
+    logger.debug(f"Lumina Executor: Column pruning kept {pruned.shape[1]}/{df.shape[1]} columns.")
+    try:
+        _run_code(code_to_execute, pruned, aggs, exec_info, figures, render_profile, program)
+        logger.debug(">>> Code executed successfully.")
+        return True
+    except (KeyError, AttributeError) as e:
+        if not _is_missing_column(e, dropped):
+            logger.error(f"Lumina _execute_code Error: Error during code execution: {e}")
+            _record_error(exec_info, e)
+            return False
+        logger.warning(f"Lumina Executor Warning: Pruned execution failed ({e!r}), retrying with all columns.")
+        # Descarta figuras a medio dibujar antes de repetir
+        plt.close("all")
+        return None
+    except Exception as e:
+        logger.error(f"Lumina _execute_code Error: Error during code execution: {e}")
+        _record_error(exec_info, e)
+        return False
+
+
+def _is_missing_column(error: KeyError | AttributeError, dropped: set) -> bool:
+    """
+    Indica si el error se debe a una columna que la poda quitó. Solo entonces
+    se repite con el DataFrame completo: repetir por cualquier otro error
+    volvería a ejecutar los efectos del código (p. ej. guardar el gráfico).
+    """
+    if isinstance(error, AttributeError):
+        return getattr(error, "name", None) in {str(c) for c in dropped}
+    key = error.args[0] if error.args else None
+    if key in dropped:
+        return True
+    # Selecciones con lista: "['b'] not in index"
+    return isinstance(key, str) and any(repr(c) in key for c in dropped)
+
+
 # =============================================================================
 # FUNCIÓN PÚBLICA (farcade)
 # Esta es la única función que otros módulos deben llamar
 # Su firma no cambia, por lo que no afecta a src/main
 # =============================================================================
 
-def extract_and_execute_code(llm_response_text: str, df: pd.DataFrame) -> bool:
+def extract_and_execute_code(
+    llm_response_text: str,
+    df: pd.DataFrame,
+    aggs: dict[str, pd.DataFrame] | None = None,
+    prune_columns: bool = False,
+    exec_info: dict | None = None,
+    figures: dict | None = None,
+    render_profile: dict | None = None,
+) -> bool:
     """ 
     Extrae y ejecuta código Python desde la respuesta de un LLM.
     Esta función actuá como un farcade, orquestando las llamadas a las 
     funciones internas _extract_code y _execute_code.
+
+    Con `prune_columns=True` el código se analiza con `ast` y se ejecuta solo
+    con las columnas que referencia; si el análisis no es concluyente se usa
+    el DataFrame completo.
+
+    Antes de ejecutarlo, el código se compila (una vez por contenido) y se
+    valida: si usa una construcción no permitida (archivos, red, plt.show(),
+    bucles infinitos...) se devuelve False sin ejecutarlo y el motivo queda en
+    `exec_info["error"]` como "CodeRejected: line N: ...".
+
+    Si se pasa un diccionario `exec_info`, se rellena con información de la
+    ejecución (p. ej. el informe de puntos descartados en 'downsampling').
+
+    Si se pasa un diccionario `figures`, los savefig del código no escriben en
+    disco: cada imagen se renderiza en memoria y queda en `figures` con la
+    ruta pedida como clave.
+
+    Con `render_profile` ({"dpi": ..., "format": ..., "rc": {...}}) el gráfico
+    se renderiza con ese perfil, pida el código el dpi que pida.
     """
     # Paso 1: Llama a la función de extracción.
     code_to_execute = _extract_code(llm_response_text)
@@ -81,8 +582,21 @@ def extract_and_execute_code(llm_response_text: str, df: pd.DataFrame) -> bool:
     if code_to_execute is None:
         return False
 
-    # Paso 2: Si la extracción tiene éxito, llama a la función de ejecución 
-    return _execute_code(code_to_execute, df)
+    # Paso 2: Compilación y validación (el objeto de código queda en caché)
+    program = _compile_code(code_to_execute)
+    _, rejection, _, _ = program
+    if rejection is not None:
+        logger.error(f"Lumina Executor Error: Code rejected before execution: {rejection}")
+        if exec_info is not None:
+            exec_info["error"] = f"CodeRejected: {rejection}"
+        return False
+
+    # Paso 3: Si el código es válido, llama a la función de ejecución 
+    if prune_columns:
+        result = _execute_pruned(code_to_execute, df, aggs, exec_info, figures, render_profile, program)
+        if result is not None:
+            return result
+    return _execute_code(code_to_execute, df, aggs, exec_info, figures, render_profile, program)
 
 
 
@@ -0,0 +1,96 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Controlar cómo se guardan los gráficos del código generado. Mientras está
+# activo (por hilo), Figure.savefig (y por tanto plt.savefig):
+# - aplica el perfil de renderizado (dpi y formato), pida lo que pida el código;
+# - y, si hay captura, renderiza en un buffer en lugar de escribir el archivo,
+#   guardando los bytes con la ruta pedida como clave.
+# NOTA: fuera de `active()` savefig se comporta igual que siempre.
+# =============================================================================
+
+import io
+import os
+import logging
+import threading
+from contextlib import contextmanager
+
+from matplotlib.figure import Figure
+
+from . import exec_profiler
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+# Estado por hilo: el diccionario {ruta: bytes} de la captura en curso y el perfil
+_state = threading.local()
+_install_lock = threading.Lock()
+_originals: dict = {}
+
+
+def _image_format(fname: str, kwargs: dict, profile: dict | None) -> str:
+    """Formato: el del perfil, el argumento `format` o la extensión de la ruta (png por defecto)."""
+    fmt = kwargs.pop("format", None)
+    if profile and profile.get("format"):
+        return profile["format"]
+    if fmt:
+        return fmt
+    return os.path.splitext(fname)[1].lstrip(".").lower() or "png"
+
+
+def _savefig(self, fname, *args, **kwargs):
+    # Con el perfilado activo, el savefig cuenta como fase de guardado
+    with exec_profiler.saving():
+        return _capture_or_save(self, fname, *args, **kwargs)
+
+
+def _capture_or_save(self, fname, *args, **kwargs):
+    captured = getattr(_state, "captured", None)
+    profile = getattr(_state, "profile", None)
+    if profile and profile.get("dpi"):
+        kwargs["dpi"] = profile["dpi"]
+    if captured is None or not isinstance(fname, (str, os.PathLike)):
+        # Sin captura activa, o el código ya guarda en un buffer propio
+        if profile and profile.get("format") and isinstance(fname, (str, os.PathLike)):
+            kwargs["format"] = profile["format"]
+        return _originals["savefig"](self, fname, *args, **kwargs)
+
+    path = os.fspath(fname)
+    buffer = io.BytesIO()
+    _originals["savefig"](self, buffer, *args, format=_image_format(path, kwargs, profile), **kwargs)
+    captured[path] = buffer.getvalue()
+    logger.debug(f"Lumina Figure Capture: Captured {len(captured[path])} bytes for {path}")
+
+
+def install() -> None:
+    """
+    Sustituye Figure.savefig por la versión que aplica el perfil y captura.
+    Es idempotente y no cambia nada fuera de `active()`.
+    """
+    with _install_lock:
+        if _originals:
+            return
+        _originals["savefig"] = Figure.savefig
+        Figure.savefig = _savefig
+
+
+@contextmanager
+def active(captured: dict | None = None, profile: dict | None = None):
+    """
+    Activa la captura de gráficos y/o el perfil de renderizado en el hilo actual.
+
+    Args:
+        captured: Diccionario que recibe {ruta pedida: bytes de la imagen}, o
+                  None para que savefig escriba en disco.
+        profile: Perfil de renderizado ({"dpi": ..., "format": ...}); sus
+                 valores sustituyen a los que pida el código.
+
+    Yields:
+        El diccionario de captura.
+    """
+    install()
+    previous = getattr(_state, "captured", None), getattr(_state, "profile", None)
+    _state.captured, _state.profile = captured, profile
+    try:
+        yield captured
+    finally:
+        _state.captured, _state.profile = previous
@@ -4,6 +4,8 @@
 # =============================================================================
 
 import pandas as pd
+from . import config
+from . import data_processing
 from . import utils
 import logging
 
@@ -11,29 +13,29 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def generate_chart_code(
-    instruction: str, model: str, out_path_v1: str, df: pd.DataFrame
-) -> tuple[str, str]:
-    """|
-    convertir una instruccion en lenguaje natural en un script de python para crear una visualizacion, basandose en el esquema de un conjunto de datos proporcionado.
-
-    Args:
-        instruction: La instrucción del usuario.
-        model: El nombre del modelo de LLM a usar.
-        out_path_v1: La ruta donde se guardará el gráfico.
-        df: El DataFrame con los datos para generar el esquema dinámico.
-
-    Returns:
-        Una tupla (str, str) conteniendo:
-        - El string con el código Python (respuesta del LLM).
-        - El string con el esquema de datos utilizado.
+def _build_schema(df: pd.DataFrame, aggs: dict[str, pd.DataFrame] | None) -> str:
     """
-    logger.debug("Lumina Generator: Starting code generation for V1 chart.")
-
-    schema = utils.make_schema_text(df)
+    Esquema que recibe el LLM: perfil (o columnas y tipos) de 'df' y, si los
+    hay, agregados de 'aggs'.
+    """
+    if config.SCHEMA_PROFILE_ENABLED:
+        schema = data_processing.get_dataset_profile(df)
+    else:
+        schema = utils.make_schema_text(df)
+    if aggs:
+        schema += "\n\n" + utils.make_aggregates_text(aggs)
     logger.debug(f"Lumina Generator: Generated schema: {schema}")
+    return schema
 
-    prompt = f"""
+
+def _build_prompt(instruction: str, out_path_v1: str, schema: str) -> str:
+    """
+    Prompt de generación del código V1.
+    Sin perfiles de renderizado el dpi no se impone al guardar, así que se pide
+    en el prompt.
+    """
+    dpi_hint = "" if config.RENDER_PROFILES_ENABLED else " with dpi=300"
+    return f"""
     You are a data visualization expert.
 
     Return your answer *strictly* in this format:
@@ -54,15 +56,80 @@ def generate_chart_code(
     1. The DataFrame is already loaded and available in a variable named 'df'. **DO NOT** try to load the data again (e.g., do not use pd.read_csv).
     2. Use matplotlib for plotting.
     3. Add clear title, axis labels, and legend if needed.
-    4. Save the figure as '{out_path_v1}' with dpi=300.
+    4. Save the figure as '{out_path_v1}'{dpi_hint}.
     5. Do not call plt.show().
     6. Close all plots with plt.close().
     7. Add all necessary import python statements
+    8. If precomputed aggregates are listed in the schema, they are available in a dict named 'aggs'. Prefer them over re-aggregating 'df' when they already contain what the chart needs.
 
     Return ONLY the code wrapped in <execute_python> tags.
     """
+
+
+def generate_chart_code(
+    instruction: str,
+    model: str,
+    out_path_v1: str,
+    df: pd.DataFrame,
+    aggs: dict[str, pd.DataFrame] | None = None,
+    stream: bool = False,
+) -> tuple[str, str]:
+    """|
+    convertir una instruccion en lenguaje natural en un script de python para crear una visualizacion, basandose en el esquema de un conjunto de datos proporcionado.
+
+    Args:
+        instruction: La instrucción del usuario.
+        model: El nombre del modelo de LLM a usar.
+        out_path_v1: La ruta donde se guardará el gráfico.
+        df: El DataFrame con los datos para generar el esquema dinámico.
+        aggs: Agregados precalculados opcionales; si se pasan, se describen en
+              el esquema para que el código pueda usarlos en lugar de reagrupar.
+        stream: Si es True, la respuesta se recibe por streaming y se devuelve
+                en cuanto se cierra el bloque </execute_python>.
+
+    Returns:
+        Una tupla (str, str) conteniendo:
+        - El string con el código Python (respuesta del LLM).
+        - El string con el esquema de datos utilizado.
+    """
+    logger.debug("Lumina Generator: Starting code generation for V1 chart.")
+
+    schema = _build_schema(df, aggs)
+    prompt = _build_prompt(instruction, out_path_v1, schema)
+    logger.debug("Lumina Generator: Sending prompt to LLM.")
+
+    if stream:
+        response = utils.stream_response(model, prompt)
+    else:
+        response = utils.get_response(model, prompt)
+    logger.debug("Lumina Generator: Received response from LLM.")
+    return response, schema
+
+
+async def generate_chart_code_async(
+    instruction: str,
+    model: str,
+    out_path_v1: str,
+    df: pd.DataFrame,
+    aggs: dict[str, pd.DataFrame] | None = None,
+    stream: bool = False,
+) -> tuple[str, str]:
+    """
+    Versión asíncrona de `generate_chart_code`: mismo prompt, pero la llamada
+    al LLM no bloquea el event loop.
+
+    Returns:
+        Una tupla (respuesta del LLM, esquema utilizado).
+    """
+    logger.debug("Lumina Generator: Starting async code generation for V1 chart.")
+
+    schema = _build_schema(df, aggs)
+    prompt = _build_prompt(instruction, out_path_v1, schema)
     logger.debug("Lumina Generator: Sending prompt to LLM.")
 
-    response = utils.get_response(model, prompt)
+    if stream:
+        response = await utils.stream_response_async(model, prompt)
+    else:
+        response = await utils.get_response_async(model, prompt)
     logger.debug("Lumina Generator: Received response from LLM.")
     return response, schema
@@ -3,6 +3,7 @@ import gradio as gr  # type: ignore
 import requests
 from PIL import Image
 import io
+import base64
 import logging
 
 # --- Configuración de Logging ---
@@ -39,6 +40,19 @@ theme = gr.themes.Base(
 )
 
 
+def _descargar_imagen(url: str) -> Image.Image:
+    """
+    Obtiene la imagen de un gráfico: decodifica las data URLs (gráficos no
+    guardados en disco) y descarga las rutas bajo /static.
+    """
+    if url.startswith("data:"):
+        return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+    logger.info(f"Interfaz: Descargando imagen desde {API_BASE_URL}{url}")
+    response = requests.get(f"{API_BASE_URL}{url}")
+    response.raise_for_status()
+    return Image.open(io.BytesIO(response.content))
+
+
 # --- Función Puente Mejorada ---
 def llamar_agente_y_mostrar_resultados(instruccion):
     """
@@ -65,22 +79,14 @@ def llamar_agente_y_mostrar_resultados(instruccion):
 
         feedback = results.get("feedback", "No se recibió feedback.")
 
-        # 3. Descarga las imágenes
+        # 3. Descarga las imágenes (o las decodifica si llegan como data URL)
         pil_image_v1 = None
         if results.get("chart_v1_url"):
-            url_v1 = f"{API_BASE_URL}{results.get('chart_v1_url')}"
-            logger.info(f"Interfaz: Descargando imagen V1 desde {url_v1}")
-            image_response_v1 = requests.get(url_v1)
-            image_response_v1.raise_for_status()
-            pil_image_v1 = Image.open(io.BytesIO(image_response_v1.content))
+            pil_image_v1 = _descargar_imagen(results["chart_v1_url"])
 
         pil_image_v2 = None
         if results.get("chart_v2_url"):
-            url_v2 = f"{API_BASE_URL}{results.get('chart_v2_url')}"
-            logger.info(f"Interfaz: Descargando imagen V2 desde {url_v2}")
-            image_response_v2 = requests.get(url_v2)
-            image_response_v2.raise_for_status()
-            pil_image_v2 = Image.open(io.BytesIO(image_response_v2.content))
+            pil_image_v2 = _descargar_imagen(results["chart_v2_url"])
 
         # 4. Muestra los resultados finales y reactiva el botón.
         yield {
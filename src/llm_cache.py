@@ -0,0 +1,255 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Caché de respuestas del LLM direccionada por contenido: la clave es un hash de
+# modelo + prompt completo + imagen. Tiene dos niveles: un LRU en memoria y un
+# directorio en disco con caducidad (TTL) y tamaño máximo, para que las
+# peticiones repetidas no vuelvan a pagar tokens ni latencia.
+# =============================================================================
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from . import config
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+STAT_KEYS = ("memory_hits", "disk_hits", "misses", "expired", "evictions")
+
+_lock = threading.Lock()
+_memory: OrderedDict = OrderedDict()
+_stats = dict.fromkeys(STAT_KEYS, 0)
+# Estadísticas del workflow en curso (cada tarea asyncio / hilo ve las suyas)
+_current_stats: ContextVar[dict | None] = ContextVar("llm_cache_stats", default=None)
+# Bytes ocupados en disco; se calcula al primer uso y luego se mantiene
+_disk_bytes: int | None = None
+
+
+def make_key(model: str, prompt: str, image_b64: str | None = None, detail: str | None = None) -> str:
+    """
+    Calcula la clave de caché de una llamada al LLM.
+
+    Args:
+        model: El nombre del modelo.
+        prompt: El prompt completo.
+        image_b64: La imagen en Base64 (solo llamadas de visión).
+        detail: El nivel de detalle de la imagen (solo llamadas de visión).
+
+    Returns:
+        Un hash sha256 hexadecimal.
+    """
+    image_digest = hashlib.sha256(image_b64.encode("ascii")).hexdigest() if image_b64 else ""
+    payload = "\0".join((model, prompt, image_digest, detail or ""))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _count(stat: str) -> None:
+    with _lock:
+        _stats[stat] += 1
+    current = _current_stats.get()
+    if current is not None:
+        current[stat] += 1
+
+
+def _entry_path(key: str) -> Path:
+    return Path(config.LLM_CACHE_DIR) / key[:2] / f"{key}.json"
+
+
+def _remember(key: str, response: str, created: float) -> None:
+    """Inserta en el LRU de memoria, descartando las entradas menos usadas."""
+    with _lock:
+        _memory[key] = (created, response)
+        _memory.move_to_end(key)
+        while len(_memory) > config.LLM_CACHE_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def get(key: str) -> str | None:
+    """
+    Busca una respuesta en memoria y después en disco.
+
+    Returns:
+        La respuesta guardada, o None si no existe o ha caducado.
+    """
+    if not config.LLM_CACHE_ENABLED:
+        return None
+
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None and now - entry[0] <= config.LLM_CACHE_TTL_SECONDS:
+            _memory.move_to_end(key)
+            hit = entry[1]
+        else:
+            _memory.pop(key, None)
+            hit = None
+    if hit is not None:
+        _count("memory_hits")
+        return hit
+
+    path = _entry_path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, OSError):
+        _count("misses")
+        return None
+
+    if now - stored["created"] > config.LLM_CACHE_TTL_SECONDS:
+        _remove(path)
+        _count("expired")
+        _count("misses")
+        return None
+
+    # El mtime marca el último uso: la expulsión por tamaño borra primero lo menos usado
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    _remember(key, stored["response"], stored["created"])
+    _count("disk_hits")
+    return stored["response"]
+
+
+def put(key: str, response: str, model: str) -> None:
+    """
+    Guarda una respuesta en ambos niveles. Las respuestas vacías no se guardan;
+    el llamador decide si una respuesta es utilizable (ver
+    utils._cache_if_usable: terminada y con el bloque de código completo).
+    """
+    if not config.LLM_CACHE_ENABLED or not response:
+        return
+
+    created = time.time()
+    _remember(key, response, created)
+
+    path = _entry_path(key)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps({"created": created, "model": model, "response": response})
+        tmp_path.write_text(payload, encoding="utf-8")
+        previous = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Lumina LLM Cache Warning: Could not write cache entry: {e}")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return
+
+    _track_disk_usage(len(payload.encode("utf-8")) - previous)
+
+
+def _remove(path: Path) -> None:
+    global _disk_bytes
+    try:
+        size = path.stat().st_size
+        path.unlink()
+    except OSError:
+        return
+    with _lock:
+        if _disk_bytes is not None:
+            _disk_bytes -= size
+
+
+def _track_disk_usage(delta: int) -> None:
+    """Actualiza el tamaño ocupado en disco y expulsa entradas si supera el máximo."""
+    global _disk_bytes
+    with _lock:
+        if _disk_bytes is None:
+            _disk_bytes = sum(p.stat().st_size for p in Path(config.LLM_CACHE_DIR).glob("*/*.json"))
+        else:
+            _disk_bytes += delta
+        over = _disk_bytes > config.LLM_CACHE_MAX_BYTES
+    if over:
+        _evict_disk()
+
+
+def _evict_disk() -> None:
+    """
+    Borra las entradas caducadas y después las menos usadas (mtime más antiguo)
+    hasta quedar por debajo del 90% del tamaño máximo.
+    """
+    global _disk_bytes
+    entries = []
+    for path in Path(config.LLM_CACHE_DIR).glob("*/*.json"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    target = int(config.LLM_CACHE_MAX_BYTES * 0.9)
+    expired_before = time.time() - config.LLM_CACHE_TTL_SECONDS
+    evicted = 0
+    for mtime, size, path in entries:
+        if total <= target and mtime >= expired_before:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        evicted += 1
+
+    with _lock:
+        _disk_bytes = total
+        _stats["evictions"] += evicted
+    current = _current_stats.get()
+    if current is not None:
+        current["evictions"] += evicted
+    if evicted:
+        logger.info(f"Lumina LLM Cache: Evicted {evicted} disk entries ({total} bytes kept).")
+
+
+@contextmanager
+def track():
+    """
+    Recoge las estadísticas de caché de un workflow.
+
+    Yields:
+        Un diccionario con los aciertos/fallos producidos dentro del bloque
+        (incluidas las tareas asyncio e hilos lanzados desde él).
+    """
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def get_cache_stats() -> dict:
+    """
+    Devuelve las estadísticas acumuladas de la caché en este proceso.
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def clear_cache(disk: bool = False) -> None:
+    """
+    Vacía el nivel de memoria (y opcionalmente el de disco) y reinicia las estadísticas.
+    """
+    global _disk_bytes
+    with _lock:
+        _memory.clear()
+        for stat in STAT_KEYS:
+            _stats[stat] = 0
+        if disk:
+            for path in Path(config.LLM_CACHE_DIR).glob("*/*.json"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            _disk_bytes = None
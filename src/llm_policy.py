@@ -0,0 +1,403 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Política de llamadas al LLM: limita la concurrencia por modelo, reintenta los
+# errores transitorios con backoff exponencial con jitter y, opcionalmente,
+# lanza una petición duplicada (hedging) cuando la primera tarda más que el
+# p95 reciente; gana la primera respuesta. Todo queda registrado en métricas.
+# NOTA: utils.py pasa aquí cada llamada a la API; los clientes de OpenAI se
+# crean con max_retries=0 para que los reintentos no se multipliquen.
+# =============================================================================
+
+import time
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+
+import openai
+from . import config
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+# Códigos HTTP que merece la pena reintentar
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Códigos de error de un stream que falla a mitad de respuesta que merece la pena reintentar
+TRANSIENT_ERROR_CODES = {"server_error", "rate_limit_exceeded"}
+COUNTERS = (
+    "calls", "successes", "failures", "retries", "throttled",
+    "hedges_fired", "hedges_won", "hedges_skipped",
+)
+# Latencias recientes por modelo usadas para el p95 del hedging
+_LATENCY_WINDOW = 200
+
+_lock = threading.Lock()
+_metrics: dict[str, dict] = {}
+_latencies: dict[str, deque] = {}
+_semaphores: dict[str, threading.BoundedSemaphore] = {}
+# Los semáforos asyncio pertenecen a un event loop: uno por loop y modelo
+_async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+# Hilos para las peticiones con hedging en el modo síncrono
+_hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="lumina-hedge")
+
+
+# ---------- Métricas ----------
+
+def _model_metrics(model: str) -> dict:
+    if model not in _metrics:
+        _metrics[model] = dict.fromkeys(COUNTERS, 0)
+        _latencies[model] = deque(maxlen=_LATENCY_WINDOW)
+    return _metrics[model]
+
+
+def _count(model: str, counter: str) -> None:
+    with _lock:
+        _model_metrics(model)[counter] += 1
+
+
+def _record_latency(model: str, seconds: float) -> None:
+    with _lock:
+        _model_metrics(model)
+        _latencies[model].append(seconds)
+
+
+def _quantile(samples, q: float) -> float | None:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def get_metrics() -> dict:
+    """
+    Devuelve las métricas por modelo: contadores de llamadas, éxitos, fallos,
+    reintentos, esperas por el límite de concurrencia y hedging, más las
+    latencias p50/p95 de las llamadas con éxito.
+    """
+    with _lock:
+        snapshot = {}
+        for model, counters in _metrics.items():
+            samples = list(_latencies[model])
+            snapshot[model] = {
+                **counters,
+                "latency_p50": _quantile(samples, 0.5),
+                "latency_p95": _quantile(samples, 0.95),
+            }
+        return snapshot
+
+
+def reset_metrics() -> None:
+    """
+    Reinicia métricas y latencias (y con ellas el retardo de hedging aprendido).
+    Los límites de concurrencia se recrean con la configuración actual.
+    """
+    with _lock:
+        _metrics.clear()
+        _latencies.clear()
+        _semaphores.clear()
+        _async_semaphores.clear()
+
+
+# ---------- Reglas de la política ----------
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Indica si un error de la API es transitorio (conexión, timeout, 429, 5xx,
+    o un stream que falló con un error de servidor o de límite de uso).
+    """
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in TRANSIENT_STATUS_CODES
+    if isinstance(error, openai.APIError):
+        return error.code in TRANSIENT_ERROR_CODES
+    return False
+
+
+def backoff_delay(attempt: int, error: BaseException | None = None) -> float:
+    """
+    Retardo antes del reintento `attempt` (0, 1, 2...): backoff exponencial con
+    jitter completo, acotado por LLM_RETRY_MAX_DELAY. Si la API indica
+    Retry-After, se espera al menos ese tiempo.
+    """
+    ceiling = min(config.LLM_RETRY_MAX_DELAY, config.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), config.LLM_RETRY_MAX_DELAY))
+        except ValueError:
+            pass
+    return delay
+
+
+def hedge_delay(model: str) -> float:
+    """
+    Tiempo de espera antes de lanzar la petición duplicada: el p95 de las
+    latencias recientes del modelo (o LLM_HEDGE_DEFAULT_DELAY sin suficientes
+    muestras), nunca por debajo de LLM_HEDGE_MIN_DELAY.
+    """
+    with _lock:
+        samples = list(_latencies.get(model, ()))
+    if not samples or len(samples) < config.LLM_HEDGE_MIN_SAMPLES:
+        return config.LLM_HEDGE_DEFAULT_DELAY
+    return max(config.LLM_HEDGE_MIN_DELAY, _quantile(samples, 0.95))
+
+
+def _semaphore(model: str) -> threading.BoundedSemaphore:
+    with _lock:
+        if model not in _semaphores:
+            _semaphores[model] = threading.BoundedSemaphore(config.LLM_MAX_CONCURRENCY_PER_MODEL)
+        return _semaphores[model]
+
+
+def _async_semaphore(model: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        per_loop = _async_semaphores.setdefault(loop, {})
+        if model not in per_loop:
+            per_loop[model] = asyncio.Semaphore(config.LLM_MAX_CONCURRENCY_PER_MODEL)
+        return per_loop[model]
+
+
+# ---------- Modo síncrono ----------
+
+class _Slot:
+    """
+    Plaza del límite de concurrencia de una petición. Se libera una sola vez:
+    al terminar la petición o antes, si se abandona porque ganó la otra
+    petición del hedging.
+    """
+
+    def __init__(self, semaphore: threading.BoundedSemaphore):
+        self._semaphore = semaphore
+        self._lock = threading.Lock()
+        self._held = False
+        self._abandoned = False
+
+    def take(self, model: str) -> bool:
+        """Espera una plaza. Devuelve False si la petición se abandonó mientras esperaba."""
+        if not self._semaphore.acquire(blocking=False):
+            _count(model, "throttled")
+            self._semaphore.acquire()
+        with self._lock:
+            self._held = not self._abandoned
+        if not self._held:
+            self._semaphore.release()
+        return self._held
+
+    def reserve(self) -> bool:
+        """Ocupa una plaza solo si hay una libre."""
+        with self._lock:
+            self._held = self._semaphore.acquire(blocking=False)
+            return self._held
+
+    def release(self) -> None:
+        with self._lock:
+            held, self._held = self._held, False
+        if held:
+            self._semaphore.release()
+
+    def abandon(self) -> None:
+        with self._lock:
+            self._abandoned = True
+        self.release()
+
+
+def _timed(slot: _Slot, request):
+    """Ejecuta la petición con su plaza ya ocupada y devuelve (resultado, segundos de la petición)."""
+    try:
+        start = time.perf_counter()
+        return request(), time.perf_counter() - start
+    finally:
+        slot.release()
+
+
+def _with_slot(model: str, slot: _Slot, request):
+    """Ejecuta la petición ocupando una plaza del límite de concurrencia del modelo."""
+    if not slot.take(model):
+        return None  # Abandonada antes de empezar: la otra petición ya respondió
+    return _timed(slot, request)
+
+
+def _close_result(future) -> None:
+    """Cierra el resultado de una petición abandonada si se puede (p. ej. un stream)."""
+    if future.cancelled() or future.exception() is not None or future.result() is None:
+        return
+    close = getattr(future.result()[0], "close", None)
+    if callable(close):
+        close()
+
+
+def _abandon(future, slot: _Slot) -> None:
+    """
+    Abandona la petición perdedora del hedging: no se puede interrumpir su
+    hilo, pero deja libre su plaza en el acto y su resultado se cierra al llegar.
+    """
+    future.cancel()
+    slot.abandon()
+    future.add_done_callback(_close_result)
+
+
+def _hedged(model: str, semaphore: threading.BoundedSemaphore, request):
+    primary_slot, hedge_slot = _Slot(semaphore), _Slot(semaphore)
+    primary = _hedge_pool.submit(_with_slot, model, primary_slot, request)
+    done, _ = wait([primary], timeout=hedge_delay(model))
+    if done:
+        return primary.result()
+
+    # El duplicado solo se lanza si hay una plaza libre: nunca supera el límite
+    if not hedge_slot.reserve():
+        _count(model, "hedges_skipped")
+        return primary.result()
+
+    _count(model, "hedges_fired")
+    hedge = _hedge_pool.submit(_timed, hedge_slot, request)
+    slots = {primary: primary_slot, hedge: hedge_slot}
+    first_error = None
+    for future in as_completed([primary, hedge]):
+        try:
+            result = future.result()
+        except Exception as e:
+            first_error = first_error or e
+            continue
+        if future is hedge:
+            _count(model, "hedges_won")
+        loser = primary if future is hedge else hedge
+        _abandon(loser, slots[loser])
+        return result
+    raise first_error
+
+
+def call(model: str, request, hedge: bool | None = None):
+    """
+    Ejecuta una llamada a la API aplicando la política.
+
+    Args:
+        model: El modelo, para el límite de concurrencia y las métricas.
+        request: Función sin argumentos que realiza la llamada.
+        hedge: Forzar o desactivar el hedging (por defecto LLM_HEDGING_ENABLED).
+               Debe ser False para llamadas con efectos (p. ej. streaming).
+
+    Returns:
+        El resultado de `request`.
+
+    Raises:
+        El último error si no es transitorio o se agotan los reintentos.
+    """
+    hedge = config.LLM_HEDGING_ENABLED if hedge is None else hedge
+    semaphore = _semaphore(model)
+    _count(model, "calls")
+
+    attempt = 0
+    while True:
+        try:
+            if hedge:
+                result, elapsed = _hedged(model, semaphore, request)
+            else:
+                result, elapsed = _with_slot(model, _Slot(semaphore), request)
+        except Exception as e:
+            if not is_transient(e) or attempt >= config.LLM_MAX_RETRIES:
+                _count(model, "failures")
+                raise
+            delay = backoff_delay(attempt, e)
+            _count(model, "retries")
+            logger.warning(f"Lumina LLM Policy: {type(e).__name__} calling {model}, retry {attempt + 1} in {delay:.2f}s.")
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        # La latencia es la de la petición, sin la espera por una plaza
+        _record_latency(model, elapsed)
+        _count(model, "successes")
+        return result
+
+
+# ---------- Modo asíncrono ----------
+
+async def _timed_async(request):
+    start = time.perf_counter()
+    result = await request()
+    return result, time.perf_counter() - start
+
+
+async def _with_slot_async(model: str, semaphore: asyncio.Semaphore, request):
+    if semaphore.locked():
+        _count(model, "throttled")
+    async with semaphore:
+        return await _timed_async(request)
+
+
+async def _hedged_async(model: str, semaphore: asyncio.Semaphore, request):
+    primary = asyncio.ensure_future(_with_slot_async(model, semaphore, request))
+    hedge = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay(model))
+        if done:
+            return primary.result()
+
+        if semaphore.locked():
+            _count(model, "hedges_skipped")
+            return await primary
+
+        await semaphore.acquire()  # No bloquea: hay plaza libre
+        _count(model, "hedges_fired")
+        hedge = asyncio.ensure_future(_timed_async(request))
+        # La plaza se libera al terminar la tarea, aunque se cancele antes de empezar
+        hedge.add_done_callback(lambda _: semaphore.release())
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    first_error = first_error or task.exception()
+                    continue
+                if task is hedge:
+                    _count(model, "hedges_won")
+                return task.result()
+        raise first_error
+    finally:
+        # La petición perdedora se cancela de verdad (libera su conexión), y la
+        # primaria también si se cancela la llamada mientras se espera
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def call_async(model: str, request, hedge: bool | None = None):
+    """
+    Versión asíncrona de `call`. `request` es una función sin argumentos que
+    devuelve una corrutina nueva en cada invocación.
+    """
+    hedge = config.LLM_HEDGING_ENABLED if hedge is None else hedge
+    semaphore = _async_semaphore(model)
+    _count(model, "calls")
+
+    attempt = 0
+    while True:
+        try:
+            if hedge:
+                result, elapsed = await _hedged_async(model, semaphore, request)
+            else:
+                result, elapsed = await _with_slot_async(model, semaphore, request)
+        except Exception as e:
+            if not is_transient(e) or attempt >= config.LLM_MAX_RETRIES:
+                _count(model, "failures")
+                raise
+            delay = backoff_delay(attempt, e)
+            _count(model, "retries")
+            logger.warning(f"Lumina LLM Policy: {type(e).__name__} calling {model}, retry {attempt + 1} in {delay:.2f}s.")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        # La latencia es la de la petición, sin la espera por una plaza
+        _record_latency(model, elapsed)
+        _count(model, "successes")
+        return result
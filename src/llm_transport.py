@@ -0,0 +1,415 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Transporte HTTP intercambiable para los clientes de OpenAI, para medir y
+# someter a carga el pipeline sin red:
+# - "record": llama a la API real y guarda cada par petición/respuesta (con su
+#   latencia) en disco.
+# - "replay": sirve las respuestas grabadas con la latencia con que se grabaron.
+# - "synthetic": devuelve código <execute_python> válido para el esquema del
+#   prompt, con una latencia log-normal.
+# NOTA: se conecta por debajo del SDK (httpx), así que la política de llamadas,
+# el streaming y la caché se ejercitan exactamente igual que contra la API.
+# =============================================================================
+
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+import httpx
+from . import config
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+MODES = ("network", "record", "replay", "synthetic")
+
+# Rutas de gráficos en los prompts: cambian en cada ejecución, así que no forman
+# parte de la clave y se sustituyen al reproducir
+_PATH_PATTERN = re.compile(r"""['"]([^'"\n]+?\.png)['"]""")
+_OUT_PATH_PATTERN = re.compile(r"Save the (?:figure as|new chart to) '([^'\n]+)'")
+_PATH_PLACEHOLDER = "{{{{LUMINA_PATH_{}}}}}"
+# Tamaño de los fragmentos SSE al servir una respuesta por streaming
+_STREAM_CHUNK_CHARS = 64
+# Fracción de la latencia sintética hasta el primer byte
+_SYNTHETIC_TTFB_FRACTION = 0.3
+
+_lock = threading.Lock()
+_recordings: dict[str, list] = {}
+_replay_counters: dict[str, int] = {}
+_rng = random.Random(config.LLM_TRANSPORT_SEED)
+
+
+# ---------- Peticiones ----------
+
+def _parse_call(request: httpx.Request) -> dict | None:
+    """
+    Extrae modelo, prompt, imagen y streaming de una petición a la API
+    Responses. Devuelve None para cualquier otra petición.
+    """
+    if request.method != "POST" or not request.url.path.endswith("/responses"):
+        return None
+    body = json.loads(request.content)
+    prompt, has_image = body.get("input", ""), False
+    if isinstance(prompt, list):
+        parts = [part for message in prompt for part in message.get("content", [])]
+        prompt = "\n".join(part["text"] for part in parts if part.get("type") == "input_text")
+        has_image = any(part.get("type") == "input_image" for part in parts)
+    return {"model": body.get("model", ""), "prompt": prompt, "has_image": has_image, "stream": bool(body.get("stream"))}
+
+
+def _normalize(prompt: str) -> tuple[str, list[str]]:
+    """Sustituye las rutas de gráficos del prompt por marcadores numerados."""
+    paths = list(dict.fromkeys(_PATH_PATTERN.findall(prompt)))
+    for i, path in enumerate(paths):
+        prompt = prompt.replace(path, _PATH_PLACEHOLDER.format(i))
+    return prompt, paths
+
+
+def _with_placeholders(text: str, paths: list[str]) -> str:
+    for i, path in enumerate(paths):
+        text = text.replace(path, _PATH_PLACEHOLDER.format(i))
+    return text
+
+
+def _restore_paths(text: str, paths: list[str]) -> str:
+    for i, path in enumerate(paths):
+        text = text.replace(_PATH_PLACEHOLDER.format(i), path)
+    return text
+
+
+def request_key(model: str, prompt: str, has_image: bool = False) -> str:
+    """
+    Clave de una grabación: modelo y prompt normalizado (sin rutas de
+    gráficos). La imagen no entra en la clave, solo si la petición llevaba una.
+    """
+    normalized, _ = _normalize(prompt)
+    payload = "\0".join((model, normalized, "image" if has_image else ""))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ---------- Grabaciones ----------
+
+def _recording_path(key: str) -> Path:
+    return Path(config.LLM_RECORDINGS_DIR) / f"{key}.json"
+
+
+def load_recordings(key: str) -> list[dict]:
+    """
+    Devuelve las grabaciones de una clave: [{"text", "latency", "ttfb"}, ...].
+    """
+    with _lock:
+        if key in _recordings:
+            return _recordings[key]
+    try:
+        entries = json.loads(_recording_path(key).read_text(encoding="utf-8"))["samples"]
+    except (OSError, ValueError, KeyError):
+        entries = []
+    with _lock:
+        return _recordings.setdefault(key, entries)
+
+
+def _append_recording(key: str, model: str, text: str, latency: float, ttfb: float) -> None:
+    samples = load_recordings(key)
+    with _lock:
+        samples.append({"text": text, "latency": round(latency, 4), "ttfb": round(ttfb, 4)})
+        payload = json.dumps({"model": model, "samples": samples}, ensure_ascii=False, indent=1)
+        path = _recording_path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(payload, encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Lumina LLM Transport Warning: Could not write recording: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+
+def clear_recordings() -> None:
+    """Olvida las grabaciones cargadas en memoria y los turnos de reproducción."""
+    with _lock:
+        _recordings.clear()
+        _replay_counters.clear()
+
+
+def _recorded_text(body: bytes, stream: bool) -> str:
+    """Texto de salida de una respuesta de la API (JSON o eventos SSE)."""
+    if stream:
+        deltas = []
+        for line in body.decode("utf-8").splitlines():
+            if line.startswith("data: "):
+                event = json.loads(line[len("data: "):])
+                if event.get("type") == "response.output_text.delta":
+                    deltas.append(event["delta"])
+        return "".join(deltas)
+    data = json.loads(body)
+    return "".join(
+        part.get("text", "")
+        for item in data.get("output", [])
+        for part in item.get("content", []) or []
+        if part.get("type") == "output_text"
+    )
+
+
+# ---------- Respuestas ----------
+
+def _response_body(model: str, text: str) -> dict:
+    return {
+        "id": f"resp_{hashlib.sha256(text.encode('utf-8')).hexdigest()[:24]}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "output": [{
+            "type": "message", "id": "msg_lumina", "role": "assistant", "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+    }
+
+
+def _sse_chunks(model: str, text: str) -> list[bytes]:
+    """Eventos SSE equivalentes a la respuesta por streaming de la API."""
+    events = [
+        {"type": "response.output_text.delta", "delta": text[i:i + _STREAM_CHUNK_CHARS], "item_id": "msg_lumina",
+         "output_index": 0, "content_index": 0, "logprobs": []}
+        for i in range(0, len(text), _STREAM_CHUNK_CHARS)
+    ]
+    events.append({"type": "response.completed", "response": _response_body(model, text)})
+    chunks = []
+    for n, event in enumerate(events):
+        event["sequence_number"] = n
+        chunks.append(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+    return chunks
+
+
+class _PacedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Cuerpo SSE cuyos fragmentos llegan repartidos en `duration` segundos."""
+
+    def __init__(self, chunks: list[bytes], duration: float):
+        self._chunks = chunks
+        self._gap = duration / len(chunks) if chunks else 0.0
+
+    def __iter__(self):
+        for n, chunk in enumerate(self._chunks):
+            if n and self._gap:
+                time.sleep(self._gap)
+            yield chunk
+
+    async def __aiter__(self):
+        for n, chunk in enumerate(self._chunks):
+            if n and self._gap:
+                await asyncio.sleep(self._gap)
+            yield chunk
+
+
+def _offline_response(call: dict, text: str, latency: float, ttfb: float) -> httpx.Response:
+    """
+    Respuesta con el formato de la API. Con streaming los fragmentos se
+    reparten entre el primer byte y la latencia total, de modo que cortar la
+    lectura al cerrarse el código ahorra tiempo igual que con la API real.
+    """
+    if call["stream"]:
+        stream = _PacedStream(_sse_chunks(call["model"], text), max(0.0, latency - ttfb))
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=stream)
+    return httpx.Response(200, json=_response_body(call["model"], text))
+
+
+def _error_response(status: int, message: str) -> httpx.Response:
+    return httpx.Response(status, json={"error": {"message": message, "type": "invalid_request_error"}})
+
+
+# ---------- Modo sintético ----------
+
+_DTYPE_PREFIXES = ("object", "string", "category", "bool", "int", "Int", "uint", "UInt", "float", "Float", "datetime64")
+_SCHEMA_LINE = re.compile(r"^\s*- (?P<name>[^:\n]+): (?P<dtype>[^;\s]+)(?P<details>;.*)?$", re.MULTILINE)
+
+
+def _schema_columns(prompt: str) -> list[tuple[str, str, bool]]:
+    """Columnas (nombre, tipo, baja cardinalidad) del esquema incluido en el prompt."""
+    return [
+        (m["name"], m["dtype"], "values:" in (m["details"] or ""))
+        for m in _SCHEMA_LINE.finditer(prompt)
+        if m["dtype"].startswith(_DTYPE_PREFIXES)
+    ]
+
+
+def synthetic_text(prompt: str, has_image: bool = False) -> str:
+    """
+    Respuesta sintética para un prompt del generador o del reflector: un
+    gráfico de barras del primer par categoría/valor numérico del esquema,
+    guardado en la ruta que pide el prompt.
+    """
+    match = _OUT_PATH_PATTERN.search(prompt) or _PATH_PATTERN.search(prompt)
+    out_path = match.group(1) if match else "chart.png"
+    columns = _schema_columns(prompt)
+    names = [name for name, _, _ in columns]
+
+    categorical = [name for name, dtype, low in columns if low and dtype.startswith(("object", "string", "category", "bool"))]
+    x = categorical[0] if categorical else ("year" if "year" in names else next(iter(names), None))
+    numeric = [
+        name for name, dtype, _ in columns
+        if dtype.startswith(("int", "Int", "uint", "UInt", "float", "Float"))
+        and name not in ("year", "quarter", "month", x)
+    ]
+
+    if x is None:
+        body = "ax.plot([0, 1], [0, 1])"
+    elif numeric:
+        body = f"df.groupby({x!r}, observed=True)[{numeric[0]!r}].sum().plot(kind='bar', ax=ax)"
+    else:
+        body = f"df[{x!r}].value_counts().plot(kind='bar', ax=ax)"
+    code = (
+        "<execute_python>\n"
+        "import matplotlib.pyplot as plt\n"
+        "fig, ax = plt.subplots()\n"
+        f"{body}\n"
+        "ax.set_title('Synthetic chart')\n"
+        f"fig.savefig(r{out_path!r})\n"
+        "plt.close(fig)\n"
+        "</execute_python>"
+    )
+    if has_image:
+        return '{"feedback": "Feedback sintético: añade etiquetas a los ejes."}\n' + code
+    return code
+
+
+def _synthetic_latency() -> tuple[float, float]:
+    """Latencia total log-normal (mediana LLM_TRANSPORT_SYNTHETIC_LATENCY) y primer byte."""
+    with _lock:
+        sample = _rng.gauss(0.0, config.LLM_TRANSPORT_SYNTHETIC_SIGMA)
+    latency = config.LLM_TRANSPORT_SYNTHETIC_LATENCY * math.exp(sample) * config.LLM_TRANSPORT_LATENCY_SCALE
+    return latency, latency * _SYNTHETIC_TTFB_FRACTION
+
+
+# ---------- Transporte ----------
+
+class LLMTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Transporte httpx (síncrono y asíncrono) para los clientes de OpenAI en los
+    modos "record", "replay" y "synthetic".
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self._inner = None
+        self._async_inner = None
+
+    # --- Reproducción y modo sintético (sin red) ---
+
+    def _plan_offline(self, call: dict | None):
+        """Devuelve (respuesta, espera hasta el primer byte)."""
+        if call is None:
+            return _error_response(404, f"Lumina LLM transport ({self.mode}) only serves the Responses API."), 0.0
+
+        if self.mode == "synthetic":
+            latency, ttfb = _synthetic_latency()
+            text = synthetic_text(call["prompt"], call["has_image"])
+        else:
+            key = request_key(call["model"], call["prompt"], call["has_image"])
+            samples = load_recordings(key)
+            if not samples:
+                logger.warning(f"Lumina LLM Transport Warning: No recording for {call['model']} request {key[:12]}.")
+                return _error_response(404, f"No recording for request {key}"), 0.0
+            with _lock:
+                turn = _replay_counters.get(key, 0)
+                _replay_counters[key] = turn + 1
+            sample = samples[turn % len(samples)]
+            _, paths = _normalize(call["prompt"])
+            text = _restore_paths(sample["text"], paths)
+            scale = config.LLM_TRANSPORT_LATENCY_SCALE
+            latency, ttfb = sample["latency"] * scale, sample["ttfb"] * scale
+
+        response = _offline_response(call, text, latency, ttfb)
+        return response, (ttfb if call["stream"] else latency)
+
+    def _record(self, call: dict | None, response: httpx.Response, body: bytes, latency: float, ttfb: float) -> None:
+        if call is None or response.status_code != 200:
+            return
+        decoded = httpx.Response(response.status_code, headers=response.headers, content=body).read()
+        _, paths = _normalize(call["prompt"])
+        text = _with_placeholders(_recorded_text(decoded, call["stream"]), paths)
+        key = request_key(call["model"], call["prompt"], call["has_image"])
+        _append_recording(key, call["model"], text, latency, ttfb)
+
+    # --- httpx ---
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        call = _parse_call(request)
+        if self.mode != "record":
+            response, wait = self._plan_offline(call)
+            time.sleep(wait)
+            return response
+
+        if self._inner is None:
+            self._inner = httpx.HTTPTransport()
+        start = time.perf_counter()
+        response = self._inner.handle_request(request)
+        chunks, ttfb = [], None
+        try:
+            for chunk in response.stream:
+                ttfb = ttfb if ttfb is not None else time.perf_counter() - start
+                chunks.append(chunk)
+        finally:
+            response.close()
+        body = b"".join(chunks)
+        latency = time.perf_counter() - start
+        self._record(call, response, body, latency, ttfb or latency)
+        return httpx.Response(response.status_code, headers=response.headers, content=body)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        call = _parse_call(request)
+        if self.mode != "record":
+            response, wait = self._plan_offline(call)
+            await asyncio.sleep(wait)
+            return response
+
+        if self._async_inner is None:
+            self._async_inner = httpx.AsyncHTTPTransport()
+        start = time.perf_counter()
+        response = await self._async_inner.handle_async_request(request)
+        chunks, ttfb = [], None
+        try:
+            async for chunk in response.stream:
+                ttfb = ttfb if ttfb is not None else time.perf_counter() - start
+                chunks.append(chunk)
+        finally:
+            await response.aclose()
+        body = b"".join(chunks)
+        latency = time.perf_counter() - start
+        self._record(call, response, body, latency, ttfb or latency)
+        return httpx.Response(response.status_code, headers=response.headers, content=body)
+
+    def close(self) -> None:
+        if self._inner is not None:
+            self._inner.close()
+
+    async def aclose(self) -> None:
+        if self._async_inner is not None:
+            await self._async_inner.aclose()
+
+
+def make_transport(mode: str | None = None) -> LLMTransport | None:
+    """
+    Crea el transporte para `mode` (por defecto LLM_TRANSPORT). Devuelve None
+    en modo "network": los clientes usan la red con el transporte de httpx.
+
+    Raises:
+        ValueError: Si el modo no es uno de MODES.
+    """
+    mode = mode or config.LLM_TRANSPORT
+    if mode not in MODES:
+        raise ValueError(f"Modo de transporte del LLM desconocido: {mode!r} (opciones: {', '.join(MODES)})")
+    if mode == "network":
+        return None
+    logger.info(f"Lumina LLM Transport: OpenAI clients use the offline '{mode}' transport.")
+    return LLMTransport(mode)
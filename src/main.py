@@ -1,28 +1,412 @@
-
-
 # =============================================================================
 # RESPONSABILIDAD ÚNICA DE ESTE MODULO
 # Script principal que orquesta todo el workflow
 # Ejecuta el proceso de generación, ejecución, reflexión y refinamiento
 # =============================================================================
 
+import os
+import asyncio
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
 import pandas as pd
 from . import config
 from . import data_processing
 from . import generator
 from . import reflector
 from . import executor
+from . import exec_pool
+from . import llm_cache
+from . import workflow_memo
 
 # Configurar logger para este módulo
 logger = logging.getLogger(__name__)
 
 
+def _output_paths(image_basename: str, output_dir: str | None = None) -> tuple[str, str]:
+    """Rutas donde se guardan los gráficos V1 y V2 (por defecto en CHARTS_DIR)."""
+    logger.debug("Setting up output paths...")
+    charts_dir = Path(output_dir) if output_dir is not None else config.CHARTS_DIR
+    out_path_v1 = str(charts_dir / f"{image_basename}_v1.png")
+    out_path_v2 = str(charts_dir / f"{image_basename}_v2.png")
+    return out_path_v1, out_path_v2
+
+
+def _load_inputs(use_data_cache: bool | None = None) -> tuple[pd.DataFrame | None, dict | None]:
+    """
+    Carga los datos según la configuración y sus agregados precalculados.
+    Devuelve (None, None) si no hay datos.
+    """
+    logger.debug("Deciding data source based on configuration...")
+    df = data_processing.load_configured_data(use_cache=use_data_cache)
+
+    if df is None or df.empty:
+        logger.error("Lumina Workflow Error: No data loaded. Please check data source configuration in .env or config.py.")
+        return None, None
+
+    logger.debug("Data loaded successfully.")
+
+    # Agregados precalculados (una vez por versión del dataset)
+    aggs = data_processing.get_aggregate_cube(df) if config.AGGREGATE_CUBE_ENABLED else None
+    return df, aggs
+
+
+def _render_profile(name: str | None, dpi: int | None = None, image_format: str | None = None) -> dict | None:
+    """
+    Perfil de renderizado `name` de RENDER_PROFILES (None si los perfiles están
+    desactivados), con el dpi y el formato opcionalmente sustituidos.
+    """
+    if name is None or not config.RENDER_PROFILES_ENABLED:
+        profile = {}
+    else:
+        profile = dict(config.RENDER_PROFILES[name])
+    if dpi is not None:
+        profile["dpi"] = dpi
+    if image_format is not None:
+        profile["format"] = image_format
+    return profile or None
+
+
+def _execute(
+    code_response: str,
+    df: pd.DataFrame,
+    aggs: dict | None,
+    exec_info: dict,
+    figures: dict | None = None,
+    profile: str | None = None,
+    dpi: int | None = None,
+    image_format: str | None = None,
+) -> bool:
+    """
+    Ejecuta una respuesta del LLM con las opciones de ejecución configuradas.
+    Con `figures` los gráficos se capturan en memoria, y la ejecución falla si
+    el código no guardó ninguno. `profile` es el perfil de renderizado
+    ("draft" o "final"); `dpi` e `image_format` sustituyen los suyos.
+    """
+    render_profile = _render_profile(profile, dpi, image_format)
+    if render_profile is not None:
+        exec_info["render_profile"] = {"name": profile, "dpi": render_profile.get("dpi")}
+    if config.EXECUTION_MODE == "pool":
+        success = exec_pool.execute(
+            code_response, df, aggs, prune_columns=config.COLUMN_PRUNING_ENABLED, exec_info=exec_info,
+            figures=figures, render_profile=render_profile,
+        )
+    else:
+        success = executor.extract_and_execute_code(
+            code_response, df, aggs, prune_columns=config.COLUMN_PRUNING_ENABLED, exec_info=exec_info,
+            figures=figures, render_profile=render_profile,
+        )
+    if success and figures is not None and not figures:
+        logger.error("Lumina Workflow Error: The generated code did not save any figure.")
+        exec_info["error"] = "NoChart: the code did not call savefig"
+        return False
+    return success
+
+
+# ---------- Re-renderizado del gráfico final ----------
+# El V2 se entrega con el perfil final; si un cliente lo necesita con otra
+# resolución o formato, se vuelve a ejecutar su código (sin LLM) con ese perfil.
+# Se guarda el código de los últimos RERENDER_CACHE_SIZE gráficos por chart_id.
+
+_render_sources: OrderedDict[str, tuple[str, str]] = OrderedDict()
+_render_sources_lock = threading.Lock()
+
+
+def _remember_render_source(out_path_v2: str, code_v2: str) -> str:
+    """Registra el código V2 de un gráfico y devuelve su chart_id (el nombre base)."""
+    chart_id = os.path.basename(out_path_v2).removesuffix("_v2.png")
+    with _render_sources_lock:
+        _render_sources[chart_id] = (code_v2, out_path_v2)
+        _render_sources.move_to_end(chart_id)
+        while len(_render_sources) > config.RERENDER_CACHE_SIZE:
+            _render_sources.popitem(last=False)
+    return chart_id
+
+
+def rerender_chart(chart_id: str, dpi: int | None = None, image_format: str | None = None) -> bytes | None:
+    """
+    Vuelve a renderizar el gráfico final de un workflow con otro dpi y/o formato.
+    El resultado solo se devuelve en memoria; no se escribe en CHARTS_DIR.
+
+    Args:
+        chart_id: El "chart_id" de los resultados del workflow.
+        dpi: Resolución (por defecto la del perfil V2_RENDER_PROFILE).
+        image_format: Formato de imagen ("png", "jpg", "svg", "pdf"...).
+
+    Returns:
+        Los bytes de la imagen, o None si el chart_id no se conoce o el código falla.
+    """
+    with _render_sources_lock:
+        source = _render_sources.get(chart_id)
+    if source is None:
+        logger.warning(f"Lumina Workflow Warning: Unknown chart id '{chart_id}' for re-rendering.")
+        return None
+    code_v2, out_path_v2 = source
+
+    df, aggs = _load_inputs()
+    if df is None:
+        return None
+    figures, exec_info = {}, {}
+    if not _execute(code_v2, df, aggs, exec_info, figures, config.V2_RENDER_PROFILE, dpi, image_format):
+        logger.error(f"Lumina Workflow Error: Re-rendering '{chart_id}' failed: {exec_info.get('error')}")
+        return None
+    return _captured_chart(figures, out_path_v2)
+
+
+async def rerender_chart_async(
+    chart_id: str, dpi: int | None = None, image_format: str | None = None
+) -> bytes | None:
+    """Versión asíncrona de `rerender_chart` (se ejecuta en el ejecutor del código generado)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_execution_executor(), rerender_chart, chart_id, dpi, image_format)
+
+
+# ---------- Gráficos en memoria ----------
+# Con FIGURE_CAPTURE_ENABLED el código generado renderiza en memoria: los bytes
+# van directamente al reflector y a la respuesta, y la escritura en disco
+# (PERSIST_CHARTS) se hace en segundo plano mientras el workflow sigue.
+
+_persist_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lumina-persist")
+
+
+def _new_figures() -> dict | None:
+    """Diccionario de captura, o None si el código generado escribe en disco."""
+    return {} if config.FIGURE_CAPTURE_ENABLED else None
+
+
+def _writes_charts(persist_charts: bool) -> bool:
+    """True si los gráficos terminan en disco (escritos por el código o persistidos)."""
+    return not config.FIGURE_CAPTURE_ENABLED or persist_charts
+
+
+def _captured_chart(figures: dict | None, out_path: str) -> bytes | None:
+    """
+    Bytes del gráfico que el código guardó en `out_path` (o del último que
+    guardó, si usó otra ruta). None si no hay captura.
+    """
+    if not figures:
+        return None
+    return figures.get(out_path, list(figures.values())[-1])
+
+
+def _write_chart(path: str, data: bytes) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _replay_path(path: str) -> str:
+    """Ruta temporal junto a `path`, con su extensión (savefig deduce el formato)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid()}.{threading.get_ident()}.replay{ext}"
+
+
+def _persist_chart(path: str, data: bytes | None, persist_charts: bool) -> Future | None:
+    """Programa la escritura en disco de un gráfico capturado (si `persist_charts`)."""
+    if data is None or not persist_charts:
+        return None
+    return _persist_pool.submit(_write_chart, path, data)
+
+
+def _wait_persisted(pending: list[Future | None]) -> None:
+    """Espera a las escrituras pendientes: las rutas devueltas deben existir."""
+    for future in pending:
+        if future is None:
+            continue
+        try:
+            future.result()
+        except OSError as e:
+            logger.warning(f"Lumina Workflow Warning: Could not persist chart: {e}")
+
+
+def _log_feedback(feedback: str) -> None:
+    logger.debug("Feedback received from reflector:")
+    # Reemplaza caracteres no soportados para evitar errores en la consola de Windows
+    safe_feedback = feedback.encode("cp1252", errors="replace").decode("cp1252")
+    logger.debug(safe_feedback)
+
+
+def _no_data_result() -> dict:
+    return {"status": "Error", "message": "No se pudieron cargar los datos."}
+
+
+def _chart_images(chart_v1: bytes | None, chart_v2: bytes | None) -> dict | None:
+    if not config.FIGURE_CAPTURE_ENABLED:
+        return None
+    return {"v1": chart_v1, "v2": chart_v2}
+
+
+def _v1_error_result(exec_info_v1: dict) -> dict:
+    logger.error("Lumina Workflow Error: Stopping workflow due to a critical error in V1 code execution.")
+    return {
+        "status": "Error en V1",
+        "v1_success": False,
+        "chart_v1_path": None,
+        "feedback": None,
+        "v2_success": False,
+        "chart_v2_path": None,
+        "execution": {"v1": exec_info_v1, "v2": {}},
+    }
+
+
+def _v2_error_result(
+    out_path_v1: str,
+    feedback: str,
+    exec_info_v1: dict,
+    exec_info_v2: dict,
+    vision_image: dict | None = None,
+    chart_v1: bytes | None = None,
+    persist_charts: bool = True,
+) -> dict:
+    logger.error("Lumina Workflow Warning: Could not generate V2 chart due to an error in refined code execution. V1 chart is still available.")
+    return {
+        "status": "Error en V2",
+        "v1_success": True,
+        "chart_v1_path": out_path_v1 if _writes_charts(persist_charts) else None,
+        "feedback": feedback,
+        "v2_success": False,
+        "chart_v2_path": None,
+        "execution": {"v1": exec_info_v1, "v2": exec_info_v2},
+        "vision_image": vision_image,
+        "chart_images": _chart_images(chart_v1, None),
+    }
+
+
+def _completed_result(
+    out_path_v1: str,
+    out_path_v2: str,
+    feedback: str,
+    exec_info_v1: dict,
+    exec_info_v2: dict,
+    memo: str | None = None,
+    vision_image: dict | None = None,
+    charts: tuple[bytes | None, bytes | None] = (None, None),
+    code_v2: str | None = None,
+    persist_charts: bool = True,
+) -> dict:
+    logger.info(f"Grafico V2 mejorado y guardado en: {out_path_v2}")
+    logger.info("Lumina AI Workflow completado exitosamente.")
+    chart_id = _remember_render_source(out_path_v2, code_v2) if code_v2 is not None else None
+    return {
+        "status": "Completed",
+        "v1_success": True,
+        "chart_v1_path": out_path_v1 if _writes_charts(persist_charts) else None,
+        "feedback": feedback,
+        "v2_success": True,
+        "chart_v2_path": out_path_v2 if _writes_charts(persist_charts) else None,
+        "execution": {"v1": exec_info_v1, "v2": exec_info_v2},
+        # "charts": gráficos servidos desde la memoización; "code": código memorizado re-ejecutado
+        "memo": memo,
+        # Informe de la imagen enviada al reflector (None si se sirvió de la memoización)
+        "vision_image": vision_image,
+        # Bytes de los gráficos capturados en memoria (None sin FIGURE_CAPTURE_ENABLED)
+        "chart_images": _chart_images(*charts),
+        # Identificador para volver a renderizar el gráfico final (rerender_chart)
+        "chart_id": chart_id,
+    }
+
+
+def _profile_summary(results: dict) -> dict | None:
+    """Perfiles de las ejecuciones V1/V2 (EXEC_PROFILING_ENABLED), o None si no hay."""
+    execution = results.get("execution") or {}
+    profiles = {version: info["profile"] for version, info in execution.items() if info and "profile" in info}
+    return profiles or None
+
+
+def _memo_lookup(
+    df: pd.DataFrame, user_instructions: str, generation_model: str, reflection_model: str
+) -> tuple[str, str, dict | None]:
+    """
+    Calcula la clave de memoización del workflow y busca una entrada previa.
+    Devuelve (clave, hash del contenido, entrada o None).
+    """
+    fingerprint = data_processing.get_dataset_fingerprint(df)
+    memo_key = workflow_memo.make_key(user_instructions, generation_model, reflection_model, fingerprint["schema"])
+    return memo_key, fingerprint["content"], workflow_memo.load(memo_key)
+
+
+def _replay_memo(
+    memo: dict,
+    memo_key: str,
+    content_hash: str,
+    df: pd.DataFrame,
+    aggs: dict | None,
+    out_path_v1: str,
+    out_path_v2: str,
+    persist_charts: bool,
+) -> dict | None:
+    """
+    Resuelve el workflow desde una entrada memorizada, sin llamar al LLM.
+
+    Si los datos no han cambiado se copian los gráficos guardados; si han
+    cambiado se re-ejecuta el código V1/V2 guardado contra los datos actuales.
+    Devuelve None si no se pudo reproducir (el llamador ejecuta el workflow completo).
+    """
+    exec_info_v1, exec_info_v2 = {}, {}
+    if memo["content_hash"] == content_hash:
+        charts = workflow_memo.load_charts(memo_key)
+        if charts is not None:
+            logger.info("Lumina Workflow: Serving memoized charts (same instruction, models and data).")
+            if _writes_charts(persist_charts):
+                _write_chart(out_path_v1, charts[0])
+                _write_chart(out_path_v2, charts[1])
+            return _completed_result(
+                out_path_v1, out_path_v2, memo["feedback"], exec_info_v1, exec_info_v2, memo="charts", charts=charts,
+                code_v2=workflow_memo.code_for(memo, "v2", out_path_v2), persist_charts=persist_charts,
+            )
+
+    logger.info("Lumina Workflow: Data changed since memoization, re-executing stored code.")
+    code_v1 = workflow_memo.code_for(memo, "v1", out_path_v1)
+    code_v2 = workflow_memo.code_for(memo, "v2", out_path_v2)
+    # El código se re-ejecuta contra rutas temporales: si falla, los gráficos
+    # anteriores siguen en su sitio; si termina, se mueven a las definitivas
+    tmp_v1, tmp_v2 = _replay_path(out_path_v1), _replay_path(out_path_v2)
+
+    figures_v1, figures_v2 = _new_figures(), _new_figures()
+    try:
+        replayed = (
+            _execute(workflow_memo.code_for(memo, "v1", tmp_v1), df, aggs, exec_info_v1, figures_v1, config.V1_RENDER_PROFILE)
+            and _execute(workflow_memo.code_for(memo, "v2", tmp_v2), df, aggs, exec_info_v2, figures_v2, config.V2_RENDER_PROFILE)
+            and (config.FIGURE_CAPTURE_ENABLED or (os.path.exists(tmp_v1) and os.path.exists(tmp_v2)))
+        )
+        if replayed and not config.FIGURE_CAPTURE_ENABLED:
+            os.replace(tmp_v1, out_path_v1)
+            os.replace(tmp_v2, out_path_v2)
+    finally:
+        for path in (tmp_v1, tmp_v2):
+            if os.path.exists(path):
+                os.remove(path)
+    if not replayed:
+        logger.warning("Lumina Workflow Warning: Memoized code could not be replayed, running the full workflow.")
+        return None
+
+    charts = (_captured_chart(figures_v1, tmp_v1), _captured_chart(figures_v2, tmp_v2))
+    _wait_persisted([
+        _persist_chart(out_path_v1, charts[0], persist_charts), _persist_chart(out_path_v2, charts[1], persist_charts),
+    ])
+    workflow_memo.store(
+        memo_key, content_hash, code_v1, code_v2, memo["feedback"], out_path_v1, out_path_v2,
+        charts=charts if config.FIGURE_CAPTURE_ENABLED else None,
+    )
+    return _completed_result(
+        out_path_v1, out_path_v2, memo["feedback"], exec_info_v1, exec_info_v2, memo="code", charts=charts,
+        code_v2=code_v2, persist_charts=persist_charts,
+    )
+
+
 def run_workflow(
     user_instructions: str,
     generation_model: str,
     reflection_model: str,
     image_basename: str = "chart",
+    on_feedback: Callable[[str], None] | None = None,
+    output_dir: str | None = None,
+    persist_charts: bool | None = None,
+    use_data_cache: bool | None = None,
 ) -> dict:
     """
     Ejecuta el pipeline completo de generación y refinamiento de gráficos.
@@ -34,26 +418,55 @@ def run_workflow(
         generation_model: Modelo para generar código inicial
         reflection_model: Modelo para reflexionar y mejorar
         image_basename: Nombre base para los archivos de salida
+        on_feedback: Función opcional que recibe el feedback del reflector en
+                     cuanto está disponible (con streaming, antes que el código V2)
+        output_dir: Directorio de los gráficos (por defecto CHARTS_DIR)
+        persist_charts: Guardar en disco los gráficos capturados (por defecto
+                        PERSIST_CHARTS)
+        use_data_cache: Reutilizar el DataFrame en caché (por defecto
+                        DATA_CACHE_ENABLED)
 
     Returns:
         Diccionario con resultados del pipeline
     """
+    with llm_cache.track() as cache_stats:
+        results = _run_workflow(
+            user_instructions, generation_model, reflection_model, image_basename, on_feedback, output_dir,
+            config.PERSIST_CHARTS if persist_charts is None else persist_charts, use_data_cache,
+        )
+    results["llm_cache"] = cache_stats
+    results["profile"] = _profile_summary(results)
+    return results
+
+
+def _run_workflow(
+    user_instructions: str,
+    generation_model: str,
+    reflection_model: str,
+    image_basename: str,
+    on_feedback: Callable[[str], None] | None,
+    output_dir: str | None,
+    persist_charts: bool,
+    use_data_cache: bool | None,
+) -> dict:
     logger.info("Iniciando Lumina AI Workflow...")
 
     # 1. Configurar rutas para guardar los gráficos
-    logger.debug("Setting up output paths...")
-    out_path_v1 = str(config.CHARTS_DIR / f"{image_basename}_v1.png")
-    out_path_v2 = str(config.CHARTS_DIR / f"{image_basename}_v2.png")
+    out_path_v1, out_path_v2 = _output_paths(image_basename, output_dir)
 
     # 2. Cargar datos según la configuración
-    logger.debug("Deciding data source based on configuration...")
-    df = data_processing.load_configured_data()
+    df, aggs = _load_inputs(use_data_cache)
+    if df is None:
+        return _no_data_result()
 
-    if df is None or df.empty:
-        logger.error("Lumina Workflow Error: No data loaded. Please check data source configuration in .env or config.py.")
-        return {"status": "Error", "message": "No se pudieron cargar los datos."}
-
-    logger.debug("Data loaded successfully.")
+    # 2.1. Si esta instrucción ya se resolvió con estos modelos y este esquema, no se llama al LLM
+    memo_key, content_hash, memo = _memo_lookup(df, user_instructions, generation_model, reflection_model)
+    if memo is not None:
+        results = _replay_memo(memo, memo_key, content_hash, df, aggs, out_path_v1, out_path_v2, persist_charts)
+        if results is not None:
+            if on_feedback is not None:
+                on_feedback(results["feedback"])
+            return results
 
     # 3. Ejecutar pipeline de generación de gráficos V1→V2
     logger.debug(f"Lumina Workflow - Step 1 (Generate): Using {generation_model} to generate initial code.")
@@ -62,23 +475,21 @@ def run_workflow(
         model=generation_model,
         out_path_v1=out_path_v1,
         df=df,
+        aggs=aggs,
+        stream=config.LLM_STREAMING_ENABLED,
     )
 
     # 3.1. Ejecutar V1 (con verificación)
     logger.debug("Lumina Workflow - Step 2 (Execute V1): Executing initial code.")
-    v1_success = executor.extract_and_execute_code(code_v1_response, df)
-    if not v1_success:
-        logger.error("Lumina Workflow Error: Stopping workflow due to a critical error in V1 code execution.")
-        return {
-            "status": "Error en V1",
-            "v1_success": False,
-            "chart_v1_path": None,
-            "feedback": None,
-            "v2_success": False,
-            "chart_v2_path": None,
-        }
+    exec_info_v1, exec_info_v2, vision_image = {}, {}, {}
+    figures_v1, figures_v2 = _new_figures(), _new_figures()
+    if not _execute(code_v1_response, df, aggs, exec_info_v1, figures_v1, config.V1_RENDER_PROFILE):
+        return _v1_error_result(exec_info_v1)
 
     logger.info(f"Grafico V1 guardado en: {out_path_v1}")
+    # El V1 se escribe en disco mientras el reflector lo analiza desde memoria
+    chart_v1 = _captured_chart(figures_v1, out_path_v1)
+    pending = [_persist_chart(out_path_v1, chart_v1, persist_charts)]
 
     # 4. Reflexionar sobre V1 para obtener feedback y código V2
     logger.debug(f"Lumina Workflow - Step 3 (Reflect): Using {reflection_model} to analyze V1 chart.")
@@ -89,38 +500,187 @@ def run_workflow(
         out_path_v2=out_path_v2,
         code_v1=code_v1_response,
         schema=schema,
+        stream=config.LLM_STREAMING_ENABLED,
+        on_feedback=on_feedback,
+        image_info=vision_image,
+        chart_image=chart_v1,
     )
-    logger.debug("Feedback received from reflector:")
-    # Reemplaza caracteres no soportados para evitar errores en la consola de Windows
-    safe_feedback = feedback.encode("cp1252", errors="replace").decode("cp1252")
-    logger.debug(safe_feedback)
+    _log_feedback(feedback)
 
     # 5. Ejecutar V2 (con verificación)
     logger.debug("Lumina Workflow - Step 4 (Execute V2): Executing refined code.")
-    v2_success = executor.extract_and_execute_code(code_v2_response, df)
-    if not v2_success:
-        logger.error("Lumina Workflow Warning: Could not generate V2 chart due to an error in refined code execution. V1 chart is still available.")
-        return {
-            "status": "Error en V2",
-            "v1_success": True,
-            "chart_v1_path": out_path_v1,
-            "feedback": feedback,
-            "v2_success": False,
-            "chart_v2_path": None,
-        }
+    if not _execute(code_v2_response, df, aggs, exec_info_v2, figures_v2, config.V2_RENDER_PROFILE):
+        _wait_persisted(pending)
+        return _v2_error_result(
+            out_path_v1, feedback, exec_info_v1, exec_info_v2, vision_image, chart_v1, persist_charts
+        )
 
-    logger.info(f"Grafico V2 mejorado y guardado en: {out_path_v2}")
-    logger.info("Lumina AI Workflow completado exitosamente.")
+    chart_v2 = _captured_chart(figures_v2, out_path_v2)
+    pending.append(_persist_chart(out_path_v2, chart_v2, persist_charts))
+    _wait_persisted(pending)
 
-    # 6. Devolver el diccionario de resultados
-    return {
-        "status": "Completed",
-        "v1_success": True,
-        "chart_v1_path": out_path_v1,
-        "feedback": feedback,
-        "v2_success": True,
-        "chart_v2_path": out_path_v2,
-    }
+    # 6. Memorizar y devolver el diccionario de resultados
+    workflow_memo.store(
+        memo_key, content_hash, code_v1_response, code_v2_response, feedback, out_path_v1, out_path_v2,
+        charts=(chart_v1, chart_v2) if config.FIGURE_CAPTURE_ENABLED else None,
+    )
+    return _completed_result(
+        out_path_v1, out_path_v2, feedback, exec_info_v1, exec_info_v2,
+        vision_image=vision_image, charts=(chart_v1, chart_v2), code_v2=code_v2_response,
+        persist_charts=persist_charts,
+    )
+
+
+# Ejecutor dedicado para el código generado. Con PYPLOT_THREAD_ISOLATION cada
+# hilo tiene sus propias figuras de pyplot y varios gráficos se renderizan a la
+# vez; sin él, pyplot tiene estado global y las ejecuciones se serializan en un
+# único hilo. Las esperas al LLM siguen siendo concurrentes en ambos casos.
+_exec_pool = ThreadPoolExecutor(
+    max_workers=config.EXEC_THREADS if config.PYPLOT_THREAD_ISOLATION else 1, thread_name_prefix="lumina-exec"
+)
+
+
+def _execution_executor() -> ThreadPoolExecutor | None:
+    """En modo 'pool' cada ejecución va a otro proceso, así que no hace falta serializarlas."""
+    return None if config.EXECUTION_MODE == "pool" else _exec_pool
+
+
+async def run_workflow_async(
+    user_instructions: str,
+    generation_model: str,
+    reflection_model: str,
+    image_basename: str = "chart",
+    on_feedback: Callable[[str], None] | None = None,
+    output_dir: str | None = None,
+    persist_charts: bool | None = None,
+    use_data_cache: bool | None = None,
+) -> dict:
+    """
+    Versión asíncrona de `run_workflow`.
+
+    Las llamadas al LLM usan el cliente asíncrono compartido, la carga de datos
+    se hace en un hilo y la ejecución del código generado en el ejecutor
+    dedicado, de modo que el event loop puede atender cientos de workflows en
+    vuelo a la vez.
+
+    Args:
+        user_instructions: Instrucciones para generar el gráfico
+        generation_model: Modelo para generar código inicial
+        reflection_model: Modelo para reflexionar y mejorar
+        image_basename: Nombre base para los archivos de salida
+        on_feedback: Función opcional que recibe el feedback del reflector en
+                     cuanto está disponible (con streaming, antes que el código V2)
+        output_dir: Directorio de los gráficos (por defecto CHARTS_DIR)
+        persist_charts: Guardar en disco los gráficos capturados (por defecto
+                        PERSIST_CHARTS)
+        use_data_cache: Reutilizar el DataFrame en caché (por defecto
+                        DATA_CACHE_ENABLED)
+
+    Returns:
+        Diccionario con resultados del pipeline (mismo formato que `run_workflow`)
+    """
+    with llm_cache.track() as cache_stats:
+        results = await _run_workflow_async(
+            user_instructions, generation_model, reflection_model, image_basename, on_feedback, output_dir,
+            config.PERSIST_CHARTS if persist_charts is None else persist_charts, use_data_cache,
+        )
+    results["llm_cache"] = cache_stats
+    results["profile"] = _profile_summary(results)
+    return results
+
+
+async def _run_workflow_async(
+    user_instructions: str,
+    generation_model: str,
+    reflection_model: str,
+    image_basename: str,
+    on_feedback: Callable[[str], None] | None,
+    output_dir: str | None,
+    persist_charts: bool,
+    use_data_cache: bool | None,
+) -> dict:
+    logger.info("Iniciando Lumina AI Workflow (async)...")
+    loop = asyncio.get_running_loop()
+
+    out_path_v1, out_path_v2 = _output_paths(image_basename, output_dir)
+
+    df, aggs = await asyncio.to_thread(_load_inputs, use_data_cache)
+    if df is None:
+        return _no_data_result()
+
+    memo_key, content_hash, memo = await asyncio.to_thread(
+        _memo_lookup, df, user_instructions, generation_model, reflection_model
+    )
+    if memo is not None:
+        results = await loop.run_in_executor(
+            _execution_executor(), _replay_memo, memo, memo_key, content_hash, df, aggs, out_path_v1, out_path_v2,
+            persist_charts,
+        )
+        if results is not None:
+            if on_feedback is not None:
+                on_feedback(results["feedback"])
+            return results
+
+    logger.debug(f"Lumina Workflow - Step 1 (Generate): Using {generation_model} to generate initial code.")
+    code_v1_response, schema = await generator.generate_chart_code_async(
+        instruction=user_instructions,
+        model=generation_model,
+        out_path_v1=out_path_v1,
+        df=df,
+        aggs=aggs,
+        stream=config.LLM_STREAMING_ENABLED,
+    )
+
+    logger.debug("Lumina Workflow - Step 2 (Execute V1): Executing initial code.")
+    exec_info_v1, exec_info_v2, vision_image = {}, {}, {}
+    figures_v1, figures_v2 = _new_figures(), _new_figures()
+    if not await loop.run_in_executor(
+        _execution_executor(), _execute, code_v1_response, df, aggs, exec_info_v1, figures_v1, config.V1_RENDER_PROFILE
+    ):
+        return _v1_error_result(exec_info_v1)
+
+    logger.info(f"Grafico V1 guardado en: {out_path_v1}")
+    chart_v1 = _captured_chart(figures_v1, out_path_v1)
+    pending = [_persist_chart(out_path_v1, chart_v1, persist_charts)]
+
+    logger.debug(f"Lumina Workflow - Step 3 (Reflect): Using {reflection_model} to analyze V1 chart.")
+    feedback, code_v2_response = await reflector.reflect_on_image_and_regenerate_async(
+        chart_path=out_path_v1,
+        instruction=user_instructions,
+        model_name=reflection_model,
+        out_path_v2=out_path_v2,
+        code_v1=code_v1_response,
+        schema=schema,
+        stream=config.LLM_STREAMING_ENABLED,
+        on_feedback=on_feedback,
+        image_info=vision_image,
+        chart_image=chart_v1,
+    )
+    _log_feedback(feedback)
+
+    logger.debug("Lumina Workflow - Step 4 (Execute V2): Executing refined code.")
+    if not await loop.run_in_executor(
+        _execution_executor(), _execute, code_v2_response, df, aggs, exec_info_v2, figures_v2, config.V2_RENDER_PROFILE
+    ):
+        await asyncio.to_thread(_wait_persisted, pending)
+        return _v2_error_result(
+            out_path_v1, feedback, exec_info_v1, exec_info_v2, vision_image, chart_v1, persist_charts
+        )
+
+    chart_v2 = _captured_chart(figures_v2, out_path_v2)
+    pending.append(_persist_chart(out_path_v2, chart_v2, persist_charts))
+    await asyncio.to_thread(_wait_persisted, pending)
+
+    await asyncio.to_thread(
+        workflow_memo.store,
+        memo_key, content_hash, code_v1_response, code_v2_response, feedback, out_path_v1, out_path_v2,
+        (chart_v1, chart_v2) if config.FIGURE_CAPTURE_ENABLED else None,
+    )
+    return _completed_result(
+        out_path_v1, out_path_v2, feedback, exec_info_v1, exec_info_v2,
+        vision_image=vision_image, charts=(chart_v1, chart_v2), code_v2=code_v2_response,
+        persist_charts=persist_charts,
+    )
 
 
 if __name__ == "__main__":
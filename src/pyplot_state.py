@@ -0,0 +1,244 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Permitir que varios gráficos se rendericen a la vez en hilos de un mismo
+# proceso, aunque el código generado use el estado global de pyplot:
+# - la lista de figuras de pyplot (y con ella la figura "actual" de plt.gcf(),
+#   plt.plot(), plt.savefig()...) pasa a ser propia de cada hilo;
+# - los parámetros rc, que matplotlib guarda en un único diccionario global,
+#   se protegen con una compuerta: las ejecuciones con los mismos rc pueden
+#   solaparse y el código que cambia los rc (plt.rcParams[...] = ...,
+#   plt.rc(), plt.style.context()...) se ejecuta en exclusiva; al terminar se
+#   restauran los rc.
+# - un plt.style.use('<estilo>') en el nivel superior del código, con estilos
+#   de la biblioteca de matplotlib, no necesita exclusividad: sus rc se
+#   aplican con la compuerta antes de ejecutar, así que las ejecuciones con el
+#   mismo estilo se solapan y la llamada solo reescribe los mismos valores.
+# NOTA: una vez instalado, cada hilo solo ve sus propias figuras.
+# =============================================================================
+
+import ast
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import matplotlib
+import matplotlib.style
+from matplotlib import _pylab_helpers
+from matplotlib.style.core import STYLE_BLACKLIST
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+_install_lock = threading.Lock()
+_originals: dict = {}
+
+# Funciones que cambian los rc globales
+_RC_CALLS = {"rc", "rcdefaults", "rc_file", "rc_file_defaults", "rc_context", "xkcd"}
+_RC_NAMES = {"rcParams", "rcParamsDefault", "rcParamsOrig"}
+
+
+# ---------- Figuras por hilo ----------
+
+class _ThreadFigures:
+    """Sustituto de Gcf.figs: cada hilo tiene su propio OrderedDict de figuras."""
+
+    def __init__(self, initial: OrderedDict):
+        self._local = threading.local()
+        # El hilo que instala conserva las figuras que ya tenía abiertas
+        self._local.figs = initial
+
+    def _figs(self) -> OrderedDict:
+        figs = getattr(self._local, "figs", None)
+        if figs is None:
+            figs = self._local.figs = OrderedDict()
+        return figs
+
+    def __getattr__(self, name):
+        return getattr(self._figs(), name)
+
+    def __iter__(self):
+        return iter(self._figs())
+
+    def __reversed__(self):
+        return reversed(self._figs())
+
+    def __len__(self):
+        return len(self._figs())
+
+    def __bool__(self):
+        return bool(self._figs())
+
+    def __contains__(self, num):
+        return num in self._figs()
+
+    def __getitem__(self, num):
+        return self._figs()[num]
+
+    def __setitem__(self, num, manager):
+        self._figs()[num] = manager
+
+    def __delitem__(self, num):
+        del self._figs()[num]
+
+
+# ---------- Compuerta de parámetros rc ----------
+
+class _RcGate:
+    """
+    Orden de llegada (FIFO) con admisión por grupos: entra quien está el
+    primero de la cola si no hay nadie dentro o si los de dentro usan los
+    mismos rc. Una ejecución exclusiva espera a que el proceso quede libre.
+    """
+
+    _EXCLUSIVE = object()
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._active = 0
+        self._key = None
+        self._context = None
+
+    @contextmanager
+    def enter(self, rc: dict, exclusive: bool = False):
+        key = self._EXCLUSIVE if exclusive else repr(sorted(rc.items()))
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            while not (
+                self._queue[0] is ticket
+                and (self._active == 0 or (key is not self._EXCLUSIVE and key == self._key))
+            ):
+                self._cond.wait()
+            self._queue.popleft()
+            if self._active == 0:
+                # El primero del grupo aplica los rc; el último los restaura
+                self._key = key
+                self._context = matplotlib.rc_context(rc)
+                self._context.__enter__()
+            self._active += 1
+            # El siguiente de la cola puede ser compatible con este grupo
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                if self._active == 0:
+                    context, self._context, self._key = self._context, None, None
+                    context.__exit__(None, None, None)
+                self._cond.notify_all()
+
+
+_gate = _RcGate()
+
+
+def _is_style_call(node: ast.AST, method: str) -> bool:
+    """Indica si el nodo es una llamada <algo>.style.<method>(...) o style.<method>(...)."""
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute) or node.func.attr != method:
+        return False
+    owner = node.func.value
+    return getattr(owner, "attr", getattr(owner, "id", None)) == "style"
+
+
+def _library_styles(call: ast.Call) -> list[str] | None:
+    """Nombres de estilo literales de la biblioteca de matplotlib, o None si no lo son."""
+    if len(call.args) != 1 or call.keywords:
+        return None
+    try:
+        value = ast.literal_eval(call.args[0])
+    except ValueError:
+        return None
+    names = [value] if isinstance(value, str) else value
+    if not isinstance(names, (list, tuple)) or not all(
+        isinstance(name, str) and name in matplotlib.style.library for name in names
+    ):
+        return None
+    return list(names)
+
+
+def _scoped_style_calls(tree: ast.AST) -> list[ast.Call]:
+    """Los plt.style.use('<estilo>') del nivel superior que se pueden aplicar antes de ejecutar."""
+    return [
+        stmt.value
+        for stmt in getattr(tree, "body", [])
+        if isinstance(stmt, ast.Expr) and _is_style_call(stmt.value, "use") and _library_styles(stmt.value)
+    ]
+
+
+def style_rc(tree: ast.AST) -> dict:
+    """
+    Parámetros rc de los plt.style.use('<estilo>') del nivel superior del
+    código, en orden, sin los parámetros que style.use ignora (backend...).
+    La compuerta los aplica antes de ejecutar; {} si no hay ninguno.
+    """
+    rc = {}
+    for call in _scoped_style_calls(tree):
+        for name in _library_styles(call):
+            style = matplotlib.style.library[name]
+            rc.update({key: style[key] for key in style if key not in STYLE_BLACKLIST})
+    return rc
+
+
+def changes_rc(tree: ast.AST) -> bool:
+    """
+    Indica si el código (su AST) puede cambiar los rc globales más allá de lo
+    que cubre style_rc(): usa rcParams, plt.style.use()/context() con otros
+    argumentos o fuera del nivel superior, o plt.rc()/rcdefaults()/xkcd()...
+    """
+    scoped = {id(call) for call in _scoped_style_calls(tree)}
+    for node in ast.walk(tree):
+        if id(node) in scoped:
+            continue
+        if isinstance(node, ast.Name) and node.id in _RC_NAMES:
+            return True
+        if isinstance(node, ast.Attribute) and node.attr in _RC_NAMES:
+            return True
+        if isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+            if name in _RC_CALLS:
+                return True
+            if _is_style_call(node, "use") or _is_style_call(node, "context"):
+                return True
+        if isinstance(node, ast.ImportFrom) and any(alias.name in _RC_NAMES | _RC_CALLS for alias in node.names):
+            return True
+    return False
+
+
+def install() -> None:
+    """
+    Sustituye la lista global de figuras de pyplot por una por hilo.
+    Es idempotente.
+    """
+    with _install_lock:
+        if _originals:
+            return
+        _originals["figs"] = _pylab_helpers.Gcf.figs
+        _pylab_helpers.Gcf.figs = _ThreadFigures(_originals["figs"])
+        logger.debug("Lumina Pyplot State: Figure registry is now per thread.")
+
+
+@contextmanager
+def active(rc: dict | None = None, exclusive: bool = False):
+    """
+    Ejecuta un bloque de código de pyplot aislado del resto de hilos.
+
+    Args:
+        rc: Parámetros rc del bloque (p. ej. los del perfil de renderizado y
+            los de style_rc()).
+        exclusive: True si el código cambia los rc; entonces no se solapa con
+                   ninguna otra ejecución.
+
+    Al salir se cierran las figuras que el bloque dejó abiertas en este hilo
+    y se restauran los rc.
+    """
+    install()
+    before = set(_pylab_helpers.Gcf.figs)
+    with _gate.enter(rc or {}, exclusive):
+        try:
+            yield
+        finally:
+            for num in [num for num in _pylab_helpers.Gcf.figs if num not in before]:
+                _pylab_helpers.Gcf.destroy(num)
@@ -4,37 +4,23 @@
 # para luego proporcionar retroalimentación y un nuevo bloque de código mejorado.
 # =============================================================================
 
+import base64
+import asyncio
+import mimetypes
+from typing import Callable
+from . import config
 from . import utils
 
 
-def reflect_on_image_and_regenerate(
-    chart_path: str,
-    instruction: str,
-    model_name: str,
-    out_path_v2: str,
-    code_v1: str,
-    schema: str,  # Parámetro añadido para el esquema dinámico
-) -> tuple[str, str]:
+def _build_prompt(instruction: str, out_path_v2: str, code_v1: str, schema: str) -> str:
     """
-    Critica la IMAGEN del gráfico y el código original, y luego devuelve
-    código matplotlib refinado.
-
-    Args:
-        chart_path: Ruta a la imagen del gráfico v1.
-        instruction: La instrucción original del usuario.
-        model_name: El nombre del modelo de LLM (con visión) a usar.
-        out_path_v2: La ruta donde se guardará el nuevo gráfico v2.
-        code_v1: El código original que generó el gráfico v1 (para contexto).
-        schema: El esquema de texto del DataFrame.
-
-    Returns:
-        Una tupla conteniendo (feedback, refined_code_with_tags).
+    Prompt de crítica y refinamiento para el modelo de visión.
+    Sin perfiles de renderizado el dpi no se impone al guardar, así que se pide
+    en el prompt.
     """
-    # 1. Codifica la imagen a formato Base64 para poder enviarla a la API.
-    media_type, b64_image = utils.encode_image_b64(chart_path)
-
-    # 2. Construye el prompt detallado para el modelo de visión.
-    prompt = f"""
+    dpi_arg = "" if config.RENDER_PROFILES_ENABLED else ", dpi=300"
+    dpi_hint = "" if config.RENDER_PROFILES_ENABLED else " with dpi=300"
+    return f"""
     You are a data visualization expert.
     Your task is to critique the attached chart and then provide refined matplotlib code.
     The critique (the "feedback" field) MUST be in Spanish.
@@ -52,7 +38,7 @@ def reflect_on_image_and_regenerate(
     # Your code here
     plt.style.use('ggplot') # Use a safe, common style
     # ... more code ...
-    plt.savefig('{out_path_v2}', dpi=300)
+    plt.savefig('{out_path_v2}'{dpi_arg})
     plt.close()
     </execute_python>
 
@@ -63,7 +49,8 @@ def reflect_on_image_and_regenerate(
     - Use a common, built-in matplotlib style like 'ggplot' or 'fivethirtyeight'. Do NOT use seaborn styles.
     - Use pandas/matplotlib only (no seaborn).
     - Assume the DataFrame 'df' already exists; do not read from files.
-    - Save the new chart to '{out_path_v2}' with dpi=300.
+    - If precomputed aggregates are listed in the schema, the dict 'aggs' also exists; prefer it over re-aggregating 'df'.
+    - Save the new chart to '{out_path_v2}'{dpi_hint}.
     - Always call plt.close() at the end. Do not call plt.show().
     - Include all necessary import statements.
 
@@ -74,10 +61,129 @@ def reflect_on_image_and_regenerate(
     {instruction}
     """
 
+
+def reflect_on_image_and_regenerate(
+    chart_path: str,
+    instruction: str,
+    model_name: str,
+    out_path_v2: str,
+    code_v1: str,
+    schema: str,  # Parámetro añadido para el esquema dinámico
+    stream: bool = False,
+    on_feedback: Callable[[str], None] | None = None,
+    image_info: dict | None = None,
+    chart_image: bytes | None = None,
+) -> tuple[str, str]:
+    """
+    Critica la IMAGEN del gráfico y el código original, y luego devuelve
+    código matplotlib refinado.
+
+    Args:
+        chart_path: Ruta a la imagen del gráfico v1.
+        instruction: La instrucción original del usuario.
+        model_name: El nombre del modelo de LLM (con visión) a usar.
+        out_path_v2: La ruta donde se guardará el nuevo gráfico v2.
+        code_v1: El código original que generó el gráfico v1 (para contexto).
+        schema: El esquema de texto del DataFrame.
+        stream: Si es True, la respuesta se recibe por streaming y se deja de
+                leer en cuanto se cierra el bloque </execute_python>.
+        on_feedback: Función opcional que recibe el feedback; con streaming se
+                     llama en cuanto llega la línea JSON, antes que el código.
+        image_info: Diccionario opcional que se rellena con el informe de la
+                    imagen enviada (tamaño, bytes y tokens estimados ahorrados).
+        chart_image: Los bytes del gráfico v1 si se capturó en memoria; en ese
+                     caso no se lee `chart_path` del disco.
+
+    Returns:
+        Una tupla conteniendo (feedback, refined_code_with_tags).
+    """
+    # 1. Prepara la imagen (reducida y en Base64) para poder enviarla a la API.
+    image = _encode_chart(chart_path, image_info, chart_image)
+
+    # 2. Construye el prompt detallado para el modelo de visión.
+    prompt = _build_prompt(instruction, out_path_v2, code_v1, schema)
+
     # 3. Llama al modelo de visión para obtener la respuesta cruda.
-    content = utils.image_openai_call(model_name, prompt, media_type, b64_image)
+    relay, delivered = _feedback_relay(on_feedback)
+    if stream:
+        content = utils.stream_response(model_name, prompt, (image["media_type"], image["b64"], image["detail"]), relay)
+    else:
+        content = utils.image_openai_call(model_name, prompt, image["media_type"], image["b64"], detail=image["detail"])
 
     # 4. Delega el parsing complejo a la nueva función de utilidad.
     feedback, refined_code = utils.parse_reflector_response(content)
+    if not delivered:
+        relay(feedback)
+
+    return feedback, refined_code
 
+
+def _encode_chart(chart_path: str, image_info: dict | None, chart_image: bytes | None = None) -> dict:
+    """
+    Codifica el gráfico para el modelo de visión: reducido y recomprimido si
+    VISION_PREPROCESS_ENABLED, o tal cual si no. Usa los bytes capturados en
+    memoria si los hay y el archivo si no.
+    """
+    if config.VISION_PREPROCESS_ENABLED:
+        image = utils.prepare_image_for_vision(chart_image if chart_image is not None else chart_path)
+    elif chart_image is not None:
+        media_type = mimetypes.guess_type(chart_path)[0] or "image/png"
+        image = {"media_type": media_type, "b64": base64.b64encode(chart_image).decode("utf-8"), "detail": "auto"}
+    else:
+        media_type, b64 = utils.encode_image_b64(chart_path)
+        image = {"media_type": media_type, "b64": b64, "detail": "auto"}
+    if image_info is not None:
+        image_info.update({k: v for k, v in image.items() if k != "b64"})
+    return image
+
+
+def _feedback_relay(on_feedback: Callable[[str], None] | None):
+    """
+    Envuelve `on_feedback` para saber si el streaming ya entregó el feedback;
+    si no (respuesta completa o primera línea mal formada), se entrega al final.
+    """
+    delivered = []
+
+    def relay(feedback: str) -> None:
+        delivered.append(feedback)
+        if on_feedback is not None:
+            on_feedback(feedback)
+
+    return relay, delivered
+
+
+async def reflect_on_image_and_regenerate_async(
+    chart_path: str,
+    instruction: str,
+    model_name: str,
+    out_path_v2: str,
+    code_v1: str,
+    schema: str,
+    stream: bool = False,
+    on_feedback: Callable[[str], None] | None = None,
+    image_info: dict | None = None,
+    chart_image: bytes | None = None,
+) -> tuple[str, str]:
+    """
+    Versión asíncrona de `reflect_on_image_and_regenerate`: la lectura de la
+    imagen (y su reducción) se hace en un hilo y la llamada al modelo no bloquea el event loop.
+
+    Returns:
+        Una tupla conteniendo (feedback, refined_code_with_tags).
+    """
+    image = await asyncio.to_thread(_encode_chart, chart_path, image_info, chart_image)
+    prompt = _build_prompt(instruction, out_path_v2, code_v1, schema)
+    relay, delivered = _feedback_relay(on_feedback)
+    if stream:
+        content = await utils.stream_response_async(
+            model_name, prompt, (image["media_type"], image["b64"], image["detail"]), relay
+        )
+    else:
+        content = await utils.image_openai_call_async(
+            model_name, prompt, image["media_type"], image["b64"], detail=image["detail"]
+        )
+
+    feedback, refined_code = utils.parse_reflector_response(content)
+    if not delivered:
+        relay(feedback)
     return feedback, refined_code
@@ -0,0 +1,232 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Compartir el DataFrame preparado entre procesos (workers de uvicorn).
+# Un único proceso publica cada versión del dataset en un archivo Arrow sin
+# comprimir; el resto lo mapea en memoria en modo solo lectura, de modo que
+# las columnas numéricas ocupan la RAM una sola vez para todos los workers.
+# NOTA: requiere pyarrow (opcional) y DATAFRAME_COPY_ON_WRITE. Sin ellos, cada
+# proceso usa su propia caché.
+# =============================================================================
+
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+from . import config
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+except ImportError:
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (la publicación sigue siendo atómica)
+    fcntl = None
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "current.json"
+LOCK_NAME = "publish.lock"
+
+# Mapeo activo en este proceso: se reutiliza mientras no cambie la versión
+_mapped_lock = threading.Lock()
+_mapped: dict = {"dataset_version": None, "df": None}
+
+# El aviso de configuración incompatible se registra una sola vez por proceso
+_cow_warning = {"logged": False}
+
+
+def is_available() -> bool:
+    """
+    Indica si el dataset compartido puede usarse: pyarrow instalado y
+    DATAFRAME_COPY_ON_WRITE activo. El DataFrame mapeado es de solo lectura, así
+    que sin copy-on-write cualquier escritura (df['x'] = ..., inplace=True)
+    fallaría con "assignment destination is read-only"; en ese caso cada
+    proceso usa su propia copia.
+    """
+    if pa is None:
+        return False
+    if not config.DATAFRAME_COPY_ON_WRITE:
+        if not _cow_warning["logged"]:
+            _cow_warning["logged"] = True
+            logger.warning(
+                "Lumina Shared Warning: SHARED_DATASET_ENABLED requires DATAFRAME_COPY_ON_WRITE; "
+                "using a private copy of the dataset in each process."
+            )
+        return False
+    return True
+
+
+def _dataset_path(dataset_version: str) -> Path:
+    return Path(config.SHARED_DATASET_DIR) / f"dataset-{dataset_version}.arrow"
+
+
+def read_manifest() -> dict | None:
+    """
+    Lee el manifiesto de la generación publicada actualmente.
+
+    Returns:
+        Un diccionario con 'dataset_version', 'file' y 'generation', o None si
+        todavía no se ha publicado nada.
+    """
+    try:
+        with open(Path(config.SHARED_DATASET_DIR) / MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_atomic(path: Path, write) -> None:
+    """
+    Escribe en un archivo temporal y lo renombra, para que los lectores vean
+    siempre el archivo anterior completo o el nuevo completo.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+@contextmanager
+def publish_lock():
+    """
+    Bloqueo exclusivo entre procesos para que solo un worker cargue y publique
+    cada versión del dataset.
+    """
+    shared_dir = Path(config.SHARED_DATASET_DIR)
+    shared_dir.mkdir(parents=True, exist_ok=True)
+    with open(shared_dir / LOCK_NAME, "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def publish(df: pd.DataFrame) -> None:
+    """
+    Publica el DataFrame como nueva generación del dataset compartido.
+
+    El archivo se escribe en un único bloque (record batch) y sin compresión,
+    requisito para que `open_shared` pueda mapearlo sin copias. Después se
+    sustituye el manifiesto de forma atómica y se borran las generaciones
+    anteriores (los procesos que aún las tengan mapeadas conservan su copia
+    hasta soltarla).
+
+    Args:
+        df: El DataFrame preparado, con `df.attrs["dataset_version"]`.
+    """
+    dataset_version = df.attrs["dataset_version"]
+    path = _dataset_path(dataset_version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    _write_atomic(
+        path,
+        lambda tmp: df.to_feather(tmp, compression="uncompressed", chunksize=max(len(df), 1)),
+    )
+
+    previous = read_manifest()
+    manifest = {
+        "dataset_version": dataset_version,
+        "file": path.name,
+        "generation": (previous or {}).get("generation", 0) + 1,
+    }
+    _write_atomic(
+        Path(config.SHARED_DATASET_DIR) / MANIFEST_NAME,
+        lambda tmp: tmp.write_text(json.dumps(manifest), encoding="utf-8"),
+    )
+    logger.info(f"Lumina Shared: Published dataset generation {manifest['generation']} ({path.name}).")
+
+    for old in path.parent.glob("dataset-*.arrow"):
+        if old != path:
+            try:
+                old.unlink()
+            except OSError:
+                pass  # Windows no permite borrar archivos mapeados
+
+
+def open_shared(dataset_version: str) -> pd.DataFrame | None:
+    """
+    Mapea en memoria la generación publicada si corresponde a `dataset_version`.
+
+    Las columnas numéricas y de fecha sin nulos apuntan directamente al archivo
+    mapeado (solo lectura); el resto se convierte a pandas.
+
+    Args:
+        dataset_version: La versión del dataset que necesita el proceso.
+
+    Returns:
+        El DataFrame compartido o None si esa versión aún no está publicada.
+    """
+    with _mapped_lock:
+        if _mapped["dataset_version"] == dataset_version:
+            return _mapped["df"]
+
+        manifest = read_manifest()
+        if not manifest or manifest.get("dataset_version") != dataset_version:
+            return None
+
+        try:
+            source = pa.memory_map(str(Path(config.SHARED_DATASET_DIR) / manifest["file"]))
+            table = pa.ipc.open_file(source).read_all()
+        except (FileNotFoundError, OSError) as e:
+            # Otra generación sustituyó al archivo entre la lectura del manifiesto y la apertura
+            logger.debug(f"Lumina Shared: Could not map {manifest['file']}: {e}")
+            return None
+
+        df = table.to_pandas(split_blocks=True)
+        df.attrs["dataset_version"] = dataset_version
+        _mapped.update(dataset_version=dataset_version, df=df)
+        logger.info(f"Lumina Shared: Mapped dataset generation {manifest['generation']} read-only.")
+        return df
+
+
+def load_or_publish(dataset_version: str, build) -> pd.DataFrame | None:
+    """
+    Devuelve la versión compartida del dataset, cargándola y publicándola si
+    ningún otro proceso lo ha hecho todavía.
+
+    Args:
+        dataset_version: La versión del dataset requerida.
+        build: Función sin argumentos que carga el DataFrame desde la fuente.
+
+    Returns:
+        El DataFrame mapeado en memoria, el construido si no pudo publicarse,
+        o lo que devuelva `build` si la carga falla (None o vacío).
+    """
+    df = open_shared(dataset_version)
+    if df is not None:
+        return df
+
+    with publish_lock():
+        # Otro worker pudo publicarla mientras esperábamos el bloqueo
+        df = open_shared(dataset_version)
+        if df is not None:
+            return df
+
+        df = build()
+        if df is None or df.empty:
+            return df
+
+        df.attrs["dataset_version"] = dataset_version
+        try:
+            publish(df)
+        except Exception as e:
+            logger.warning(f"Lumina Shared Warning: Could not publish dataset, using private copy: {e}")
+            return df
+
+    # Este proceso también usa la copia mapeada para no duplicar la memoria
+    shared = open_shared(dataset_version)
+    return shared if shared is not None else df
@@ -4,19 +4,78 @@
 # y procesacimiento de contenido, es la caja de herramientas del Pipeline
 # =============================================================================
 
+import io
 import os
 import re
 import json
+import math
 import base64
 import mimetypes
 
+import httpx
+import openai
 import pandas as pd
 from PIL import Image  # Añadido por para integración post-launch
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from . import config
+from . import llm_cache
+from . import llm_policy
+from . import llm_transport
 
 # Cargar variables de entorno y configurar el cliente de OpenAI
 openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_client = OpenAI(api_key=openai_api_key)
+
+
+def set_llm_transport(mode: str | None = None) -> None:
+    """
+    (Re)crea los clientes de OpenAI con el transporte del LLM `mode`
+    ("network", "record", "replay" o "synthetic"; por defecto LLM_TRANSPORT).
+    Los modos sin red no necesitan OPENAI_API_KEY.
+    """
+    global openai_client, openai_async_client
+    transport = llm_transport.make_transport(mode)
+    api_key = openai_api_key or ("lumina-offline" if transport is not None else None)
+
+    # Los reintentos los gestiona llm_policy (backoff con jitter), no el SDK
+    openai_client = OpenAI(
+        api_key=api_key,
+        max_retries=0,
+        http_client=DefaultHttpxClient(transport=transport) if transport is not None else None,
+    )
+
+    # Cliente asíncrono compartido por todos los workflows del proceso. El pool de
+    # conexiones HTTP se dimensiona para muchas peticiones simultáneas en vuelo.
+    openai_async_client = AsyncOpenAI(
+        api_key=api_key,
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=config.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(config.OPENAI_TIMEOUT, connect=10.0),
+        ),
+    )
+
+
+set_llm_transport()
+
+# Bloque de código completo que piden los prompts del generador y del reflector
+_CODE_BLOCK = re.compile(r"<execute_python>[\s\S]*?</execute_python>")
+
+
+def _cache_if_usable(key: str, text: str, model: str, completed: bool) -> None:
+    """
+    Guarda una respuesta en la caché del LLM solo si es utilizable: el modelo
+    la terminó (status "completed", no "incomplete" por max_output_tokens o
+    por el filtro de contenido) y trae un bloque <execute_python> completo.
+    Una respuesta truncada o sin código no se guarda, así que un reintento de
+    la misma instrucción vuelve a llamar al LLM en lugar de repetirla.
+    """
+    if completed and _CODE_BLOCK.search(text):
+        llm_cache.put(key, text, model)
 
 
 def get_response(model: str, prompt: str) -> str:
@@ -30,14 +89,70 @@ def get_response(model: str, prompt: str) -> str:
     Returns:
         La respuesta de texto generada por el modelo.
     """
-    response = openai_client.responses.create(
-        model=model,
-        input=prompt,
+    key = llm_cache.make_key(model, prompt)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = llm_policy.call(
+        model,
+        lambda: openai_client.responses.create(
+            model=model,
+            input=prompt,
+        ),
     )
+    _cache_if_usable(key, response.output_text, model, getattr(response, "status", None) == "completed")
     return response.output_text
 
 
-def image_openai_call(model_name: str, prompt: str, media_type: str, b64: str) -> str:
+async def get_response_async(model: str, prompt: str) -> str:
+    """
+    Versión asíncrona de `get_response`, con el cliente asíncrono compartido.
+
+    Args:
+        model: El nombre del modelo de LLM a usar (ej. "gpt-4o-mini").
+        prompt: El prompt de texto a enviar al modelo.
+
+    Returns:
+        La respuesta de texto generada por el modelo.
+    """
+    key = llm_cache.make_key(model, prompt)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = await llm_policy.call_async(
+        model,
+        lambda: openai_async_client.responses.create(
+            model=model,
+            input=prompt,
+        ),
+    )
+    _cache_if_usable(key, response.output_text, model, getattr(response, "status", None) == "completed")
+    return response.output_text
+
+
+def _vision_input(prompt: str, media_type: str, b64: str, detail: str = "auto") -> list[dict]:
+    """
+    Construye la entrada (texto + imagen en data URL) para un modelo de visión.
+    `detail` ("low", "high" o "auto") fija la resolución con la que el modelo
+    analiza la imagen y, con ella, los tokens que cuesta.
+    """
+    data_url = f"data:{media_type};base64,{b64}"
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "input_text", "text": prompt},
+                {"type": "input_image", "image_url": data_url, "detail": detail},
+            ],
+        }
+    ]
+
+
+def image_openai_call(
+    model_name: str, prompt: str, media_type: str, b64: str, detail: str = "auto"
+) -> str:
     """
     Realiza una llamada a un modelo de visión de OpenAI con una imagen y un prompt.
 
@@ -46,28 +161,286 @@ def image_openai_call(model_name: str, prompt: str, media_type: str, b64: str) -
         prompt: El prompt de texto que acompaña a la imagen.
         media_type: El tipo MIME de la imagen (ej. "image/png").
         b64: La cadena de la imagen codificada en Base64.
+        detail: Nivel de detalle de la imagen para el modelo ("low", "high" o "auto").
 
     Returns:
         La respuesta de texto generada por el modelo de visión.
     """
-    data_url = f"data:{media_type};base64,{b64}"
+    key = llm_cache.make_key(model_name, prompt, b64, detail)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    resp = llm_policy.call(
+        model_name,
+        lambda: openai_client.responses.create(
+            model=model_name,
+            input=_vision_input(prompt, media_type, b64, detail),  # type: ignore
+        ),
+    )
+    content = (resp.output_text or "").strip()
+    _cache_if_usable(key, content, model_name, getattr(resp, "status", None) == "completed")
+    return content
+
+
+async def image_openai_call_async(
+    model_name: str, prompt: str, media_type: str, b64: str, detail: str = "auto"
+) -> str:
+    """
+    Versión asíncrona de `image_openai_call`, con el cliente asíncrono compartido.
 
-    resp = openai_client.responses.create(
-        model=model_name,
-        input=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "input_text", "text": prompt},
-                    {"type": "input_image", "image_url": data_url},
-                ],
-            }  # type: ignore
-        ],
+    Args:
+        model_name: El nombre del modelo de LLM con capacidad de visión.
+        prompt: El prompt de texto que acompaña a la imagen.
+        media_type: El tipo MIME de la imagen (ej. "image/png").
+        b64: La cadena de la imagen codificada en Base64.
+        detail: Nivel de detalle de la imagen para el modelo ("low", "high" o "auto").
+
+    Returns:
+        La respuesta de texto generada por el modelo de visión.
+    """
+    key = llm_cache.make_key(model_name, prompt, b64, detail)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    resp = await llm_policy.call_async(
+        model_name,
+        lambda: openai_async_client.responses.create(
+            model=model_name,
+            input=_vision_input(prompt, media_type, b64, detail),  # type: ignore
+        ),
     )
     content = (resp.output_text or "").strip()
+    _cache_if_usable(key, content, model_name, getattr(resp, "status", None) == "completed")
     return content
 
 
+class StreamingResponseParser:
+    """
+    Analizador incremental de una respuesta del LLM que llega por fragmentos.
+
+    Detecta, sin esperar al final de la respuesta:
+    - La primera línea si es un objeto JSON con la clave "feedback" (formato
+      del reflector): queda en `feedback`.
+    - El primer bloque <execute_python>...</execute_python> completo: queda
+      en `code` (con las etiquetas), listo para ejecutarse.
+    """
+
+    OPEN_TAG = "<execute_python>"
+    CLOSE_TAG = "</execute_python>"
+
+    def __init__(self):
+        self.text = ""
+        self.feedback: str | None = None
+        self.code: str | None = None
+        # Estado final del stream ("completed" o "incomplete") si llegó su evento
+        self.status: str | None = None
+        # Posición del final del bloque de código dentro de `text`
+        self.code_end: int | None = None
+        self._feedback_checked = False
+        self._open_at: int | None = None
+        self._scan_from = 0
+
+    def feed(self, delta: str) -> list[str]:
+        """
+        Añade un fragmento y devuelve los eventos completados con él
+        ("feedback" y/o "code").
+        """
+        previous_length = len(self.text)
+        self.text += delta
+        events = []
+
+        if not self._feedback_checked:
+            stripped = self.text.lstrip()
+            if "\n" in stripped:
+                self._feedback_checked = True
+                first_line = stripped.split("\n", 1)[0].strip()
+                try:
+                    obj = json.loads(first_line)
+                except ValueError:
+                    obj = None
+                if isinstance(obj, dict) and "feedback" in obj:
+                    self.feedback = str(obj["feedback"]).strip()
+                    events.append("feedback")
+
+        if self.code is None:
+            # Solo se vuelve a examinar la cola que puede contener una etiqueta partida
+            if self._open_at is None:
+                start = max(self._scan_from, previous_length - len(self.OPEN_TAG))
+                found = self.text.find(self.OPEN_TAG, start)
+                if found == -1:
+                    self._scan_from = max(0, len(self.text) - len(self.OPEN_TAG))
+                else:
+                    self._open_at = found
+                    self._scan_from = found + len(self.OPEN_TAG)
+            if self._open_at is not None:
+                start = max(self._scan_from, previous_length - len(self.CLOSE_TAG))
+                found = self.text.find(self.CLOSE_TAG, start)
+                if found == -1:
+                    self._scan_from = max(self._scan_from, len(self.text) - len(self.CLOSE_TAG))
+                else:
+                    self.code_end = found + len(self.CLOSE_TAG)
+                    self.code = self.text[self._open_at:self.code_end]
+                    events.append("code")
+        return events
+
+
+def _cached_stream_result(text: str, on_feedback) -> str:
+    """Entrega el feedback de una respuesta servida desde la caché, como si llegara por streaming."""
+    if on_feedback is not None:
+        parser = StreamingResponseParser()
+        parser.feed(text if text.endswith("\n") else text + "\n")
+        if parser.feedback is not None:
+            on_feedback(parser.feedback)
+    return text
+
+
+def _once(callback):
+    """
+    Envuelve un callback para que solo se llame una vez, aunque un reintento
+    vuelva a recibir la misma línea de feedback.
+    """
+    if callback is None:
+        return None
+    called = []
+
+    def wrapper(value):
+        if not called:
+            called.append(value)
+            callback(value)
+
+    return wrapper
+
+
+def _stream_failure(event, request) -> openai.APIError:
+    """
+    Convierte un evento de fallo del stream (response.failed o error) en un
+    APIError con el código del error; llm_policy reintenta los transitorios.
+    """
+    error = getattr(getattr(event, "response", None), "error", None) or event
+    code = getattr(error, "code", None)
+    message = getattr(error, "message", None) or "the stream failed"
+    return openai.APIError(f"Stream failed ({code}): {message}", request, body={"code": code, "message": message})
+
+
+def _consume_stream_event(parser: StreamingResponseParser, event, on_feedback, request=None) -> bool:
+    """
+    Procesa un evento del stream. Devuelve True cuando el bloque de código ya
+    está completo y se puede dejar de leer. Un evento de fallo lanza APIError:
+    el texto recibido hasta entonces no se devuelve como si fuera la respuesta.
+    """
+    event_type = getattr(event, "type", None)
+    if event_type in ("response.failed", "error"):
+        raise _stream_failure(event, request)
+    if event_type in ("response.completed", "response.incomplete"):
+        parser.status = event_type.split(".", 1)[1]
+        return False
+    if event_type != "response.output_text.delta":
+        return False
+    events = parser.feed(event.delta)
+    if "feedback" in events and on_feedback is not None:
+        on_feedback(parser.feedback)
+    return parser.code is not None
+
+
+def _streamed_text(parser: StreamingResponseParser) -> str:
+    """Texto recibido hasta el cierre del bloque de código (o completo si no llegó)."""
+    return parser.text[:parser.code_end].strip()
+
+
+def _cache_stream(key: str, parser: StreamingResponseParser, model: str) -> str:
+    """
+    Devuelve el texto del stream y lo guarda en la caché solo si se cerró el
+    bloque de código o la respuesta terminó con normalidad ("completed").
+    """
+    text = _streamed_text(parser)
+    _cache_if_usable(key, text, model, parser.code is not None or parser.status == "completed")
+    return text
+
+
+def stream_response(
+    model: str,
+    prompt: str,
+    image: tuple[str, ...] | None = None,
+    on_feedback=None,
+) -> str:
+    """
+    Obtiene una respuesta del LLM por streaming y deja de leer en cuanto se
+    cierra el bloque </execute_python>, sin esperar al resto de la respuesta.
+
+    Args:
+        model: El nombre del modelo de LLM.
+        prompt: El prompt de texto.
+        image: (media_type, b64) o (media_type, b64, detail) para modelos de
+               visión, o None.
+        on_feedback: Función llamada con el feedback del reflector en cuanto su
+                     línea JSON está completa.
+
+    Returns:
+        El texto recibido hasta el cierre del bloque de código.
+    """
+    key = llm_cache.make_key(model, prompt, *(image[1:] if image else ()))
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return _cached_stream_result(cached, on_feedback)
+
+    on_feedback = _once(on_feedback)
+
+    def consume() -> StreamingResponseParser:
+        # Cada intento empieza con un analizador nuevo
+        parser = StreamingResponseParser()
+        stream = openai_client.responses.create(
+            model=model,
+            input=_vision_input(prompt, *image) if image else prompt,  # type: ignore
+            stream=True,
+        )
+        try:
+            for event in stream:
+                if _consume_stream_event(parser, event, on_feedback, stream.response.request):
+                    break
+        finally:
+            stream.close()
+        return parser
+
+    # Sin hedging: el stream tiene efectos (on_feedback) a mitad de la respuesta
+    return _cache_stream(key, llm_policy.call(model, consume, hedge=False), model)
+
+
+async def stream_response_async(
+    model: str,
+    prompt: str,
+    image: tuple[str, ...] | None = None,
+    on_feedback=None,
+) -> str:
+    """
+    Versión asíncrona de `stream_response`, con el cliente asíncrono compartido.
+    """
+    key = llm_cache.make_key(model, prompt, *(image[1:] if image else ()))
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return _cached_stream_result(cached, on_feedback)
+
+    on_feedback = _once(on_feedback)
+
+    async def consume() -> StreamingResponseParser:
+        parser = StreamingResponseParser()
+        stream = await openai_async_client.responses.create(
+            model=model,
+            input=_vision_input(prompt, *image) if image else prompt,  # type: ignore
+            stream=True,
+        )
+        try:
+            async for event in stream:
+                if _consume_stream_event(parser, event, on_feedback, stream.response.request):
+                    break
+        finally:
+            await stream.close()
+        return parser
+
+    return _cache_stream(key, await llm_policy.call_async(model, consume, hedge=False), model)
+
+
 def encode_image_b64(path: str) -> tuple[str, str]:
     """
     Codifica un archivo de imagen a una cadena Base64 y obtiene su tipo MIME.
@@ -85,6 +458,114 @@ def encode_image_b64(path: str) -> tuple[str, str]:
     return media_type, b64
 
 
+# Coste en tokens de una imagen para los modelos de visión: una base fija más
+# un tanto por cada tesela de 512 px (en "low" solo se paga la base).
+VISION_BASE_TOKENS = 85
+VISION_TILE_TOKENS = 170
+_VISION_MEDIA_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """
+    Estima los tokens que cuesta una imagen de `width` x `height` px. En "high"
+    el modelo la encaja en 2048x2048, reduce el lado corto a 768 px y cobra
+    cada tesela de 512 px.
+    """
+    if detail == "low":
+        return VISION_BASE_TOKENS
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return VISION_BASE_TOKENS + VISION_TILE_TOKENS * tiles
+
+
+def prepare_image_for_vision(
+    image: str | bytes,
+    max_edge: int | None = None,
+    image_format: str | None = None,
+    detail: str | None = None,
+) -> dict:
+    """
+    Prepara una imagen para el modelo de visión: la reduce a `max_edge` px en
+    su lado mayor, la recomprime en `image_format` y elige el nivel de detalle.
+    Todo se hace en memoria; el archivo original no se modifica.
+
+    Args:
+        image: La ruta al archivo de imagen o sus bytes (p. ej. un gráfico
+               capturado en memoria).
+        max_edge: Lado mayor máximo en px (por defecto VISION_MAX_EDGE).
+        image_format: "png", "jpeg" o "webp" (por defecto VISION_IMAGE_FORMAT;
+                      si la config es None se conserva el formato original).
+        detail: "low", "high" o "auto" (por defecto VISION_DETAIL). Con "auto"
+                se usa "low" si la imagen cabe en 512 px y "high" si no.
+
+    Returns:
+        Un diccionario con media_type, b64 y detail para la llamada, y el
+        informe: width, height, format, original_bytes, sent_bytes,
+        bytes_saved, original_tokens, sent_tokens y tokens_saved.
+    """
+    max_edge = max_edge or config.VISION_MAX_EDGE
+    image_format = image_format or config.VISION_IMAGE_FORMAT
+    detail = detail or config.VISION_DETAIL
+
+    if isinstance(image, bytes):
+        raw = image
+    else:
+        with open(image, "rb") as f:
+            raw = f.read()
+
+    with Image.open(io.BytesIO(raw)) as img:
+        img.load()
+        original_size, original_format = img.size, img.format
+        fmt = (image_format or img.format or "PNG").upper().replace("JPG", "JPEG")
+        if fmt not in _VISION_MEDIA_TYPES:
+            raise ValueError(f"Formato de imagen no soportado para visión: {fmt}")
+
+        if max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if fmt == "JPEG" and img.mode != "RGB":
+            # JPEG no admite transparencia: se aplana sobre fondo blanco
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, "white")
+            img.paste(rgba, mask=rgba.getchannel("A"))
+
+        buffer = io.BytesIO()
+        if fmt == "PNG":
+            img.save(buffer, format=fmt, optimize=True)
+        else:
+            img.save(buffer, format=fmt, quality=config.VISION_IMAGE_QUALITY)
+        size = img.size
+
+    payload = buffer.getvalue()
+    media_type = _VISION_MEDIA_TYPES[fmt]
+    if size == original_size and len(payload) >= len(raw):
+        # Recomprimir sin reducir no compensa: se envía el archivo tal cual
+        payload, media_type = raw, Image.MIME.get(original_format, "image/png")
+        fmt = media_type.split("/")[-1].upper()
+
+    if detail == "auto":
+        detail = "low" if max(size) <= 512 else "high"
+
+    original_tokens = estimate_image_tokens(*original_size)
+    sent_tokens = estimate_image_tokens(*size, detail=detail)
+    return {
+        "media_type": media_type,
+        "b64": base64.b64encode(payload).decode("utf-8"),
+        "detail": detail,
+        "width": size[0],
+        "height": size[1],
+        "format": fmt,
+        "original_bytes": len(raw),
+        "sent_bytes": len(payload),
+        "bytes_saved": len(raw) - len(payload),
+        "original_tokens": original_tokens,
+        "sent_tokens": sent_tokens,
+        "tokens_saved": original_tokens - sent_tokens,
+    }
+
+
 def ensure_execute_python_tags(text: str) -> str:
     """
     Asegura que un bloque de código Python esté envuelto en etiquetas <execute_python>.
@@ -109,6 +590,10 @@ def make_schema_text(df: pd.DataFrame) -> str:
     """
     Genera una representación de texto del esquema de un DataFrame.
 
+    Si los tipos se optimizaron al cargar los datos, se muestran los tipos
+    originales (`df.attrs["logical_dtypes"]`) para que el esquema que recibe
+    el LLM no dependa de cómo se almacenan las columnas en memoria.
+
     Args:
         df: El DataFrame de pandas del cual extraer el esquema.
 
@@ -116,7 +601,30 @@ def make_schema_text(df: pd.DataFrame) -> str:
         Una cadena de texto multilínea que describe las columnas y sus
         tipos de datos, legible para humanos.
     """
-    return "\n".join(f"- {c}: {dt}" for c, dt in df.dtypes.items())
+    logical = df.attrs.get("logical_dtypes", {})
+    return "\n".join(f"- {c}: {logical.get(c, dt)}" for c, dt in df.dtypes.items())
+
+
+def make_aggregates_text(aggs: dict[str, pd.DataFrame]) -> str:
+    """
+    Describe los agregados precalculados disponibles en el diccionario `aggs`.
+
+    Args:
+        aggs: Diccionario {nombre: DataFrame} de `data_processing.get_aggregate_cube`.
+
+    Returns:
+        Una cadena multilínea con una tabla por línea y sus columnas, o una
+        cadena vacía si no hay agregados.
+    """
+    if not aggs:
+        return ""
+    lines = [
+        "Precomputed aggregates (dict 'aggs' of small DataFrames, one row per group; "
+        "'count' is the number of rows, '<col>_sum'/'<col>_mean' aggregate numeric columns):"
+    ]
+    for name, table in aggs.items():
+        lines.append(f"- aggs['{name}']: {', '.join(map(str, table.columns))} ({len(table)} rows)")
+    return "\n".join(lines)
 
 
 def parse_reflector_response(content: str) -> tuple[str, str]:
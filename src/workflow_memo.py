@@ -0,0 +1,130 @@
+# =============================================================================
+# RESPONSABILIDAD ÚNICA DE ESTE MODULO
+# Memorizar workflows completos que terminaron con éxito. La clave combina la
+# instrucción normalizada, los modelos y el esquema del dataset; cada entrada
+# guarda el código V1/V2, el feedback y copia de los gráficos, junto al hash
+# del contenido con el que se generaron. Así una petición repetida no vuelve a
+# pasar por el generador ni por el reflector.
+# =============================================================================
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+
+from . import config
+
+# Configurar logger para este módulo
+logger = logging.getLogger(__name__)
+
+# Marcadores que sustituyen a las rutas de salida dentro del código guardado
+OUT_V1_PLACEHOLDER = "{{LUMINA_OUT_V1}}"
+OUT_V2_PLACEHOLDER = "{{LUMINA_OUT_V2}}"
+
+_lock = threading.Lock()
+
+
+def normalize_instruction(instruction: str) -> str:
+    """
+    Normaliza una instrucción para que variaciones triviales (mayúsculas,
+    espacios, puntuación final) compartan entrada.
+    """
+    text = unicodedata.normalize("NFKC", instruction).lower()
+    return " ".join(text.split()).rstrip(".!?¡¿ ")
+
+
+def make_key(instruction: str, generation_model: str, reflection_model: str, schema_hash: str) -> str:
+    """
+    Clave de memoización: instrucción normalizada + modelos + esquema del dataset.
+    """
+    payload = "\0".join((normalize_instruction(instruction), generation_model, reflection_model, schema_hash))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_dir(key: str) -> Path:
+    return Path(config.WORKFLOW_MEMO_DIR) / key[:2] / key
+
+
+def load(key: str) -> dict | None:
+    """
+    Devuelve la entrada memorizada para `key`, o None si no existe.
+    """
+    if not config.WORKFLOW_MEMO_ENABLED:
+        return None
+    try:
+        with open(_entry_dir(key) / "entry.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, OSError):
+        return None
+
+
+def store(
+    key: str,
+    content_hash: str,
+    code_v1: str,
+    code_v2: str,
+    feedback: str,
+    out_path_v1: str,
+    out_path_v2: str,
+    charts: tuple[bytes, bytes] | None = None,
+) -> None:
+    """
+    Guarda un workflow completado: el código (con las rutas de salida
+    sustituidas por marcadores), el feedback y una copia de los gráficos.
+    Con `charts` (gráficos capturados en memoria) se guardan esos bytes en
+    lugar de copiar los archivos de salida.
+    """
+    if not config.WORKFLOW_MEMO_ENABLED:
+        return
+
+    entry = {
+        "content_hash": content_hash,
+        "code_v1": code_v1.replace(out_path_v1, OUT_V1_PLACEHOLDER),
+        "code_v2": code_v2.replace(out_path_v2, OUT_V2_PLACEHOLDER),
+        "feedback": feedback,
+        "created": time.time(),
+    }
+    entry_dir = _entry_dir(key)
+    suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with _lock:
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            for index, (version, source) in enumerate((("v1", out_path_v1), ("v2", out_path_v2))):
+                tmp = entry_dir / f"chart_{version}.png.{suffix}"
+                if charts is not None:
+                    tmp.write_bytes(charts[index])
+                else:
+                    shutil.copyfile(source, tmp)
+                os.replace(tmp, entry_dir / f"chart_{version}.png")
+            # El JSON se escribe al final: una entrada solo es visible con sus gráficos
+            tmp = entry_dir / f"entry.json.{suffix}"
+            tmp.write_text(json.dumps(entry), encoding="utf-8")
+            os.replace(tmp, entry_dir / "entry.json")
+    except OSError as e:
+        logger.warning(f"Lumina Memo Warning: Could not store workflow result: {e}")
+
+
+def load_charts(key: str) -> tuple[bytes, bytes] | None:
+    """
+    Devuelve los bytes de los gráficos memorizados (V1, V2), o None si falta alguno.
+    """
+    entry_dir = _entry_dir(key)
+    try:
+        return (entry_dir / "chart_v1.png").read_bytes(), (entry_dir / "chart_v2.png").read_bytes()
+    except OSError as e:
+        logger.warning(f"Lumina Memo Warning: Could not load memoized charts: {e}")
+        return None
+
+
+def code_for(entry: dict, version: str, out_path: str) -> str:
+    """
+    Devuelve el código memorizado de `version` ("v1" o "v2") con la ruta de
+    salida de esta ejecución.
+    """
+    placeholder = OUT_V1_PLACEHOLDER if version == "v1" else OUT_V2_PLACEHOLDER
+    return entry[f"code_{version}"].replace(placeholder, out_path)
@@ -1,6 +1,27 @@
+import os
 import pytest
 import pandas as pd
 
+# src.utils crea el cliente de OpenAI al importarse y exige una clave;
+# los tests nunca llaman a la API real.
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+
+@pytest.fixture(autouse=True)
+def isolated_llm_cache(tmp_path, monkeypatch):
+    """
+    Cada test usa sus propios directorios de caché del LLM y de workflows
+    memorizados, y empieza con la memoria vacía.
+    """
+    from src import config, llm_cache
+
+    monkeypatch.setattr(config, "LLM_CACHE_DIR", tmp_path / "llm_cache")
+    monkeypatch.setattr(config, "WORKFLOW_MEMO_DIR", tmp_path / "workflow_memo")
+    monkeypatch.setattr(llm_cache, "_disk_bytes", None)
+    llm_cache.clear_cache()
+    yield
+    llm_cache.clear_cache()
+
 @pytest.fixture
 def df():
     """
@@ -23,3 +44,128 @@ def df():
         "month": [11, 2, 1],
         "year": [2023, 2023, 2023]
     })
+
+
+# ---------- Sustituto en proceso de MongoDB ----------
+# Implementa solo lo que usa src.data_processing: find() con filtros de
+# comparación, proyección, batch_size, sort() y limit(), además de
+# estimated_document_count() y el comando ping.
+
+_OPERATORS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+    "$eq": lambda a, b: a == b,
+}
+
+
+def _matches(document, mongo_filter):
+    for field, condition in mongo_filter.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if value is None or not _OPERATORS[op](value, operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document, projection):
+    if not projection:
+        return dict(document)
+    if any(v for k, v in projection.items() if k != "_id"):
+        keep = {k for k, v in projection.items() if v}
+        if projection.get("_id", 1):
+            keep.add("_id")
+        return {k: v for k, v in document.items() if k in keep}
+    if projection.get("_id", 1) == 0 and len(projection) == 1:
+        return {k: v for k, v in document.items() if k != "_id"}
+    keep = {k for k, v in projection.items() if v}
+    return {k: v for k, v in document.items() if k in keep}
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self._documents = documents
+
+    def sort(self, key, direction=1):
+        self._documents = sorted(self._documents, key=lambda d: d.get(key), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        if n:
+            self._documents = self._documents[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self._documents)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+        self.find_calls = []
+        self._next_id = 1
+
+    def insert_many(self, documents):
+        for document in documents:
+            document = dict(document)
+            document.setdefault("_id", self._next_id)
+            self._next_id = max(self._next_id, document["_id"]) + 1
+            self.documents.append(document)
+
+    def find(self, mongo_filter=None, projection=None, batch_size=0):
+        self.find_calls.append({"filter": mongo_filter or {}, "projection": projection, "batch_size": batch_size})
+        selected = [d for d in self.documents if _matches(d, mongo_filter or {})]
+        return FakeCursor([_project(d, projection) for d in selected])
+
+    def estimated_document_count(self):
+        return len(self.documents)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        return self._collections.setdefault(name, FakeCollection())
+
+    def command(self, name):
+        return {"ok": 1}
+
+
+class FakeMongoServer:
+    """Estado compartido por todos los clientes falsos creados durante un test."""
+
+    def __init__(self):
+        self.databases = {}
+        self.clients_created = 0
+
+    def collection(self, db_name, collection_name):
+        return self.databases.setdefault(db_name, FakeDatabase())[collection_name]
+
+
+@pytest.fixture
+def fake_mongo(monkeypatch):
+    """Sustituye MongoClient en src.data_processing por un servidor en memoria."""
+    from src import data_processing
+
+    server = FakeMongoServer()
+
+    class FakeMongoClient:
+        def __init__(self, uri, **kwargs):
+            server.clients_created += 1
+            self.admin = FakeDatabase()
+
+        def __getitem__(self, name):
+            return server.databases.setdefault(name, FakeDatabase())
+
+        def close(self):
+            pass
+
+    data_processing.close_mongo_clients()
+    monkeypatch.setattr(data_processing, "MongoClient", FakeMongoClient)
+    yield server
+    data_processing.close_mongo_clients()
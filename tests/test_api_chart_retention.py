@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src import config
+from src import main
+
+
+@pytest.fixture
+def charts_dir(tmp_path, monkeypatch):
+    """Directorio de gráficos temporal con límites pequeños."""
+    monkeypatch.setattr(config, "CHARTS_DIR", tmp_path)
+    monkeypatch.setattr(config, "API_CHART_RETENTION_SECONDS", 60)
+    monkeypatch.setattr(config, "API_CHART_MAX_FILES", 3)
+    return tmp_path
+
+
+def _chart(directory, name, age):
+    path = directory / name
+    path.write_bytes(b"png")
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_borra_los_graficos_caducados(charts_dir):
+    old = _chart(charts_dir, f"{config.API_IMAGE_BASENAME}_aaa_v1.png", age=120)
+    recent = _chart(charts_dir, f"{config.API_IMAGE_BASENAME}_bbb_v1.png", age=5)
+
+    assert api._sweep_charts() == 1
+    assert not old.exists()
+    assert recent.exists()
+
+
+def test_limita_el_numero_de_graficos(charts_dir):
+    paths = [_chart(charts_dir, f"{config.API_IMAGE_BASENAME}_{i}_v2.png", age=10 - i) for i in range(5)]
+
+    assert api._sweep_charts() == 2
+    # Se conservan los más recientes
+    assert [p.exists() for p in paths] == [False, False, True, True, True]
+
+
+def test_no_toca_otros_archivos(charts_dir):
+    other = _chart(charts_dir, "chart_comparison_v1.png", age=3600)
+
+    assert api._sweep_charts() == 0
+    assert other.exists()
+
+
+def test_el_endpoint_limpia_tras_cada_peticion(charts_dir, monkeypatch):
+    old = _chart(charts_dir, f"{config.API_IMAGE_BASENAME}_viejo_v1.png", age=120)
+
+    async def fake_workflow(**kwargs):
+        base = kwargs["image_basename"]
+        for version in ("v1", "v2"):
+            (charts_dir / f"{base}_{version}.png").write_bytes(b"png")
+        return {"status": "Completed", "v1_success": True, "chart_v1_path": str(charts_dir / f"{base}_v1.png"),
+                "v2_success": True, "chart_v2_path": str(charts_dir / f"{base}_v2.png"), "feedback": "ok"}
+
+    monkeypatch.setattr(main, "run_workflow_async", fake_workflow)
+    response = TestClient(api.app).post("/generate-chart/", json={"instruction": "Ventas"})
+
+    assert response.status_code == 200
+    assert not old.exists()
+    assert len(os.listdir(charts_dir)) == 2
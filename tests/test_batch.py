@@ -0,0 +1,179 @@
+import asyncio
+import io
+import json
+import re
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from src import batch
+from src import config
+from src import data_processing
+from src import main
+from src import utils
+
+LLM_DELAY = 0.1
+REAL_LOAD = data_processing.load_configured_data
+
+CHART_CODE = """<execute_python>
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots()
+ax.bar(df['product'], df['amount'])
+fig.savefig(r'{path}')
+plt.close(fig)
+</execute_python>"""
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """LLM asíncrono simulado; las instrucciones con 'ROMPE' fallan en V1."""
+    state = {"loads": 0, "calls": 0}
+    df = pd.DataFrame({"product": ["Latte", "Mocha"], "amount": [10.0, 20.0]})
+
+    async def get_response_async(model, prompt):
+        state["calls"] += 1
+        await asyncio.sleep(LLM_DELAY)
+        if "ROMPE" in prompt:
+            return "<execute_python>raise ValueError('x')</execute_python>"
+        return CHART_CODE.format(path=re.search(r"Save the figure as '(.*?)'", prompt).group(1))
+
+    async def image_openai_call_async(model_name, prompt, media_type, b64, detail="auto"):
+        state["calls"] += 1
+        await asyncio.sleep(LLM_DELAY)
+        return '{"feedback": "Bien"}\n' + CHART_CODE.format(path=re.search(r"Save the new chart to '(.*?)'", prompt).group(1))
+
+    def load_configured_data(use_cache=None):
+        state["loads"] += 1
+        return df.copy()
+
+    monkeypatch.setattr(utils, "get_response_async", get_response_async)
+    monkeypatch.setattr(utils, "image_openai_call_async", image_openai_call_async)
+    monkeypatch.setattr(data_processing, "load_configured_data", load_configured_data)
+    monkeypatch.setattr(config, "AGGREGATE_CUBE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_STREAMING_ENABLED", False)
+    monkeypatch.setattr(config, "WORKFLOW_MEMO_ENABLED", False)
+    return state
+
+
+def test_cargar_instrucciones_jsonl_y_csv(tmp_path):
+    jsonl = tmp_path / "lote.jsonl"
+    jsonl.write_text('"Ventas por mes"\n{"id": "q1/2024", "instruction": "Q1 2024"}\n\n', encoding="utf-8")
+    csv_file = tmp_path / "lote.csv"
+    csv_file.write_text("instruction\nVentas\nMargen\n", encoding="utf-8")
+
+    assert batch.load_instructions(str(jsonl)) == [
+        {"id": "00001", "instruction": "Ventas por mes"},
+        {"id": "q1_2024", "instruction": "Q1 2024"},
+    ]
+    assert [item["id"] for item in batch.load_instructions(str(csv_file))] == ["00001", "00002"]
+
+    jsonl.write_text('{"id": "a", "instruction": "x"}\n{"id": "a", "instruction": "y"}\n', encoding="utf-8")
+    with pytest.raises(ValueError):
+        batch.load_instructions(str(jsonl))
+
+
+def test_lote_concurrente_con_resultados_y_resumen(fake_llm, tmp_path, monkeypatch):
+    # Solo se mide el solapamiento de las esperas al LLM, no el renderizado
+    def fake_execute(code_response, df, aggs, exec_info, figures=None, profile=None):
+        if "raise" in code_response:
+            return False
+        buffer = io.BytesIO()
+        Image.new("RGB", (4, 4)).save(buffer, format="PNG")
+        figures[re.search(r"savefig\(r'(.*?)'\)", code_response).group(1)] = buffer.getvalue()
+        return True
+
+    monkeypatch.setattr(main, "_execute", fake_execute)
+    items = [{"id": f"i{n}", "instruction": f"Ventas {n}"} for n in range(6)] + [{"id": "mal", "instruction": "ROMPE"}]
+
+    summary = asyncio.run(batch.run_batch(items, str(tmp_path / "lote"), concurrency=7))
+
+    records = [json.loads(line) for line in (tmp_path / "lote" / "results.jsonl").read_text().splitlines()]
+    assert {r["id"] for r in records} == {item["id"] for item in items}
+    assert (tmp_path / "lote" / "charts" / "i3_v2.png").exists()
+    assert summary["statuses"] == {"Completed": 6, "Error en V1": 1}
+    assert summary["latency_s"]["p50"] <= summary["latency_s"]["p95"] <= summary["latency_s"]["p99"]
+    # En serie serían 13 llamadas * LLM_DELAY; con concurrencia se solapan
+    assert summary["wall_time_s"] < 13 * LLM_DELAY
+    assert json.loads((tmp_path / "lote" / "summary.json").read_text()) == summary
+
+
+def test_dataset_se_carga_una_vez(fake_llm, tmp_path, monkeypatch):
+    (tmp_path / "ventas.csv").write_text("product,amount\nLatte,10\nMocha,20\n", encoding="utf-8")
+    monkeypatch.setattr(data_processing, "load_configured_data", REAL_LOAD)
+    monkeypatch.setattr(config, "USE_MONGO_DB", False)
+    monkeypatch.setattr(config, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(config, "DATA_FILENAME", "ventas.csv")
+    monkeypatch.setattr(config, "COLUMNAR_SIDECAR_ENABLED", False)
+    monkeypatch.setattr(config, "DATA_CACHE_ENABLED", False)
+    data_processing.clear_data_cache()
+    items = [{"id": f"i{n}", "instruction": "Ventas"} for n in range(4)]
+
+    summary = asyncio.run(batch.run_batch(items, str(tmp_path / "lote"), concurrency=4))
+
+    assert summary["statuses"] == {"Completed": 4}
+    assert data_processing.get_cache_stats()["misses"] == 1
+    assert config.DATA_CACHE_ENABLED is False
+    data_processing.clear_data_cache()
+
+
+def test_el_lote_no_modifica_la_configuracion_global(fake_llm, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "FIGURE_CAPTURE_ENABLED", True)
+    monkeypatch.setattr(config, "PERSIST_CHARTS", False)
+    monkeypatch.setattr(config, "DATA_CACHE_ENABLED", False)
+    fake = utils.get_response_async
+    seen = []
+
+    async def get_response_async(model, prompt):
+        # Otros workflows del proceso deben seguir viendo la configuración original
+        seen.append((config.PERSIST_CHARTS, config.DATA_CACHE_ENABLED))
+        return await fake(model, prompt)
+
+    monkeypatch.setattr(utils, "get_response_async", get_response_async)
+
+    summary = asyncio.run(batch.run_batch([{"id": "i0", "instruction": "Ventas"}], str(tmp_path / "lote")))
+
+    assert summary["statuses"] == {"Completed": 1}
+    assert seen == [(False, False)]
+    assert (tmp_path / "lote" / "charts" / "i0_v2.png").exists()
+
+
+def test_reanudar_omite_lo_terminado(fake_llm, tmp_path):
+    items = [{"id": f"i{n}", "instruction": f"Ventas {n}"} for n in range(3)] + [{"id": "mal", "instruction": "ROMPE"}]
+    out = str(tmp_path / "lote")
+    asyncio.run(batch.run_batch(items[:2], out))
+    calls = fake_llm["calls"]
+
+    summary = asyncio.run(batch.run_batch(items, out, resume=True))
+    assert summary["skipped"] == 2 and summary["run"] == 2
+    assert fake_llm["calls"] == calls + 3  # i2 (generador y reflector) y 'mal' (solo generador)
+
+    retried = asyncio.run(batch.run_batch(items, out, resume=True, retry_failed=True))
+    assert retried["run"] == 1 and retried["statuses"] == {"Error en V1": 1}
+
+
+def test_excepcion_en_un_elemento_no_detiene_el_lote(fake_llm, tmp_path, monkeypatch):
+    original = main.run_workflow_async
+
+    async def flaky(instruction, *args, **kwargs):
+        if instruction == "explota":
+            raise RuntimeError("fallo")
+        return await original(instruction, *args, **kwargs)
+
+    monkeypatch.setattr(main, "run_workflow_async", flaky)
+    items = [{"id": "a", "instruction": "explota"}, {"id": "b", "instruction": "Ventas"}]
+
+    summary = asyncio.run(batch.run_batch(items, str(tmp_path / "lote")))
+
+    assert summary["statuses"] == {"Exception": 1, "Completed": 1}
+
+
+def test_cli_imprime_el_resumen(fake_llm, tmp_path, capsys):
+    instructions = tmp_path / "lote.jsonl"
+    instructions.write_text('"Ventas"\n"Margen"\n', encoding="utf-8")
+
+    summary = batch.main([str(instructions), "--output", str(tmp_path / "lote"), "--concurrency", "2"])
+
+    out = capsys.readouterr().out
+    assert summary["run"] == 2
+    assert "p95" in out and "workflows/min" in out
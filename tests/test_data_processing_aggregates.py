@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+from src import config
+from src import data_processing
+from src.data_processing import build_aggregate_cube, get_aggregate_cube
+from src.executor import _execute_code
+from src.utils import make_aggregates_text
+
+
+@pytest.fixture
+def ventas():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-15", "2024-02-10", "2025-01-20", "2025-01-25", "2025-04-02"]),
+        "coffee_name": pd.Categorical(["Latte", "Mocha", "Latte", "Latte", "Mocha"]),
+        "money": [10.0, 20.0, 30.0, 40.0, 50.0],
+    })
+    df["quarter"] = df["date"].dt.quarter
+    df["month"] = df["date"].dt.month
+    df["year"] = df["date"].dt.year
+    return df
+
+
+def test_cubo_por_calendario_coincide_con_groupby(ventas):
+    cube = build_aggregate_cube(ventas)
+
+    table = cube["by_year_quarter_month"]
+    expected = ventas.groupby(["year", "quarter", "month"])["money"].sum().tolist()
+    assert table["money_sum"].tolist() == expected
+    assert table["count"].tolist() == [1, 1, 2, 1]
+    assert table.loc[table["month"] == 1, "money_mean"].tolist() == [10.0, 35.0]
+
+
+def test_cubo_cruzado_con_categorias(ventas):
+    table = build_aggregate_cube(ventas)["by_year_quarter_month_coffee_name"]
+
+    q1_2025 = table[(table["year"] == 2025) & (table["quarter"] == 1)]
+    assert q1_2025["coffee_name"].tolist() == ["Latte"]
+    assert q1_2025["money_sum"].tolist() == [70.0]
+    # observed=True: no aparecen combinaciones sin filas
+    assert table["count"].min() >= 1
+
+
+def test_identificadores_no_se_agregan(ventas, monkeypatch):
+    ventas["transaction id"] = [101, 102, 103, 104, 105]
+    ventas["customer_id"] = [7, 7, 8, 8, 9]
+    ventas["ticket"] = [5000, 5001, 5002, 5003, 5004]
+    ventas["quantity"] = [1, 2, 1, 3, 1]
+
+    columns = build_aggregate_cube(ventas)["by_year_quarter_month"].columns
+    assert {"money_sum", "quantity_sum", "quantity_mean"} <= set(columns)
+    assert not any(col.startswith(("transaction id_", "customer_id_", "ticket_")) for col in columns)
+
+    monkeypatch.setattr(config, "AGGREGATE_MEASURE_COLUMNS", ["money"])
+    columns = build_aggregate_cube(ventas)["by_year_quarter_month"].columns
+    assert [col for col in columns if col.endswith("_sum")] == ["money_sum"]
+
+
+def test_sin_columnas_de_calendario_no_hay_cubo():
+    assert build_aggregate_cube(pd.DataFrame({"a": [1, 2]})) == {}
+
+
+def test_cubo_se_calcula_una_vez_por_version(ventas, monkeypatch):
+    ventas.attrs["dataset_version"] = "v-test"
+    calls = []
+    original = data_processing.build_aggregate_cube
+
+    def spy(df):
+        calls.append(1)
+        return original(df)
+
+    monkeypatch.setattr(data_processing, "build_aggregate_cube", spy)
+    first = get_aggregate_cube(ventas)
+    second = get_aggregate_cube(ventas.copy(deep=False))
+
+    assert first is second
+    assert len(calls) == 1
+
+
+def test_codigo_generado_recibe_aggs(ventas):
+    cube = build_aggregate_cube(ventas)
+    code = "resultado = aggs['by_year_quarter_month']['money_sum'].sum()\nassert resultado == 150.0"
+
+    assert _execute_code(code, ventas, cube) is True
+
+
+def test_descripcion_de_agregados_para_el_prompt(ventas):
+    text = make_aggregates_text(build_aggregate_cube(ventas))
+
+    assert "aggs['by_year_quarter_month']" in text
+    assert "money_sum" in text
+    assert make_aggregates_text({}) == ""
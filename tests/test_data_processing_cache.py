@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from src import config
+from src import data_processing
+from src.data_processing import load_configured_data, get_cache_stats, clear_data_cache
+
+
+@pytest.fixture
+def csv_source(tmp_path, monkeypatch):
+    """CSV temporal configurado como fuente de datos, con la caché vacía."""
+    csv_path = tmp_path / "ventas.csv"
+    csv_path.write_text("date,product,amount\n2024-01-15,Latte,10\n2025-02-20,Mocha,20\n")
+    monkeypatch.setattr(config, "USE_MONGO_DB", False)
+    monkeypatch.setattr(config, "DATA_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(config, "DATA_FILENAME", "ventas.csv")
+    clear_data_cache()
+    yield csv_path
+    clear_data_cache()
+
+
+def _touch_forward(path):
+    """Adelanta el mtime para que el cambio sea visible aunque el FS tenga baja resolución."""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_primera_carga_es_miss_y_la_segunda_hit(csv_source):
+    df1 = load_configured_data()
+    df2 = load_configured_data()
+
+    assert len(df1) == len(df2) == 2
+    assert get_cache_stats() == {"hits": 1, "misses": 1, "reloads": 0, "refreshes": 0}
+
+
+def test_columnas_derivadas_se_sirven_desde_cache(csv_source, monkeypatch):
+    load_configured_data()
+
+    # Si la caché funciona, no se vuelve a leer el CSV
+    def fail(*args, **kwargs):
+        raise AssertionError("load_and_prepare_data no debería llamarse")
+
+    monkeypatch.setattr(data_processing, "load_and_prepare_data", fail)
+    df = load_configured_data()
+    assert df["year"].tolist() == [2024, 2025]
+    assert df["quarter"].tolist() == [1, 1]
+
+
+def test_cambio_en_csv_provoca_recarga(csv_source):
+    load_configured_data()
+    csv_source.write_text("date,product,amount\n2024-01-15,Latte,10\n2025-02-20,Mocha,20\n2025-05-01,Latte,5\n")
+    _touch_forward(csv_source)
+
+    df = load_configured_data()
+
+    assert len(df) == 3
+    assert get_cache_stats() == {"hits": 0, "misses": 1, "reloads": 1, "refreshes": 0}
+
+
+def test_mutar_el_resultado_no_altera_la_cache(csv_source):
+    df = load_configured_data()
+    df["nueva"] = 1
+
+    assert "nueva" not in load_configured_data().columns
+
+
+def test_version_del_dataset_cambia_con_la_fuente(csv_source):
+    version_1 = load_configured_data().attrs["dataset_version"]
+    assert load_configured_data().attrs["dataset_version"] == version_1
+
+    csv_source.write_text("date,product,amount\n2024-01-15,Latte,99\n")
+    _touch_forward(csv_source)
+    assert load_configured_data().attrs["dataset_version"] != version_1
+
+
+def test_cache_desactivada_siempre_recarga(csv_source, monkeypatch):
+    monkeypatch.setattr(config, "DATA_CACHE_ENABLED", False)
+    load_configured_data()
+    load_configured_data()
+
+    assert get_cache_stats() == {"hits": 0, "misses": 0, "reloads": 0, "refreshes": 0}
+
+
+@pytest.fixture
+def two_sources(monkeypatch):
+    """Dos fuentes falsas; cada hilo elige la suya. La 'lenta' espera a `release`."""
+    release, started = threading.Event(), threading.Event()
+    current = threading.local()
+
+    def slow_loader():
+        started.set()
+        release.wait(5)
+        return pd.DataFrame({"a": [1]})
+
+    sources = {
+        "lenta": (("csv", "lenta"), 1, slow_loader, None),
+        "rapida": (("csv", "rapida"), 1, lambda: pd.DataFrame({"b": [1]}), None),
+    }
+    monkeypatch.setattr(data_processing, "_resolve_source", lambda use_cache: sources[current.name])
+    monkeypatch.setattr(config, "SHARED_DATASET_ENABLED", False)
+
+    def load(name):
+        current.name = name
+        return load_configured_data(use_cache=True)
+
+    clear_data_cache()
+    yield load, started, release
+    release.set()
+    clear_data_cache()
+
+
+def test_cargar_una_fuente_no_bloquea_los_aciertos_de_otra(two_sources):
+    load, started, release = two_sources
+    load("rapida")
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        slow = pool.submit(load, "lenta")
+        assert started.wait(5)
+        start = time.perf_counter()
+        assert list(load("rapida").columns) == ["b"]
+        assert time.perf_counter() - start < 1
+        release.set()
+        assert list(slow.result().columns) == ["a"]
+
+
+def test_cargas_simultaneas_de_la_misma_fuente_leen_una_vez(two_sources):
+    load, started, release = two_sources
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(load, "lenta") for _ in range(4)]
+        assert started.wait(5)
+        release.set()
+        assert all(list(future.result().columns) == ["a"] for future in futures)
+
+    assert get_cache_stats()["misses"] == 1
+    assert get_cache_stats()["hits"] == 3
@@ -0,0 +1,82 @@
+import pandas as pd
+
+from src import config
+from src.data_processing import plan_dtypes, optimize_dtypes, load_and_prepare_data
+from src.utils import make_schema_text
+
+
+def _ventas(n=100):
+    fechas = pd.date_range("2024-01-01", periods=n, freq="D")
+    return pd.DataFrame({
+        "date": fechas,
+        "coffee_name": ["Latte", "Mocha", "Espresso", "Americano"] * (n // 4),
+        "ticket": [f"T{i:05d}" for i in range(n)],
+        "price": [38.7, 33.5, 28.9, 24.0] * (n // 4),
+        "units": [1.0, 2.0, 3.0, 4.0] * (n // 4),
+        "quantity": list(range(n)),
+        "quarter": fechas.quarter,
+        "month": fechas.month,
+        "year": fechas.year,
+    })
+
+
+def test_plan_elige_tipos_baratos_y_seguros():
+    plan = plan_dtypes(_ventas())
+
+    assert plan["coffee_name"] == "category"
+    assert "ticket" not in plan  # alta cardinalidad: se queda como texto
+    assert plan["quarter"] == "int8"
+    assert plan["month"] == "int8"
+    assert plan["year"] == "int16"
+    assert plan["quantity"] == "int32"
+    assert plan["units"] == "float32"  # conversión exacta
+    assert "price" not in plan  # 38.7 no es representable en float32
+
+
+def test_texto_casi_unico_no_se_convierte_en_categoria(monkeypatch):
+    df = _ventas(100)
+    df["cliente"] = [f"C{i % 40}" for i in range(100)]
+
+    assert "cliente" not in plan_dtypes(df)
+
+    monkeypatch.setattr(config, "CATEGORY_MAX_UNIQUES", 3)
+    assert "coffee_name" not in plan_dtypes(df)
+
+
+def test_groupby_de_categorias_da_los_mismos_grupos():
+    df = _ventas(400)
+    optimized = optimize_dtypes(df)
+
+    assert optimized["coffee_name"].dtype == "category"
+    pd.testing.assert_series_equal(
+        optimized.groupby("coffee_name", observed=False).size(),
+        df.groupby("coffee_name").size(),
+        check_index_type=False, check_categorical=False,
+    )
+
+
+def test_optimize_reduce_memoria_sin_cambiar_valores():
+    df = _ventas()
+    optimized = optimize_dtypes(df)
+
+    report = optimized.attrs["memory_report"]
+    assert report["bytes_after"] < report["bytes_before"]
+    assert report["saved_bytes"] == report["bytes_before"] - report["bytes_after"]
+    assert optimized["coffee_name"].tolist() == df["coffee_name"].tolist()
+    assert optimized["year"].tolist() == df["year"].tolist()
+
+
+def test_esquema_para_el_llm_no_cambia():
+    df = _ventas()
+    assert make_schema_text(optimize_dtypes(df)) == make_schema_text(df)
+
+
+def test_calendario_con_fechas_invalidas_usa_float32(tmp_path):
+    csv_path = tmp_path / "ventas.csv"
+    csv_path.write_text("date,value\n2024-11-24,100\ninvalid,200\n2024-02-27,300\n2024-03-01,400\n")
+
+    df = load_and_prepare_data(str(csv_path), optimize=True)
+
+    assert df["quarter"].dtype == "float32"
+    assert pd.isna(df.loc[1, "quarter"])
+    assert df.loc[0, "quarter"] == 4
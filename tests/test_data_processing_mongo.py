@@ -0,0 +1,72 @@
+import pandas as pd
+from src.data_processing import load_and_prepare_data_from_mongo
+
+URI = "mongodb://fake"
+
+
+def _ventas(fake_mongo):
+    collection = fake_mongo.collection("lumina", "ventas")
+    collection.insert_many([
+        {"date": "2024-01-15", "coffee_name": "Latte", "money": 38.7},
+        {"date": "2024-05-20", "coffee_name": "Mocha", "money": 33.5},
+        {"date": "2025-02-03", "coffee_name": "Latte", "money": 38.7, "card": "ANON-1"},
+    ])
+    return collection
+
+
+def test_carga_y_prepara_documentos(fake_mongo):
+    _ventas(fake_mongo)
+
+    df = load_and_prepare_data_from_mongo(URI, "lumina", "ventas")
+
+    assert "_id" not in df.columns
+    assert pd.api.types.is_datetime64_any_dtype(df["date"])
+    assert df["year"].tolist() == [2024, 2024, 2025]
+    # Los campos ausentes en algunos documentos se rellenan con nulos
+    assert df["card"].isna().tolist() == [True, True, False]
+
+
+def test_proyeccion_y_lotes_se_envian_al_servidor(fake_mongo):
+    collection = _ventas(fake_mongo)
+
+    load_and_prepare_data_from_mongo(URI, "lumina", "ventas", batch_size=2)
+
+    call = collection.find_calls[-1]
+    assert call["projection"] == {"_id": 0}
+    assert call["batch_size"] == 2
+
+
+def test_filtro_y_rango_de_fechas_en_el_servidor(fake_mongo):
+    collection = _ventas(fake_mongo)
+
+    df = load_and_prepare_data_from_mongo(
+        URI, "lumina", "ventas",
+        query={"coffee_name": "Latte"},
+        date_range=("2025-01-01", "2026-01-01"),
+    )
+
+    assert collection.find_calls[-1]["filter"] == {
+        "coffee_name": "Latte",
+        "date": {"$gte": "2025-01-01", "$lt": "2026-01-01"},
+    }
+    assert df["year"].tolist() == [2025]
+
+
+def test_cliente_compartido_entre_cargas(fake_mongo):
+    _ventas(fake_mongo)
+
+    load_and_prepare_data_from_mongo(URI, "lumina", "ventas")
+    load_and_prepare_data_from_mongo(URI, "lumina", "ventas")
+
+    assert fake_mongo.clients_created == 1
+
+
+def test_error_de_lectura_devuelve_dataframe_vacio(fake_mongo, monkeypatch):
+    collection = _ventas(fake_mongo)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("servidor caído")
+
+    monkeypatch.setattr(collection, "find", fail)
+    df = load_and_prepare_data_from_mongo(URI, "lumina", "ventas")
+    assert df.empty
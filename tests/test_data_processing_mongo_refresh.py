@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+from src import config
+from src import data_processing
+from src.data_processing import load_configured_data, get_cache_stats, clear_data_cache
+
+
+@pytest.fixture
+def ventas(fake_mongo, monkeypatch):
+    """Colección falsa configurada como fuente de datos, con la caché vacía."""
+    monkeypatch.setattr(config, "USE_MONGO_DB", True)
+    monkeypatch.setattr(config, "DATA_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "MONGO_INCREMENTAL_REFRESH", True)
+    monkeypatch.setattr(config, "MONGO_WATERMARK_FIELD", "_id")
+    monkeypatch.setattr(config, "MONGO_KEY_FIELD", None)
+    monkeypatch.setenv("MONGO_URI", "mongodb://fake")
+    monkeypatch.setenv("MONGO_DB_NAME", "lumina")
+    monkeypatch.setenv("MONGO_COLLECTION_NAME", "ventas")
+    collection = fake_mongo.collection("lumina", "ventas")
+    collection.insert_many([
+        {"date": "2024-01-15", "coffee_name": "Latte", "money": 38.7},
+        {"date": "2024-05-20", "coffee_name": "Mocha", "money": 33.5},
+        {"date": "2025-02-03", "coffee_name": "Latte", "money": 38.7},
+    ])
+    clear_data_cache()
+    yield collection
+    clear_data_cache()
+
+
+def test_documentos_nuevos_se_anaden_sin_releer_la_coleccion(ventas):
+    assert len(load_configured_data()) == 3
+
+    ventas.insert_many([{"date": "2025-03-10", "coffee_name": "Mocha", "money": 33.5}])
+    df = load_configured_data()
+
+    assert len(df) == 4
+    assert df["year"].tolist() == [2024, 2024, 2025, 2025]
+    assert get_cache_stats() == {"hits": 0, "misses": 1, "reloads": 0, "refreshes": 1}
+    # La segunda lectura solo pide lo posterior a la marca de agua
+    assert ventas.find_calls[-1]["filter"]["_id"] == {"$gt": 3, "$lte": 4}
+
+
+def test_fechas_solo_se_procesan_en_el_delta(ventas, monkeypatch):
+    load_configured_data()
+    ventas.insert_many([{"date": "2025-03-10", "coffee_name": "Mocha", "money": 33.5}])
+
+    processed = []
+    original = data_processing._add_date_parts
+
+    def spy(df):
+        processed.append(len(df))
+        return original(df)
+
+    monkeypatch.setattr(data_processing, "_add_date_parts", spy)
+    load_configured_data()
+
+    assert processed == [1]
+
+
+def test_sin_cambios_es_hit(ventas):
+    load_configured_data()
+    load_configured_data()
+
+    assert get_cache_stats()["hits"] == 1
+    assert get_cache_stats()["refreshes"] == 0
+
+
+def test_categorias_nuevas_conservan_el_tipo(ventas, monkeypatch):
+    # Con tan pocas filas hace falta un umbral más alto para que haya categorías
+    monkeypatch.setattr(config, "CATEGORY_MAX_RATIO", 0.5)
+    ventas.insert_many([{"date": "2025-03-01", "coffee_name": "Latte", "money": 38.7}] * 5)
+    df = load_configured_data()
+    assert isinstance(df["coffee_name"].dtype, pd.CategoricalDtype)
+
+    ventas.insert_many([{"date": "2025-03-10", "coffee_name": "Cortado", "money": 28.9}])
+    df = load_configured_data()
+
+    assert isinstance(df["coffee_name"].dtype, pd.CategoricalDtype)
+    assert df["coffee_name"].tolist()[-1] == "Cortado"
+
+
+def test_documentos_modificados_se_reemplazan_por_clave(fake_mongo, ventas, monkeypatch):
+    monkeypatch.setattr(config, "MONGO_WATERMARK_FIELD", "updated_at")
+    monkeypatch.setattr(config, "MONGO_KEY_FIELD", "order")
+    ventas.documents.clear()
+    ventas.insert_many([
+        {"order": 1, "date": "2024-01-15", "money": 10.0, "updated_at": 100},
+        {"order": 2, "date": "2024-02-15", "money": 20.0, "updated_at": 101},
+    ])
+    load_configured_data()
+
+    ventas.documents[0].update(money=15.0, updated_at=102)
+    df = load_configured_data()
+
+    assert sorted(df["order"].tolist()) == [1, 2]
+    assert df.loc[df["order"] == 1, "money"].tolist() == [15.0]
+    assert get_cache_stats()["refreshes"] == 1
+
+
+def test_borrados_provocan_recarga_completa(ventas):
+    load_configured_data()
+    ventas.documents.pop(0)
+    ventas.insert_many([{"date": "2025-03-10", "coffee_name": "Mocha", "money": 33.5}])
+
+    df = load_configured_data()
+
+    assert len(df) == 3
+    assert get_cache_stats()["reloads"] == 1
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from src import config
+from src import data_processing
+from src import generator
+from src.data_processing import build_dataset_profile, get_dataset_profile, optimize_dtypes
+
+
+@pytest.fixture
+def sales():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-15", "2024-05-02", "2024-11-30", "2025-02-10", None]),
+        "product": ["Latte", "Mocha", "Latte", "Tea", "Latte"],
+        "amount": [10.0, 20.0, None, 5.0, 7.5],
+        "store": [f"tienda {i}" for i in range(5)],
+    })
+    return data_processing._add_date_parts(df)
+
+
+def test_perfil_incluye_valores_fechas_periodos_y_nulos(sales, monkeypatch):
+    monkeypatch.setattr(config, "SCHEMA_PROFILE_MAX_DISTINCT", 3)
+    profile = build_dataset_profile(sales, token_budget=1000)
+    lines = profile.splitlines()
+
+    assert lines[0] == "- date: datetime64[ns]; range 2024-01-15 to 2025-02-10; 1 nulls"
+    assert "- product: object; values: 'Latte', 'Mocha', 'Tea'" in lines
+    assert "- amount: float64; 1 nulls" in lines
+    assert "- store: object" in lines  # Más valores distintos que el límite
+    assert "- year: float64; 1 nulls" in lines  # Calendario: resumido en la línea de periodos
+    assert lines[-1] == "Years and quarters present in the data: 2024: Q1 Q2 Q4; 2025: Q1"
+
+
+def test_perfil_usa_los_tipos_logicos(sales):
+    assert build_dataset_profile(optimize_dtypes(sales.copy())) == build_dataset_profile(sales)
+
+
+def test_perfil_se_recorta_al_presupuesto(monkeypatch):
+    df = pd.DataFrame({"c": [f"categoria larga {i}" for i in range(20)] * 2, "n": range(40)})
+    full = build_dataset_profile(df, token_budget=10_000)
+
+    short = build_dataset_profile(df, token_budget=30)
+    bare = build_dataset_profile(df, token_budget=1)
+
+    assert "(+" in short and len(short) <= 30 * data_processing.PROFILE_CHARS_PER_TOKEN < len(full)
+    assert bare == "- c: object\n- n: int64"
+
+
+def test_perfil_se_calcula_una_vez_por_version(sales, monkeypatch):
+    calls = []
+    original = data_processing._profile_stats
+    monkeypatch.setattr(data_processing, "_profile_stats", lambda df: calls.append(1) or original(df))
+    sales.attrs["dataset_version"] = "perfil-v1"
+
+    first = get_dataset_profile(sales)
+    assert get_dataset_profile(sales) == first and len(calls) == 1
+
+    monkeypatch.setattr(config, "SCHEMA_PROFILE_TOKEN_BUDGET", 5)
+    assert get_dataset_profile(sales) != first and len(calls) == 2
+
+
+def test_generador_usa_el_perfil(sales, monkeypatch):
+    assert "values: 'Latte'" in generator._build_schema(sales, None)
+
+    monkeypatch.setattr(config, "SCHEMA_PROFILE_ENABLED", False)
+    assert "values:" not in generator._build_schema(sales, None)
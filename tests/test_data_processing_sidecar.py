@@ -0,0 +1,67 @@
+import os
+import pandas as pd
+import pytest
+from src import data_processing
+from src.data_processing import load_and_prepare_data
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "ventas.csv"
+    path.write_text("Date,Product,Amount\n2024-01-15,Latte,10\n2025-02-20,Mocha,20\n")
+    return path
+
+
+def _sidecars(directory):
+    return sorted(p.name for p in directory.iterdir() if ".lumina." in p.name)
+
+
+def test_primera_carga_lee_csv_y_escribe_sidecar(csv_path):
+    df = load_and_prepare_data(str(csv_path), use_sidecar=True)
+
+    assert df.attrs["source_format"] == "csv"
+    assert len(_sidecars(csv_path.parent)) == 1
+
+
+def test_segunda_carga_usa_el_formato_mas_rapido(csv_path):
+    load_and_prepare_data(str(csv_path), use_sidecar=True)
+    df = load_and_prepare_data(str(csv_path), use_sidecar=True)
+
+    expected = data_processing._available_sidecar_formats()[0]
+    assert df.attrs["source_format"] == expected
+    # Las columnas derivadas de la fecha ya vienen materializadas y tipadas
+    assert pd.api.types.is_datetime64_any_dtype(df["date"])
+    assert df["year"].tolist() == [2024, 2025]
+    assert df["quarter"].tolist() == [1, 1]
+    assert list(df.columns) == ["date", "product", "amount", "quarter", "month", "year"]
+
+
+def test_sidecar_se_regenera_si_el_csv_es_mas_reciente(csv_path):
+    load_and_prepare_data(str(csv_path), use_sidecar=True)
+    csv_path.write_text("Date,Product,Amount\n2024-01-15,Latte,10\n")
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    df = load_and_prepare_data(str(csv_path), use_sidecar=True)
+    assert df.attrs["source_format"] == "csv"
+    assert len(df) == 1
+
+    df = load_and_prepare_data(str(csv_path), use_sidecar=True)
+    assert df.attrs["source_format"] != "csv"
+    assert len(df) == 1
+
+
+def test_sin_pyarrow_se_usa_pickle(csv_path, monkeypatch):
+    monkeypatch.setattr(data_processing, "pyarrow", None)
+    load_and_prepare_data(str(csv_path), use_sidecar=True)
+    df = load_and_prepare_data(str(csv_path), use_sidecar=True)
+
+    assert df.attrs["source_format"] == "pickle"
+    assert _sidecars(csv_path.parent) == ["ventas.lumina.pkl"]
+
+
+def test_sin_sidecar_no_se_escriben_archivos(csv_path):
+    df = load_and_prepare_data(str(csv_path))
+
+    assert df.attrs["source_format"] == "csv"
+    assert _sidecars(csv_path.parent) == []
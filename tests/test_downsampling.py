@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import pytest
+from src import config
+from src import downsampling
+from src.executor import extract_and_execute_code
+
+
+# ---------- Tests de los algoritmos ----------
+
+def test_lttb_conserva_extremos_y_picos():
+    x = np.arange(10_000)
+    y = np.sin(x / 500.0)
+    y[4321] = 50.0  # Un pico aislado debe sobrevivir
+
+    idx = downsampling.lttb_indices(x, y, 500)
+
+    assert len(idx) == 500
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert (np.diff(idx) > 0).all()
+    assert 4321 in idx
+
+
+def test_minmax_conserva_minimo_y_maximo_global():
+    rng = np.random.default_rng(1)
+    y = rng.normal(size=20_000)
+
+    idx = downsampling.minmax_indices(y, 1000)
+
+    assert len(idx) <= 1000
+    assert y.argmin() in idx and y.argmax() in idx
+
+
+def test_reservoir_es_uniforme_y_determinista():
+    idx = downsampling.reservoir_indices(100_000, 2000, seed=3)
+
+    assert len(idx) == len(np.unique(idx)) == 2000
+    assert (idx == downsampling.reservoir_indices(100_000, 2000, seed=3)).all()
+    # Aproximadamente la mitad de la muestra cae en la primera mitad
+    assert 800 < (idx < 50_000).sum() < 1200
+
+
+def test_series_pequenas_no_se_tocan():
+    assert (downsampling.lttb_indices(np.arange(10), np.arange(10), 100) == np.arange(10)).all()
+
+
+# ---------- Tests de la integración con matplotlib ----------
+
+def test_plot_y_scatter_se_reducen_solo_dentro_de_active():
+    x = pd.date_range("2024-01-01", periods=20_000, freq="min")
+    y = np.cumsum(np.ones(20_000))
+    fig, ax = plt.subplots()
+    try:
+        with downsampling.active(1000) as report:
+            (line,) = ax.plot(x, y, "-")
+            points = ax.scatter(np.arange(20_000), y, c=y)
+        (untouched,) = ax.plot(x, y)
+    finally:
+        plt.close(fig)
+
+    assert len(line.get_xdata()) == 1000
+    assert len(points.get_offsets()) == 1000
+    assert len(untouched.get_xdata()) == 20_000
+    assert report["series"] == 2
+    assert report["points_dropped"] == 2 * (20_000 - 1000)
+
+
+def test_x_desordenado_no_se_reduce():
+    fig, ax = plt.subplots()
+    try:
+        with downsampling.active(100) as report:
+            (line,) = ax.plot(np.arange(1000)[::-1], np.arange(1000))
+    finally:
+        plt.close(fig)
+
+    assert len(line.get_xdata()) == 1000
+    assert report["series"] == 0
+
+
+def test_metodo_desconocido_lanza_error():
+    with pytest.raises(ValueError):
+        with downsampling.active(100, method="zigzag"):
+            pass
+
+
+def test_ejecucion_informa_puntos_descartados(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PLOT_POINT_BUDGET", 500)
+    big = pd.DataFrame({"date": pd.date_range("2024-01-01", periods=5000, freq="h"), "money": np.arange(5000.0)})
+    out = tmp_path / "chart.png"
+    code = (
+        "<execute_python>\n"
+        "import matplotlib.pyplot as plt\n"
+        "fig, ax = plt.subplots()\n"
+        "ax.plot(df['date'], df['money'])\n"
+        f"fig.savefig(r'{out}')\n"
+        "plt.close(fig)\n"
+        "</execute_python>"
+    )
+    info = {}
+
+    assert extract_and_execute_code(code, big, exec_info=info)
+    assert out.exists()
+    assert info["downsampling"]["points_in"] == 5000
+    assert info["downsampling"]["points_out"] == 500
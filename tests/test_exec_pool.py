@@ -0,0 +1,155 @@
+import asyncio
+import re
+
+import pandas as pd
+import pytest
+
+from src import config
+from src import data_processing
+from src import exec_pool
+from src import main
+from src import utils
+
+
+def _code(body: str) -> str:
+    return f"<execute_python>\nimport matplotlib.pyplot as plt\n{body}\n</execute_python>"
+
+
+@pytest.fixture
+def df():
+    df = pd.DataFrame({"product": ["Latte", "Mocha", "Latte"], "amount": [10.0, 20.0, 5.0]})
+    df.attrs["dataset_version"] = "v1"
+    return df
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(config, "EXEC_POOL_MEMORY_LIMIT_MB", 1024)
+    monkeypatch.setattr(config, "EXEC_POOL_MAX_JOBS_PER_WORKER", 100)
+    pool = exec_pool.ExecPool(size=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_ejecuta_y_guarda_el_grafico(pool, df, tmp_path):
+    path = tmp_path / "chart.png"
+    result = pool.run(_code(f"df.groupby('product')['amount'].sum().plot(kind='bar')\nplt.savefig(r'{path}')"), df)
+
+    assert result["status"] == "ok" and result["success"]
+    assert path.exists()
+
+
+def test_error_del_codigo(pool, df):
+    result = pool.run(_code("raise ValueError('columna inexistente')"), df)
+
+    assert result["status"] == "error"
+    assert result["error"] == "ValueError: columna inexistente"
+    assert pool.stats()["workers"] == 1
+
+
+def test_codigo_rechazado(pool, df):
+    result = pool.run(_code("plt.plot([1, 2])\nplt.show()"), df)
+
+    assert result["status"] == "rejected"
+    assert result["error"] == "CodeRejected: line 3: interactive display (.show) is not allowed"
+
+
+def test_timeout_reemplaza_el_trabajador(pool, df):
+    result = pool.run(_code("while 1 < 2:\n    pass"), df, timeout=0.5)
+    after = pool.run(_code("x = 1"), df)
+
+    assert result["status"] == "timeout"
+    assert after["status"] == "ok"
+    assert after["worker_pid"] != result["worker_pid"]
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_memoria_agotada(pool, df):
+    result = pool.run(_code("x = bytearray(4 * 1024 ** 3)"), df)
+
+    assert result["status"] == "memory_exceeded"
+    assert pool.run(_code("x = 1"), df)["status"] == "ok"
+    assert pool.stats()["memory_exceeded"] == 1
+
+
+def test_caida_del_trabajador(pool, df):
+    pool._workers[0].process.kill()
+    result = pool.run(_code("x = 1"), df)
+
+    assert result["status"] == "crashed"
+    assert pool.stats()["crashes"] == 1
+    assert pool.run(_code("x = 1"), df)["status"] == "ok"
+
+
+def test_reciclado_tras_n_trabajos(pool, df, monkeypatch):
+    monkeypatch.setattr(config, "EXEC_POOL_MAX_JOBS_PER_WORKER", 2)
+    pids = [pool.run(_code("x = 1"), df)["worker_pid"] for _ in range(3)]
+
+    assert pids[0] == pids[1] != pids[2]
+    assert pool.stats()["recycled"] == 1
+
+
+def test_dataset_se_envia_una_vez_por_version(pool, df):
+    pool.preload(df)
+    for _ in range(3):
+        assert pool.run(_code("assert len(df) == 3"), df)["success"]
+    assert pool.stats()["dataset_transfers"] == 1
+
+    new = pd.DataFrame({"amount": [1.0]})
+    new.attrs["dataset_version"] = "v2"
+    assert pool.run(_code("assert len(df) == 1"), new)["success"]
+    assert pool.stats()["dataset_transfers"] == 2
+
+
+def test_envio_fallido_no_marca_el_dataset(pool, df):
+    worker = pool._workers[0]
+
+    def broken_send(message):
+        raise OSError("pipe roto")
+
+    worker.conn.send = broken_send
+    with pytest.raises(OSError):
+        pool.preload(df)
+    assert worker.dataset_key is None
+    assert pool.stats()["dataset_transfers"] == 0
+
+    # Con el trabajador sano, el dataset se vuelve a enviar
+    del worker.conn.send
+    assert pool.run(_code("assert len(df) == 3"), df)["success"]
+    assert worker.dataset_key == ("v1", False)
+    assert pool.stats()["dataset_transfers"] == 1
+
+
+def test_workflow_en_modo_pool(df, tmp_path, monkeypatch):
+    async def get_response_async(model, prompt):
+        path = re.search(r"Save the figure as '(.*?)'", prompt).group(1)
+        return _code(f"df.plot()\nplt.savefig(r'{path}')")
+
+    async def image_openai_call_async(model_name, prompt, media_type, b64, detail="auto"):
+        path = re.search(r"Save the new chart to '(.*?)'", prompt).group(1)
+        return '{"feedback": "Bien"}\n' + _code(f"df.plot(kind='bar')\nplt.savefig(r'{path}')")
+
+    monkeypatch.setattr(utils, "get_response_async", get_response_async)
+    monkeypatch.setattr(utils, "image_openai_call_async", image_openai_call_async)
+    monkeypatch.setattr(data_processing, "load_configured_data", lambda use_cache=None: df)
+    monkeypatch.setattr(config, "AGGREGATE_CUBE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_STREAMING_ENABLED", False)
+    monkeypatch.setattr(config, "EXECUTION_MODE", "pool")
+    monkeypatch.setattr(config, "EXEC_POOL_SIZE", 1)
+    try:
+        results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="p", output_dir=str(tmp_path)))
+    finally:
+        exec_pool.shutdown()
+
+    assert results["status"] == "Completed"
+    assert (tmp_path / "p_v1.png").exists() and (tmp_path / "p_v2.png").exists()
+    assert results["execution"]["v1"]["pool"]["status"] == "ok"
+    assert results["execution"]["v2"]["pool"]["worker_pid"] == results["execution"]["v1"]["pool"]["worker_pid"]
+
+
+def test_graficos_capturados_vuelven_del_trabajador(pool, df, tmp_path):
+    result = pool.run(_code(f"plt.plot(df['amount'])\nplt.savefig(r'{tmp_path / 'c.png'}')"), df, capture=True)
+
+    assert result["status"] == "ok"
+    assert result["figures"][str(tmp_path / "c.png")].startswith(b"\x89PNG")
+    assert not (tmp_path / "c.png").exists()
@@ -0,0 +1,96 @@
+import asyncio
+import pstats
+import re
+
+import pandas as pd
+import pytest
+
+from src import config
+from src import data_processing
+from src import executor
+from src import main
+from src import utils
+
+CHART_CODE = """<execute_python>
+import matplotlib.pyplot as plt
+summary = df.groupby('gender')['total_amount'].sum()
+fig, ax = plt.subplots()
+ax.bar(summary.index, summary.values)
+ax.set_title('Ventas')
+fig.savefig(r'{path}')
+plt.close(fig)
+</execute_python>"""
+
+
+@pytest.fixture
+def profiling(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "EXEC_PROFILING_ENABLED", True)
+    monkeypatch.setattr(config, "EXEC_PROFILE_DIR", tmp_path / "profiles")
+
+
+def test_perfil_con_fases_memoria_y_funciones(df, profiling):
+    exec_info = {}
+
+    assert executor.extract_and_execute_code(CHART_CODE.format(path="x.png"), df, exec_info=exec_info, figures={})
+
+    profile = exec_info["profile"]
+    assert set(profile) == {"wall_s", "phases", "peak_mb", "top", "dump"}
+    phases = profile["phases"]
+    assert phases["plot_s"] > 0 and phases["save_s"] > 0 and phases["data_s"] >= 0
+    assert sum(phases.values()) == pytest.approx(profile["wall_s"], abs=0.01)
+    assert profile["peak_mb"] > 0
+    assert len(profile["top"]) == config.EXEC_PROFILE_TOP_N
+    assert set(profile["top"][0]) == {"function", "calls", "tottime_s", "cumtime_s"}
+    assert profile["dump"] is None
+
+
+def test_perfil_completo_en_disco(df, profiling, monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "EXEC_PROFILE_DUMP", True)
+    exec_info = {}
+
+    assert executor.extract_and_execute_code(CHART_CODE.format(path="x.png"), df, exec_info=exec_info, figures={})
+
+    dump = exec_info["profile"]["dump"]
+    assert dump.startswith(str(tmp_path / "profiles"))
+    assert pstats.Stats(dump).total_calls > 0
+
+
+def test_el_perfil_se_guarda_aunque_el_codigo_falle(df, profiling):
+    exec_info = {}
+
+    assert not executor.extract_and_execute_code("<execute_python>df['nope']</execute_python>", df, exec_info=exec_info)
+    assert exec_info["error"].startswith("KeyError")
+    assert exec_info["profile"]["phases"]["save_s"] == 0
+
+
+def test_sin_perfilado_no_hay_perfil(df):
+    exec_info = {}
+
+    assert executor.extract_and_execute_code(CHART_CODE.format(path="x.png"), df, exec_info=exec_info, figures={})
+    assert "profile" not in exec_info
+
+
+def test_el_resultado_del_workflow_incluye_los_perfiles(profiling, monkeypatch, tmp_path):
+    def code_for(prompt, marker):
+        return CHART_CODE.format(path=re.search(marker + r" '(.*?)'", prompt).group(1))
+
+    async def get_response_async(model, prompt):
+        return code_for(prompt, "Save the figure as")
+
+    async def image_openai_call_async(model_name, prompt, media_type, b64, detail="auto"):
+        return '{"feedback": "Bien"}\n' + code_for(prompt, "Save the new chart to")
+
+    monkeypatch.setattr(utils, "get_response_async", get_response_async)
+    monkeypatch.setattr(utils, "image_openai_call_async", image_openai_call_async)
+    monkeypatch.setattr(data_processing, "load_configured_data",
+                        lambda use_cache=None: pd.DataFrame({"gender": ["F", "M"], "total_amount": [10.0, 20.0]}))
+    monkeypatch.setattr(config, "AGGREGATE_CUBE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_STREAMING_ENABLED", False)
+    monkeypatch.setattr(config, "CHARTS_DIR", tmp_path / "charts")
+    (tmp_path / "charts").mkdir()
+
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="perfilado"))
+
+    assert results["status"] == "Completed"
+    assert set(results["profile"]) == {"v1", "v2"}
+    assert results["profile"]["v1"] is results["execution"]["v1"]["profile"]
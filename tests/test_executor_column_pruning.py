@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src import executor
+from src.executor import _referenced_columns, extract_and_execute_code
+
+COLUMNS = ["date", "gender", "age", "product_category", "quantity", "total_amount", "year", "quarter"]
+
+
+# ---------- Tests para _referenced_columns ----------
+
+def test_detecta_columnas_por_subindice_y_atributo():
+    code = (
+        "q1 = df[df['quarter'] == 1]\n"
+        "res = q1.groupby('product_category')['total_amount'].sum()\n"
+        "plt.plot(df.year, res.values)"
+    )
+    assert _referenced_columns(code, COLUMNS) == {"quarter", "product_category", "total_amount", "year"}
+
+
+def test_loc_con_columnas_explicitas():
+    code = "s = df.loc[df['age'] > 30, ['gender', 'quantity']]"
+    assert _referenced_columns(code, COLUMNS) == {"age", "gender", "quantity"}
+
+
+def test_iterar_grupos_sigue_los_alias():
+    code = (
+        "for name, g in df.groupby('gender'):\n"
+        "    ax.plot(g['date'], g['total_amount'], label=name)"
+    )
+    assert _referenced_columns(code, COLUMNS) == {"gender", "date", "total_amount"}
+
+
+@pytest.mark.parametrize("code", [
+    "df.sum()",
+    "print(df.columns)",
+    "df.groupby('year').mean()",
+    "df.query('age > 30')",
+    "clean = df.dropna()",
+    "sns.barplot(data=df, x='gender', y='age')",
+    "for col in df:\n    print(col)",
+    "col = 'total_' + 'amount'\nprint(df[f'{col}'])",
+    "sub = df[df['age'] > 1]\nsub.describe()",
+])
+def test_usos_de_todo_el_marco_no_son_concluyentes(code):
+    assert _referenced_columns(code, COLUMNS) is None
+
+
+def test_subset_explicito_si_es_concluyente():
+    code = "clean = df.dropna(subset=['age'])\nclean['age'].hist()"
+    assert _referenced_columns(code, COLUMNS) == {"age"}
+
+
+# ---------- Tests para extract_and_execute_code con poda ----------
+
+def test_ejecucion_podada_solo_ve_las_columnas_usadas(df, monkeypatch):
+    seen = {}
+    original = executor._build_exec_globals
+    # Se inyecta 'seen' en el entorno de ejecución para inspeccionarlo
+    monkeypatch.setattr(executor, "_build_exec_globals", lambda frame, aggs: {**original(frame, aggs), "seen": seen})
+    code = "<execute_python>seen['width'] = len(df[['age', 'gender']].columns) + df.shape[1]</execute_python>"
+
+    assert extract_and_execute_code(code, df, prune_columns=True)
+    assert seen["width"] == 4
+
+
+def test_fallo_por_columna_ausente_repite_con_todo(df, monkeypatch):
+    # Simula un análisis que se deja una columna fuera
+    monkeypatch.setattr(executor, "_referenced_columns", lambda code, columns: {"age"})
+    code = "<execute_python>df['b'] = df['gender']\nassert df.shape[1] == 13</execute_python>"
+
+    assert extract_and_execute_code(code, df, prune_columns=True)
+
+
+@pytest.mark.parametrize("copy_on_write", [True, False])
+def test_el_marco_podado_no_copia_los_datos(df, monkeypatch, copy_on_write):
+    frames = []
+    original = executor._build_exec_globals
+    monkeypatch.setattr(executor, "_build_exec_globals", lambda frame, aggs: frames.append(frame) or original(frame, aggs))
+    code = "<execute_python>total = df['age'].sum() + df['quantity'].sum()</execute_python>"
+
+    with pd.option_context("mode.copy_on_write", copy_on_write):
+        assert extract_and_execute_code(code, df, prune_columns=True)
+
+    assert list(frames[0].columns) == ["age", "quantity"]
+    assert np.shares_memory(frames[0]["age"].to_numpy(), df["age"].to_numpy())
+
+
+def test_otros_errores_no_repiten_la_ejecucion(df, monkeypatch):
+    runs = []
+    original = executor._build_exec_globals
+    monkeypatch.setattr(executor, "_build_exec_globals", lambda frame, aggs: runs.append(frame) or original(frame, aggs))
+    exec_info = {}
+    code = "<execute_python>totals = {'a': df['age'].sum()}\ntotals['b']</execute_python>"
+
+    assert extract_and_execute_code(code, df, prune_columns=True, exec_info=exec_info) is False
+    assert len(runs) == 1
+    assert exec_info["error"] == "KeyError: 'b'"
+
+
+def test_sin_poda_se_usa_el_marco_completo(df):
+    code = "<execute_python>df['b'] = df['age'] * 2\nassert df['b'].tolist() == [68, 52, 100]</execute_python>"
+    assert extract_and_execute_code(code, df)
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import config
+from src import executor
+from src.executor import extract_and_execute_code
+
+
+def _code(body: str) -> str:
+    return f"<execute_python>\n{body}\n</execute_python>"
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "df['b'] = df['age'] * 2",
+        "df.dropna(inplace=True)\ndf.drop(columns=['gender'], inplace=True)",
+        "df.loc[df['age'] > 30, 'age'] = 0",
+        "df['age'] += 1",
+        "df.sort_values('age', inplace=True)\ndf.reset_index(drop=True, inplace=True)",
+        "df.rename(columns={'age': 'edad'}, inplace=True)",
+    ],
+)
+def test_las_mutaciones_del_v1_no_llegan_al_v2(df, body):
+    original = df.copy(deep=True)
+
+    assert extract_and_execute_code(_code(body), df)
+    # El V2 recibe el mismo objeto df y debe verlo intacto
+    assert extract_and_execute_code(_code("assert 'b' not in df.columns\nassert df['age'].tolist() == [34, 26, 50]"), df)
+    pd.testing.assert_frame_equal(df, original)
+
+
+def test_la_copia_comparte_los_datos_hasta_que_se_escribe(df):
+    exec_df = executor._build_exec_globals(df, None)["df"]
+
+    assert exec_df is not df
+    assert np.shares_memory(exec_df["age"].to_numpy(), df["age"].to_numpy())
+
+    exec_df.loc[0, "age"] = 99
+    assert not np.shares_memory(exec_df["age"].to_numpy(), df["age"].to_numpy())
+    assert df.loc[0, "age"] == 34
+
+
+def test_el_modo_copy_on_write_se_activa_para_todo_el_proceso(df):
+    assert pd.get_option("mode.copy_on_write") is True
+
+    assert extract_and_execute_code(_code("import pandas as pd\nassert pd.get_option('mode.copy_on_write')"), df)
+    # Terminar una ejecución no lo desactiva para los demás hilos
+    assert pd.get_option("mode.copy_on_write") is True
+
+
+def test_enable_copy_on_write_respeta_la_configuracion(monkeypatch):
+    monkeypatch.setattr(config, "DATAFRAME_COPY_ON_WRITE", False)
+    with pd.option_context("mode.copy_on_write", False):
+        executor.enable_copy_on_write()
+        assert pd.get_option("mode.copy_on_write") is False
+
+        monkeypatch.setattr(config, "DATAFRAME_COPY_ON_WRITE", True)
+        executor.enable_copy_on_write()
+        assert pd.get_option("mode.copy_on_write") is True
+
+
+def test_los_agregados_tampoco_se_modifican(df):
+    aggs = {"by_gender": df.groupby("gender", as_index=False)["total_amount"].sum()}
+    before = aggs["by_gender"].copy(deep=True)
+    code = _code("aggs['by_gender'].loc[0, 'total_amount'] = -1\naggs['by_gender'].dropna(inplace=True)")
+
+    assert extract_and_execute_code(code, df, aggs)
+    pd.testing.assert_frame_equal(aggs["by_gender"], before)
+
+
+def test_sin_copy_on_write_se_comparte_el_mismo_df(df, monkeypatch):
+    monkeypatch.setattr(config, "DATAFRAME_COPY_ON_WRITE", False)
+
+    assert extract_and_execute_code(_code("df['b'] = 1"), df)
+    assert "b" in df.columns
@@ -1,6 +1,7 @@
+import numpy as np
 import pandas as pd
 import pytest
-from src.executor import _extract_code, _execute_code, extract_and_execute_code
+from src.executor import _extract_code, _execute_code, _build_exec_globals, extract_and_execute_code
 
 # ---------- Tests para _extract_code ----------
 
@@ -25,12 +26,17 @@ def test_extract_code_sin_tags_retorna_none():
 
 # ---------- Tests para _execute_code ----------
 
-def test_execute_code_exito_modifica_df(df):
-    code = "df['b'] = df['age'] * 2"
+def test_execute_code_exito_no_modifica_df(df):
+    # El código trabaja sobre una copia perezosa: el df del llamador no cambia
+    code = "df['b'] = df['age'] * 2\nassert df['b'].tolist() == [68, 52, 100]"
     ok = _execute_code(code, df)
     assert ok is True
-    assert 'b' in df.columns
-    assert df['b'].tolist() == [68, 52, 100]
+    assert 'b' not in df.columns
+
+def test_execute_code_no_copia_el_df_del_llamador(df):
+    # La copia perezosa comparte los datos: ejecutar no duplica el dataset
+    exec_df = _build_exec_globals(df, None)["df"]
+    assert np.shares_memory(exec_df['age'].to_numpy(), df['age'].to_numpy())
 
 def test_execute_code_error_retorna_false(df):
     # Falla inmediatamente (NameError) y no modifica df
@@ -45,12 +51,12 @@ def test_extract_and_execute_exito(df):
     txt = """
     Texto del LLM...
     <execute_python>
-    df['b'] = df['age'] + 10
+    df['b'] = df['age'] + 10; assert df['b'].tolist() == [44, 36, 60]
     </execute_python>
     """
     ok = extract_and_execute_code(txt, df)
     assert ok is True
-    assert df['b'].tolist() == [44, 36, 60]
+    assert 'b' not in df.columns
 
 def test_extract_and_execute_sin_tags(df):
     txt = "No hay código aquí"
@@ -0,0 +1,84 @@
+import pytest
+
+from src import config
+from src import executor
+from src.executor import extract_and_execute_code
+
+
+@pytest.fixture(autouse=True)
+def empty_compile_cache():
+    executor.clear_compile_cache()
+    yield
+    executor.clear_compile_cache()
+
+
+def _run(code, df, exec_info=None):
+    return extract_and_execute_code(f"<execute_python>\n{code}\n</execute_python>", df, exec_info=exec_info)
+
+
+@pytest.mark.parametrize("code, reason", [
+    ("data = open('/etc/passwd').read()", "line 1: file access (open) is not allowed"),
+    ("import os\nos.listdir('.')", "line 1: import of 'os' is not allowed"),
+    ("from urllib.request import urlopen", "line 1: import of 'urllib.request' is not allowed"),
+    ("import pandas as pd\nother = pd.read_csv('x.csv')", "line 2: data loading (.read_csv) is not allowed; use 'df'"),
+    ("import matplotlib.pyplot as plt\nplt.plot([1])\nplt.show()", "line 3: interactive display (.show) is not allowed"),
+    ("for i, row in df.iterrows():\n    pass", "line 1: row-by-row loop over the full dataset (df.iterrows); use vectorized pandas operations"),
+    ("while True:\n    x = 1", "line 1: infinite loop (while True without break)"),
+    ("x = ().__class__.__bases__", "line 1: dunder attribute access (__bases__) is not allowed"),
+    ("x = = 1", "line 1: syntax error (invalid syntax)"),
+])
+def test_codigo_rechazado_con_motivo(df, code, reason):
+    exec_info = {}
+
+    assert _run(code, df, exec_info) is False
+    assert exec_info["error"] == f"CodeRejected: {reason}"
+
+
+def test_codigo_rechazado_no_se_ejecuta(df):
+    assert _run("df['b'] = 1\nimport matplotlib.pyplot as plt\nplt.show()", df) is False
+    assert "b" not in df.columns
+
+
+def test_codigo_valido_no_se_rechaza(df):
+    code = (
+        "import matplotlib.pyplot as plt\n"
+        "summary = df.groupby('gender')['total_amount'].sum().reset_index()\n"
+        "for i, row in summary.iterrows():\n"
+        "    pass\n"
+        "while True:\n"
+        "    break\n"
+        "df['b'] = len(summary)\n"
+        "assert df['b'].tolist() == [2, 2, 2]"
+    )
+    assert _run(code, df) is True
+
+
+def test_validacion_desactivada(df, monkeypatch):
+    monkeypatch.setattr(config, "CODE_VALIDATION_ENABLED", False)
+
+    assert _run("for i, row in df.iterrows():\n    df.loc[i, 'b'] = 1", df) is True
+
+
+def test_el_codigo_se_compila_una_vez(df, monkeypatch):
+    compiled = []
+    real_compile = compile
+    monkeypatch.setattr("builtins.compile", lambda *a, **k: compiled.append(a) or real_compile(*a, **k))
+
+    assert _run("df['b'] = df['age'] + 1", df) is True
+    # Una ejecución consulta la caché una sola vez
+    assert executor.get_compile_cache_stats() == {"hits": 0, "misses": 1, "rejected": 0, "size": 1}
+
+    for _ in range(2):
+        assert _run("df['b'] = df['age'] + 1", df) is True
+
+    # Una sola vez: ast.parse y la compilación del árbol
+    assert len(compiled) == 2
+    assert executor.get_compile_cache_stats() == {"hits": 2, "misses": 1, "rejected": 0, "size": 1}
+
+
+def test_cache_acotada(df, monkeypatch):
+    monkeypatch.setattr(config, "COMPILE_CACHE_SIZE", 2)
+    for i in range(4):
+        _run(f"x = {i}", df)
+
+    assert executor.get_compile_cache_stats()["size"] == 2
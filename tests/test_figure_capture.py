@@ -0,0 +1,126 @@
+import asyncio
+import base64
+import io
+import re
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from src import config
+from src import data_processing
+from src import executor
+from src import main
+from src import utils
+
+CHART_CODE = """<execute_python>
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots()
+ax.bar(df['product'], df['amount'])
+fig.savefig(r'{path}')
+plt.close(fig)
+</execute_python>"""
+
+
+@pytest.fixture
+def workflow_env(tmp_path, monkeypatch):
+    """Workflow con LLM simulado; guarda las imágenes que recibe el reflector."""
+    state = {"images": []}
+
+    def code_for(prompt, marker):
+        return CHART_CODE.format(path=re.search(marker + r" '(.*?)'", prompt).group(1))
+
+    async def get_response_async(model, prompt):
+        return code_for(prompt, "Save the figure as")
+
+    async def image_openai_call_async(model_name, prompt, media_type, b64, detail="auto"):
+        state["images"].append(base64.b64decode(b64))
+        return '{"feedback": "Bien"}\n' + code_for(prompt, "Save the new chart to")
+
+    monkeypatch.setattr(utils, "get_response_async", get_response_async)
+    monkeypatch.setattr(utils, "image_openai_call_async", image_openai_call_async)
+    monkeypatch.setattr(data_processing, "load_configured_data",
+                        lambda use_cache=None: pd.DataFrame({"product": ["Latte", "Mocha"], "amount": [10.0, 20.0]}))
+    monkeypatch.setattr(config, "AGGREGATE_CUBE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_STREAMING_ENABLED", False)
+    monkeypatch.setattr(config, "CHARTS_DIR", tmp_path / "charts")
+    monkeypatch.setattr(config, "FIGURE_CAPTURE_ENABLED", True)
+    (tmp_path / "charts").mkdir()
+    return state
+
+
+def test_savefig_se_captura_en_memoria(df, tmp_path):
+    figures = {}
+    code = (
+        "<execute_python>\nimport matplotlib.pyplot as plt\n"
+        f"plt.plot(df['age'])\nplt.savefig(r'{tmp_path / 'a.png'}', dpi=50)\n"
+        f"plt.savefig(r'{tmp_path / 'b.jpg'}')\n</execute_python>"
+    )
+
+    assert executor.extract_and_execute_code(code, df, figures=figures) is True
+
+    assert list(tmp_path.iterdir()) == []
+    assert Image.open(io.BytesIO(figures[str(tmp_path / "a.png")])).format == "PNG"
+    assert Image.open(io.BytesIO(figures[str(tmp_path / "b.jpg")])).format == "JPEG"
+
+
+def test_sin_captura_savefig_escribe_en_disco(df, tmp_path):
+    code = f"<execute_python>\nimport matplotlib.pyplot as plt\nplt.plot([1])\nplt.savefig(r'{tmp_path / 'a.png'}')\n</execute_python>"
+
+    assert executor.extract_and_execute_code(code, df) is True
+    assert (tmp_path / "a.png").exists()
+
+
+def test_workflow_sin_persistir_no_toca_el_disco(workflow_env, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PERSIST_CHARTS", False)
+
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="t"))
+
+    assert results["status"] == "Completed"
+    assert list((tmp_path / "charts").iterdir()) == []
+    assert results["chart_v1_path"] is None and results["chart_v2_path"] is None
+    # El reflector recibió el V1 desde memoria
+    assert Image.open(io.BytesIO(workflow_env["images"][0])).size == Image.open(io.BytesIO(results["chart_images"]["v1"])).size
+    assert results["chart_images"]["v2"].startswith(b"\x89PNG")
+
+
+def test_workflow_persiste_en_segundo_plano(workflow_env, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PERSIST_CHARTS", True)
+
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="t"))
+
+    assert (tmp_path / "charts" / "t_v1.png").read_bytes() == results["chart_images"]["v1"]
+    assert (tmp_path / "charts" / "t_v2.png").read_bytes() == results["chart_images"]["v2"]
+
+
+def test_codigo_sin_savefig_falla_en_v1(workflow_env, monkeypatch):
+    async def no_savefig(model, prompt):
+        return "<execute_python>\nx = 1\n</execute_python>"
+
+    monkeypatch.setattr(utils, "get_response_async", no_savefig)
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2"))
+
+    assert results["status"] == "Error en V1"
+    assert results["execution"]["v1"]["error"].startswith("NoChart")
+
+
+def test_memoizacion_sirve_los_bytes_sin_disco(workflow_env, monkeypatch):
+    monkeypatch.setattr(config, "PERSIST_CHARTS", False)
+
+    first = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="a"))
+    second = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="b"))
+
+    assert second["memo"] == "charts"
+    assert second["chart_images"] == first["chart_images"]
+
+
+def test_api_devuelve_data_urls_sin_persistir(workflow_env, monkeypatch):
+    from src import api
+
+    monkeypatch.setattr(config, "PERSIST_CHARTS", False)
+    response = TestClient(api.app).post("/generate-chart/", json={"instruction": "Ventas"}).json()
+
+    assert "chart_images" not in response
+    assert response["chart_v1_url"].startswith("data:image/png;base64,")
+    assert base64.b64decode(response["chart_v2_url"].split(",", 1)[1]).startswith(b"\x89PNG")
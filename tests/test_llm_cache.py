@@ -0,0 +1,120 @@
+import os
+import time
+import pytest
+from src import config
+from src import llm_cache
+from src import utils
+
+
+def _respuesta(n: int) -> str:
+    return f"respuesta {n}\n<execute_python>x = {n}</execute_python>"
+
+
+class FakeResponses:
+    def __init__(self):
+        self.calls = 0
+        self.status = "completed"
+        self.text = _respuesta
+
+    def create(self, model, input):
+        self.calls += 1
+        return type("R", (), {"output_text": self.text(self.calls), "status": self.status})()
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    responses = FakeResponses()
+    monkeypatch.setattr(utils, "openai_client", type("C", (), {"responses": responses})())
+    return responses
+
+
+def test_prompt_repetido_se_sirve_desde_memoria(fake_client):
+    first = utils.get_response("m", "prompt")
+    second = utils.get_response("m", "prompt")
+
+    assert first == second == _respuesta(1)
+    assert fake_client.calls == 1
+    assert llm_cache.get_cache_stats()["memory_hits"] == 1
+
+
+def test_la_clave_depende_de_modelo_prompt_e_imagen(fake_client):
+    utils.get_response("m", "prompt")
+    utils.get_response("otro", "prompt")
+    utils.image_openai_call("m", "prompt", "image/png", "aaaa")
+    utils.image_openai_call("m", "prompt", "image/png", "bbbb")
+    utils.image_openai_call("m", "prompt", "image/png", "aaaa")
+
+    assert fake_client.calls == 4
+
+
+def test_nivel_en_disco_sobrevive_a_la_memoria(fake_client):
+    utils.get_response("m", "prompt")
+    llm_cache.clear_cache()  # Simula un proceso nuevo
+
+    assert utils.get_response("m", "prompt") == _respuesta(1)
+    assert fake_client.calls == 1
+    assert llm_cache.get_cache_stats()["disk_hits"] == 1
+
+
+def test_entradas_caducadas_se_vuelven_a_pedir(fake_client, monkeypatch):
+    utils.get_response("m", "prompt")
+    llm_cache.clear_cache()
+    monkeypatch.setattr(config, "LLM_CACHE_TTL_SECONDS", -1)
+
+    assert utils.get_response("m", "prompt") == _respuesta(2)
+    assert llm_cache.get_cache_stats()["expired"] == 1
+
+
+def test_expulsion_por_tamano_borra_lo_menos_usado(monkeypatch):
+    monkeypatch.setattr(config, "LLM_CACHE_MAX_BYTES", 2500)
+    keys = [llm_cache.make_key("m", f"prompt {i}") for i in range(5)]
+    for i, key in enumerate(keys):
+        llm_cache.put(key, "x" * 800, "m")
+        path = llm_cache._entry_path(key)
+        if path.exists():
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))  # Orden de uso explícito
+
+    llm_cache.clear_cache()
+    surviving = [key for key in keys if llm_cache.get(key) is not None]
+
+    assert keys[-1] in surviving
+    assert keys[0] not in surviving
+    assert sum(p.stat().st_size for p in config.LLM_CACHE_DIR.glob("*/*.json")) <= 2500
+
+
+def test_track_recoge_solo_las_estadisticas_del_bloque(fake_client):
+    utils.get_response("m", "prompt")
+    with llm_cache.track() as stats:
+        utils.get_response("m", "prompt")
+        utils.get_response("m", "nuevo")
+
+    assert stats == {"memory_hits": 1, "disk_hits": 0, "misses": 1, "expired": 0, "evictions": 0}
+
+
+def test_cache_desactivada_siempre_llama_a_la_api(fake_client, monkeypatch):
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", False)
+    utils.get_response("m", "prompt")
+    utils.get_response("m", "prompt")
+
+    assert fake_client.calls == 2
+
+
+def test_respuesta_incompleta_no_se_guarda(fake_client):
+    # Cortada por max_output_tokens o por el filtro de contenido
+    fake_client.status = "incomplete"
+    utils.get_response("m", "prompt")
+    utils.image_openai_call("m", "prompt", "image/png", "aaaa")
+    fake_client.status = "completed"
+
+    assert utils.get_response("m", "prompt") == _respuesta(3)
+    assert utils.image_openai_call("m", "prompt", "image/png", "aaaa") == _respuesta(4)
+    assert fake_client.calls == 4
+
+
+def test_respuesta_sin_bloque_de_codigo_no_se_guarda(fake_client):
+    fake_client.text = lambda n: f"respuesta {n} sin código"
+    utils.get_response("m", "prompt")
+    utils.get_response("m", "prompt")
+
+    assert fake_client.calls == 2
+    assert llm_cache.get_cache_stats()["memory_hits"] == 0
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+from openai import OpenAI, AsyncOpenAI
+
+from src import config
+from src import llm_policy
+from src import utils
+
+
+class StubServer:
+    """
+    Servidor local de la API Responses que inyecta latencia y errores.
+    `script` es una lista de (status, segundos) que se consume petición a
+    petición; cuando se agota, responde 200 sin retardo.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                with server._lock:
+                    server.requests += 1
+                    n = server.requests
+                    status, delay = server.script.pop(0) if server.script else (200, 0)
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(delay)
+                    if status == 200:
+                        body = {"id": f"resp_{n}", "object": "response", "created_at": 0, "model": "m",
+                                "status": "completed", "output": [{
+                                    "type": "message", "id": "msg", "role": "assistant", "status": "completed",
+                                    "content": [{"type": "output_text", "text": f"respuesta {n}", "annotations": []}],
+                                }]}
+                    else:
+                        body = {"error": {"message": "fallo inyectado", "type": "server_error"}}
+                    payload = json.dumps(body).encode()
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # El cliente canceló la petición perdedora
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubServer()
+    monkeypatch.setattr(utils, "openai_client", OpenAI(api_key="test", base_url=server.base_url, max_retries=0))
+    monkeypatch.setattr(utils, "openai_async_client", AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0))
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(config, "LLM_HEDGING_ENABLED", False)
+    llm_policy.reset_metrics()
+    yield server
+    server.httpd.shutdown()
+    llm_policy.reset_metrics()
+
+
+def test_errores_transitorios_se_reintentan(stub):
+    stub.script = [(500, 0), (429, 0)]
+
+    assert utils.get_response("m", "hola") == "respuesta 3"
+    metrics = llm_policy.get_metrics()["m"]
+    assert metrics["retries"] == 2
+    assert metrics["successes"] == 1 and metrics["failures"] == 0
+
+
+def test_errores_no_transitorios_no_se_reintentan(stub):
+    stub.script = [(400, 0)]
+
+    with pytest.raises(openai.BadRequestError):
+        utils.get_response("m", "hola")
+    assert stub.requests == 1
+    assert llm_policy.get_metrics()["m"]["failures"] == 1
+
+
+def test_reintentos_agotados_propagan_el_error(stub, monkeypatch):
+    monkeypatch.setattr(config, "LLM_MAX_RETRIES", 2)
+    stub.script = [(503, 0)] * 5
+
+    with pytest.raises(openai.InternalServerError):
+        utils.get_response("m", "hola")
+    assert stub.requests == 3
+
+
+def test_backoff_con_jitter_acotado(monkeypatch):
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.5)
+    monkeypatch.setattr(config, "LLM_RETRY_MAX_DELAY", 3.0)
+    delays = [llm_policy.backoff_delay(attempt) for attempt in range(6) for _ in range(50)]
+
+    assert all(0 <= d <= 3.0 for d in delays)
+    assert len(set(delays)) > 1
+    assert max(llm_policy.backoff_delay(0) for _ in range(50)) <= 0.5
+
+
+def test_limite_de_concurrencia_por_modelo(stub, monkeypatch):
+    monkeypatch.setattr(config, "LLM_MAX_CONCURRENCY_PER_MODEL", 2)
+    stub.script = [(200, 0.2)] * 6
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(lambda i: utils.get_response("m", f"p{i}"), range(6)))
+
+    assert stub.max_in_flight == 2
+    assert llm_policy.get_metrics()["m"]["throttled"] >= 1
+
+
+def test_hedging_gana_la_respuesta_mas_rapida(stub, monkeypatch):
+    monkeypatch.setattr(config, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(config, "LLM_HEDGE_DEFAULT_DELAY", 0.1)
+    stub.script = [(200, 2.0), (200, 0)]
+
+    start = time.perf_counter()
+    assert utils.get_response("m", "hola") == "respuesta 2"
+    assert time.perf_counter() - start < 1.0
+    metrics = llm_policy.get_metrics()["m"]
+    assert metrics["hedges_fired"] == 1 and metrics["hedges_won"] == 1
+
+
+def test_hedging_asincrono_cancela_la_perdedora(stub, monkeypatch):
+    monkeypatch.setattr(config, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(config, "LLM_HEDGE_DEFAULT_DELAY", 0.1)
+    stub.script = [(200, 2.0), (200, 0)]
+
+    start = time.perf_counter()
+    assert asyncio.run(utils.get_response_async("m", "hola")) == "respuesta 2"
+    assert time.perf_counter() - start < 1.0
+    assert llm_policy.get_metrics()["m"]["hedges_won"] == 1
+
+
+def test_hedging_libera_la_plaza_de_la_perdedora(stub, monkeypatch):
+    monkeypatch.setattr(config, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(config, "LLM_HEDGE_DEFAULT_DELAY", 0.1)
+    monkeypatch.setattr(config, "LLM_MAX_CONCURRENCY_PER_MODEL", 2)
+    stub.script = [(200, 2.0), (200, 0)]
+
+    assert utils.get_response("m", "hola") == "respuesta 2"
+    # La primaria sigue en vuelo, pero ya no ocupa plaza: caben dos llamadas más
+    semaphore = llm_policy._semaphore("m")
+    assert semaphore.acquire(blocking=False) and semaphore.acquire(blocking=False)
+    semaphore.release()
+    semaphore.release()
+
+
+def test_cancelar_la_llamada_asincrona_cancela_la_primaria(monkeypatch):
+    monkeypatch.setattr(config, "LLM_HEDGE_DEFAULT_DELAY", 1.0)
+    llm_policy.reset_metrics()
+
+    async def scenario():
+        cancelled = asyncio.Event()
+
+        async def request():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        task = asyncio.ensure_future(llm_policy.call_async("m", request, hedge=True))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return llm_policy._async_semaphore("m").locked()
+
+    assert asyncio.run(scenario()) is False
+    llm_policy.reset_metrics()
+
+
+def test_la_latencia_no_incluye_la_espera_por_plaza(monkeypatch):
+    monkeypatch.setattr(config, "LLM_MAX_CONCURRENCY_PER_MODEL", 1)
+    llm_policy.reset_metrics()
+
+    def request():
+        time.sleep(0.3)
+        return "ok"
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(lambda _: llm_policy.call("m", request, hedge=False), range(3)))
+
+    metrics = llm_policy.get_metrics()["m"]
+    assert metrics["throttled"] >= 1
+    # La tercera llamada espera ~0.6 s por la plaza, pero su petición dura 0.3 s
+    assert metrics["latency_p95"] < 0.5
+    llm_policy.reset_metrics()
+
+
+def test_retardo_de_hedging_usa_el_p95(monkeypatch):
+    monkeypatch.setattr(config, "LLM_HEDGE_MIN_SAMPLES", 10)
+    monkeypatch.setattr(config, "LLM_HEDGE_MIN_DELAY", 0.0)
+    llm_policy.reset_metrics()
+    for i in range(100):
+        llm_policy._record_latency("m", i / 100)
+
+    assert llm_policy.hedge_delay("m") == pytest.approx(0.94)
+    assert llm_policy.hedge_delay("otro") == config.LLM_HEDGE_DEFAULT_DELAY
+    llm_policy.reset_metrics()
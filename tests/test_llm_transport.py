@@ -0,0 +1,167 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI, DefaultHttpxClient
+
+from src import config
+from src import data_processing
+from src import llm_transport
+from src import main
+from src import utils
+
+SERVER_DELAY = 0.2
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    """Clientes de OpenAI restaurados al terminar; grabaciones en tmp_path."""
+    monkeypatch.setattr(utils, "openai_client", utils.openai_client)
+    monkeypatch.setattr(utils, "openai_async_client", utils.openai_async_client)
+    monkeypatch.setattr(config, "LLM_RECORDINGS_DIR", tmp_path / "recordings")
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_TRANSPORT_LATENCY_SCALE", 0.0)
+    llm_transport.clear_recordings()
+    yield
+    llm_transport.clear_recordings()
+
+
+@pytest.fixture
+def sales(tmp_path, monkeypatch):
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-15", "2024-05-02", "2025-02-10"]),
+        "product": ["Latte", "Mocha", "Latte"],
+        "amount": [10.0, 20.0, 5.0],
+    })
+    df = data_processing._add_date_parts(df)
+    monkeypatch.setattr(data_processing, "load_configured_data", lambda use_cache=None: df.copy())
+    monkeypatch.setattr(config, "AGGREGATE_CUBE_ENABLED", False)
+    monkeypatch.setattr(config, "CHARTS_DIR", tmp_path / "charts")
+    (tmp_path / "charts").mkdir()
+    return df
+
+
+class EchoServer:
+    """API Responses local: responde con código que guarda en la ruta pedida."""
+
+    def __init__(self):
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests += 1
+                time.sleep(SERVER_DELAY)
+                path = re.search(r"Save the figure as '(.*?)'", body["input"]).group(1)
+                text = f"<execute_python>\nplt.savefig('{path}')\n</execute_python>"
+                payload = json.dumps({"id": "r", "object": "response", "created_at": 0, "model": body["model"],
+                                      "status": "completed", "output": [{
+                                          "type": "message", "id": "m", "role": "assistant", "status": "completed",
+                                          "content": [{"type": "output_text", "text": text, "annotations": []}]}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+def test_workflow_completo_sin_red_en_modo_sintetico(offline, sales, monkeypatch):
+    utils.set_llm_transport("synthetic")
+
+    for streaming in (False, True):
+        monkeypatch.setattr(config, "LLM_STREAMING_ENABLED", streaming)
+        results = main.run_workflow("Ventas por producto", "m1", "m2", image_basename=f"s{streaming}")
+        assert results["status"] == "Completed"
+        assert results["feedback"].startswith("Feedback sintético")
+
+
+def test_workflow_asincrono_y_api_sin_red(offline, sales):
+    from src import api
+
+    utils.set_llm_transport("synthetic")
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="a"))
+    response = TestClient(api.app).post("/generate-chart/", json={"instruction": "Ventas"})
+
+    assert results["status"] == "Completed"
+    assert response.status_code == 200 and response.json()["status"] == "Completed"
+
+
+def test_codigo_sintetico_usa_el_esquema():
+    prompt = (
+        "Save the figure as '/tmp/x_v1.png'\n"
+        "- date: datetime64[ns]; range 2024-01-01 to 2024-12-31\n"
+        "- store id: object\n"
+        "- product: object; values: 'Latte', 'Mocha'\n"
+        "- amount: float64; 2 nulls\n"
+        "- year: int32\n"
+        "- aggs['by_year']: year, count (2 rows)\n"
+    )
+    text = llm_transport.synthetic_text(prompt)
+
+    assert "df.groupby('product', observed=True)['amount'].sum()" in text
+    assert "fig.savefig(r'/tmp/x_v1.png')" in text
+    assert llm_transport.synthetic_text(prompt, has_image=True).startswith('{"feedback": ')
+
+
+def test_grabar_y_reproducir_con_rutas_y_latencia(offline, monkeypatch):
+    server = EchoServer()
+    recorder = llm_transport.make_transport("record")
+    monkeypatch.setattr(utils, "openai_client", OpenAI(
+        api_key="t", base_url=server.base_url, max_retries=0, http_client=DefaultHttpxClient(transport=recorder),
+    ))
+    recorded = utils.get_response("m", "Plot sales. Save the figure as '/a/run1_v1.png'")
+    server.httpd.shutdown()
+    assert "'/a/run1_v1.png'" in recorded
+
+    monkeypatch.setattr(config, "LLM_TRANSPORT_LATENCY_SCALE", 1.0)
+    llm_transport.clear_recordings()  # Se leen de disco
+    utils.set_llm_transport("replay")
+    start = time.perf_counter()
+    replayed = utils.get_response("m", "Plot sales. Save the figure as '/b/run2_v1.png'")
+
+    assert time.perf_counter() - start >= SERVER_DELAY
+    assert replayed == recorded.replace("/a/run1_v1.png", "/b/run2_v1.png")
+    assert server.requests == 1
+
+
+def test_reproducir_sin_grabacion_falla(offline):
+    utils.set_llm_transport("replay")
+
+    with pytest.raises(openai.NotFoundError):
+        utils.get_response("m", "nunca grabado")
+
+
+def test_streaming_reparte_la_latencia(offline, monkeypatch):
+    monkeypatch.setattr(config, "LLM_TRANSPORT_LATENCY_SCALE", 1.0)
+    monkeypatch.setattr(config, "LLM_TRANSPORT_SYNTHETIC_LATENCY", 1.0)
+    monkeypatch.setattr(config, "LLM_TRANSPORT_SYNTHETIC_SIGMA", 0.0)
+    utils.set_llm_transport("synthetic")
+    seen = []
+
+    start = time.perf_counter()
+    text = utils.stream_response("m", "Save the new chart to '/x_v2.png'", ("image/png", "aaaa"), seen.append)
+
+    assert seen == ["Feedback sintético: añade etiquetas a los ejes."]
+    assert text.endswith("</execute_python>")
+    assert 0.3 <= time.perf_counter() - start < 1.5
+
+
+def test_modo_desconocido():
+    with pytest.raises(ValueError):
+        llm_transport.make_transport("satelite")
+    assert llm_transport.make_transport("network") is None
@@ -0,0 +1,122 @@
+import asyncio
+import io
+import re
+import time
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from src import config
+from src import data_processing
+from src import main
+from src import utils
+
+LLM_DELAY = 0.2
+
+CHART_CODE = """<execute_python>
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots()
+ax.bar(df['product'], df['amount'])
+fig.savefig(r'{path}')
+plt.close(fig)
+</execute_python>"""
+
+
+@pytest.fixture
+def fake_llm(tmp_path, monkeypatch):
+    """LLM asíncrono simulado que tarda LLM_DELAY y devuelve código que guarda el gráfico pedido."""
+    calls = {"text": 0, "vision": 0}
+
+    async def get_response_async(model, prompt):
+        calls["text"] += 1
+        await asyncio.sleep(LLM_DELAY)
+        path = re.search(r"Save the figure as '(.*?)'", prompt).group(1)
+        return CHART_CODE.format(path=path)
+
+    async def image_openai_call_async(model_name, prompt, media_type, b64, detail="auto"):
+        calls["vision"] += 1
+        await asyncio.sleep(LLM_DELAY)
+        path = re.search(r"Save the new chart to '(.*?)'", prompt).group(1)
+        return '{"feedback": "Bien"}\n' + CHART_CODE.format(path=path)
+
+    df = pd.DataFrame({"product": ["Latte", "Mocha"], "amount": [10.0, 20.0]})
+    monkeypatch.setattr(utils, "get_response_async", get_response_async)
+    monkeypatch.setattr(utils, "image_openai_call_async", image_openai_call_async)
+    monkeypatch.setattr(data_processing, "load_configured_data", lambda use_cache=None: df.copy())
+    monkeypatch.setattr(config, "AGGREGATE_CUBE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_STREAMING_ENABLED", False)
+    monkeypatch.setattr(config, "CHARTS_DIR", tmp_path)
+    return calls
+
+
+def test_workflow_async_completo(fake_llm, tmp_path):
+    results = asyncio.run(main.run_workflow_async("Ventas por producto", "m1", "m2", image_basename="t"))
+
+    assert results["status"] == "Completed"
+    assert results["feedback"] == "Bien"
+    assert (tmp_path / "t_v1.png").exists() and (tmp_path / "t_v2.png").exists()
+    assert fake_llm == {"text": 1, "vision": 1}
+
+
+def test_workflows_en_vuelo_se_solapan(fake_llm, monkeypatch):
+    # Solo se mide el solapamiento de las esperas al LLM, no el renderizado
+    def fake_execute(code_response, df, aggs, exec_info, figures=None, profile=None):
+        buffer = io.BytesIO()
+        Image.new("RGB", (4, 4)).save(buffer, format="PNG")
+        figures[re.search(r"savefig\(r'(.*?)'\)", code_response).group(1)] = buffer.getvalue()
+        return True
+
+    monkeypatch.setattr(main, "_execute", fake_execute)
+
+    async def run_many(n):
+        return await asyncio.gather(*(
+            main.run_workflow_async("Ventas", "m1", "m2", image_basename=f"w{i}") for i in range(n)
+        ))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_many(20))
+    elapsed = time.perf_counter() - start
+
+    assert all(r["status"] == "Completed" for r in results)
+    # En serie serían 20 * 2 * LLM_DELAY = 8 s; las esperas al LLM se solapan
+    assert elapsed < 20 * 2 * LLM_DELAY / 4
+
+
+def test_error_en_v1_no_llama_al_reflector(fake_llm, monkeypatch):
+    async def broken(model, prompt):
+        return "<execute_python>raise ValueError('x')</execute_python>"
+
+    monkeypatch.setattr(utils, "get_response_async", broken)
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2"))
+
+    assert results["status"] == "Error en V1"
+    assert fake_llm["vision"] == 0
+
+
+def test_get_response_async_usa_el_cliente_compartido(monkeypatch):
+    class FakeResponses:
+        async def create(self, model, input):
+            return type("R", (), {"output_text": f"{model}:{input}"})()
+
+    class FakeClient:
+        responses = FakeResponses()
+
+    monkeypatch.setattr(utils, "openai_async_client", FakeClient())
+    assert asyncio.run(utils.get_response_async("m", "hola")) == "m:hola"
+
+
+def test_endpoint_asincrono_devuelve_urls(monkeypatch, tmp_path):
+    from src import api
+
+    async def fake_workflow(**kwargs):
+        base = kwargs["image_basename"]
+        return {"status": "Completed", "v1_success": True, "chart_v1_path": str(tmp_path / f"{base}_v1.png"),
+                "v2_success": True, "chart_v2_path": str(tmp_path / f"{base}_v2.png"), "feedback": "ok"}
+
+    monkeypatch.setattr(main, "run_workflow_async", fake_workflow)
+    response = TestClient(api.app).post("/generate-chart/", json={"instruction": "Ventas"})
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["chart_v1_url"].startswith(f"/static/{config.API_IMAGE_BASENAME}_")
+    assert body["chart_v1_url"].endswith("_v1.png")
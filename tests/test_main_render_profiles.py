@@ -0,0 +1,124 @@
+import asyncio
+import io
+import re
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from src import config
+from src import data_processing
+from src import executor
+from src import generator
+from src import main
+from src import reflector
+from src import utils
+
+# El código pide dpi=300 explícitamente: el perfil debe imponerse igualmente
+CHART_CODE = """<execute_python>
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots(figsize=(6.4, 4.8))
+ax.plot(df['amount'])
+fig.savefig(r'{path}', dpi=300)
+plt.close(fig)
+</execute_python>"""
+
+
+@pytest.fixture
+def workflow_env(tmp_path, monkeypatch):
+    """Workflow con LLM simulado y captura en memoria."""
+
+    def code_for(prompt, marker):
+        return CHART_CODE.format(path=re.search(marker + r" '(.*?)'", prompt).group(1))
+
+    async def get_response_async(model, prompt):
+        return code_for(prompt, "Save the figure as")
+
+    async def image_openai_call_async(model_name, prompt, media_type, b64, detail="auto"):
+        return '{"feedback": "Bien"}\n' + code_for(prompt, "Save the new chart to")
+
+    monkeypatch.setattr(utils, "get_response_async", get_response_async)
+    monkeypatch.setattr(utils, "image_openai_call_async", image_openai_call_async)
+    monkeypatch.setattr(data_processing, "load_configured_data",
+                        lambda use_cache=None: pd.DataFrame({"product": ["Latte", "Mocha"], "amount": [10.0, 20.0]}))
+    monkeypatch.setattr(config, "AGGREGATE_CUBE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_STREAMING_ENABLED", False)
+    monkeypatch.setattr(config, "CHARTS_DIR", tmp_path / "charts")
+    monkeypatch.setattr(config, "FIGURE_CAPTURE_ENABLED", True)
+    (tmp_path / "charts").mkdir()
+
+
+def _size(image: bytes) -> tuple[int, int]:
+    return Image.open(io.BytesIO(image)).size
+
+
+def test_v1_borrador_y_v2_final(workflow_env):
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="perfil"))
+
+    assert results["status"] == "Completed"
+    assert _size(results["chart_images"]["v1"]) == (640, 480)
+    assert _size(results["chart_images"]["v2"]) == (1920, 1440)
+    assert results["execution"]["v1"]["render_profile"] == {"name": "draft", "dpi": 100}
+    assert results["execution"]["v2"]["render_profile"] == {"name": "final", "dpi": 300}
+    assert results["chart_id"] == "perfil"
+
+
+def test_perfiles_desactivados_respetan_el_dpi_del_codigo(workflow_env, monkeypatch):
+    monkeypatch.setattr(config, "RENDER_PROFILES_ENABLED", False)
+
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="sin_perfil"))
+
+    assert _size(results["chart_images"]["v1"]) == (1920, 1440)
+    assert "render_profile" not in results["execution"]["v1"]
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_los_prompts_solo_piden_dpi_sin_perfiles(monkeypatch, enabled):
+    monkeypatch.setattr(config, "RENDER_PROFILES_ENABLED", enabled)
+
+    prompt_v1 = generator._build_prompt("Ventas", "v1.png", "schema")
+    prompt_v2 = reflector._build_prompt("Ventas", "v2.png", "code", "schema")
+
+    # Sin perfil que lo imponga, el V2 se entregaría a 100 dpi si el código no lo pide
+    assert ("dpi=300" in prompt_v1) is not enabled
+    assert ("dpi=300" in prompt_v2) is not enabled
+
+
+def test_perfil_aplica_rc_durante_la_ejecucion(df):
+    code = (
+        "<execute_python>\nimport matplotlib\nimport matplotlib.pyplot as plt\n"
+        "assert matplotlib.rcParams['path.simplify_threshold'] == 1.0\n"
+        "plt.plot(df['age'])\nplt.savefig('x.png')\n</execute_python>"
+    )
+    figures = {}
+
+    assert executor.extract_and_execute_code(code, df, figures=figures, render_profile=config.RENDER_PROFILES["draft"])
+    assert _size(figures["x.png"]) == (640, 480)
+
+
+def test_rerender_con_otro_dpi_y_formato(workflow_env):
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="rerender"))
+
+    small = main.rerender_chart(results["chart_id"], dpi=50)
+    svg = main.rerender_chart(results["chart_id"], image_format="svg")
+
+    assert _size(small) == (320, 240)
+    assert svg.lstrip().startswith(b"<?xml")
+    assert main.rerender_chart("desconocido") is None
+
+
+def test_endpoint_render(workflow_env):
+    from src import api
+
+    results = asyncio.run(main.run_workflow_async("Ventas", "m1", "m2", image_basename="api_render"))
+    client = TestClient(api.app)
+
+    response = client.get(f"/charts/{results['chart_id']}/render", params={"dpi": 50})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert _size(response.content) == (320, 240)
+
+    assert client.get("/charts/desconocido/render").status_code == 404
+    assert client.get(f"/charts/{results['chart_id']}/render", params={"dpi": 5000}).status_code == 422
+    assert client.get(f"/charts/{results['chart_id']}/render", params={"format": "bmp"}).status_code == 422
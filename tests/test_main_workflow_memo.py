@@ -0,0 +1,132 @@
+import os
+import re
+import pandas as pd
+import pytest
+from src import config
+from src import data_processing
+from src import main
+from src import utils
+from src import workflow_memo
+
+CHART_CODE = """<execute_python>
+import matplotlib.pyplot as plt
+fig, ax = plt.subplots()
+ax.bar(df['product'], df['amount'])
+fig.savefig(r'{path}')
+plt.close(fig)
+</execute_python>"""
+
+
+@pytest.fixture
+def workflow_env(tmp_path, monkeypatch):
+    """Workflow síncrono con LLM simulado y un DataFrame intercambiable."""
+    state = {"df": pd.DataFrame({"product": ["Latte", "Mocha"], "amount": [10.0, 20.0]}), "llm_calls": 0}
+
+    def get_response(model, prompt):
+        state["llm_calls"] += 1
+        return CHART_CODE.format(path=re.search(r"Save the figure as '(.*?)'", prompt).group(1))
+
+    def image_openai_call(model_name, prompt, media_type, b64, detail="auto"):
+        state["llm_calls"] += 1
+        path = re.search(r"Save the new chart to '(.*?)'", prompt).group(1)
+        return '{"feedback": "Bien"}\n' + CHART_CODE.format(path=path)
+
+    monkeypatch.setattr(utils, "get_response", get_response)
+    monkeypatch.setattr(utils, "image_openai_call", image_openai_call)
+    monkeypatch.setattr(data_processing, "load_configured_data", lambda use_cache=None: state["df"].copy())
+    monkeypatch.setattr(config, "AGGREGATE_CUBE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_STREAMING_ENABLED", False)
+    monkeypatch.setattr(config, "CHARTS_DIR", tmp_path / "charts")
+    (tmp_path / "charts").mkdir()
+    return state
+
+
+def test_instruccion_repetida_sirve_los_graficos_guardados(workflow_env):
+    first = main.run_workflow("Ventas por producto", "m1", "m2", image_basename="a")
+    second = main.run_workflow("  VENTAS   por producto. ", "m1", "m2", image_basename="b")
+
+    assert first["memo"] is None
+    assert second["memo"] == "charts"
+    assert second["feedback"] == "Bien"
+    assert workflow_env["llm_calls"] == 2
+    assert open(second["chart_v2_path"], "rb").read() == open(first["chart_v2_path"], "rb").read()
+
+
+def test_datos_nuevos_reejecutan_el_codigo_guardado(workflow_env):
+    main.run_workflow("Ventas por producto", "m1", "m2", image_basename="a")
+    workflow_env["df"] = pd.DataFrame({"product": ["Latte", "Mocha"], "amount": [99.0, 1.0]})
+
+    results = main.run_workflow("Ventas por producto", "m1", "m2", image_basename="b")
+
+    assert results["status"] == "Completed"
+    assert results["memo"] == "code"
+    assert workflow_env["llm_calls"] == 2
+    assert results["chart_v2_path"].endswith("b_v2.png")
+
+
+def test_cambio_de_esquema_o_modelo_no_reutiliza(workflow_env):
+    main.run_workflow("Ventas por producto", "m1", "m2", image_basename="a")
+    assert main.run_workflow("Ventas por producto", "otro", "m2", image_basename="b")["memo"] is None
+
+    workflow_env["df"] = workflow_env["df"].assign(extra=1)
+    assert main.run_workflow("Ventas por producto", "m1", "m2", image_basename="c")["memo"] is None
+    assert workflow_env["llm_calls"] == 6
+
+
+def test_workflow_fallido_no_se_memoriza(workflow_env, monkeypatch):
+    monkeypatch.setattr(utils, "image_openai_call", lambda *a, **k: '{"feedback": "x"}\n<execute_python>raise ValueError</execute_python>')
+    assert main.run_workflow("Ventas", "m1", "m2")["status"] == "Error en V2"
+
+    fingerprint = data_processing.get_dataset_fingerprint(workflow_env["df"])
+    assert workflow_memo.load(workflow_memo.make_key("Ventas", "m1", "m2", fingerprint["schema"])) is None
+
+
+def test_huella_separa_esquema_y_contenido():
+    base = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+    same = data_processing.get_dataset_fingerprint(base.copy())
+    changed = data_processing.get_dataset_fingerprint(base.assign(a=[1, 3]))
+
+    assert same == data_processing.get_dataset_fingerprint(base)
+    assert changed["schema"] == same["schema"]
+    assert changed["content"] != same["content"]
+
+
+def _memo_for(state, instruction):
+    fingerprint = data_processing.get_dataset_fingerprint(state["df"])
+    key = workflow_memo.make_key(instruction, "m1", "m2", fingerprint["schema"])
+    return key, workflow_memo.load(key)
+
+
+def test_reejecucion_en_disco_reemplaza_los_graficos(workflow_env, monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "FIGURE_CAPTURE_ENABLED", False)
+    main.run_workflow("Ventas por producto", "m1", "m2", image_basename="a")
+    workflow_env["df"] = pd.DataFrame({"product": ["Latte", "Mocha"], "amount": [99.0, 1.0]})
+
+    results = main.run_workflow("Ventas por producto", "m1", "m2", image_basename="b")
+
+    assert results["memo"] == "code"
+    # Las rutas temporales de la re-ejecución no quedan en el directorio
+    assert sorted(os.listdir(tmp_path / "charts")) == ["a_v1.png", "a_v2.png", "b_v1.png", "b_v2.png"]
+
+
+def test_reejecucion_fallida_conserva_los_graficos(workflow_env, monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "FIGURE_CAPTURE_ENABLED", False)
+    first = main.run_workflow("Ventas por producto", "m1", "m2", image_basename="a")
+    before = open(first["chart_v2_path"], "rb").read()
+    key, memo = _memo_for(workflow_env, "Ventas por producto")
+    real_execute = main._execute
+    calls = []
+
+    def execute(code, *args):
+        # El V1 se re-ejecuta y el V2 falla
+        calls.append(code)
+        return real_execute(code, *args) if len(calls) == 1 else False
+
+    monkeypatch.setattr(main, "_execute", execute)
+    replayed = main._replay_memo(
+        memo, key, "otros-datos", workflow_env["df"], None, first["chart_v1_path"], first["chart_v2_path"], True,
+    )
+
+    assert replayed is None
+    assert open(first["chart_v2_path"], "rb").read() == before
+    assert sorted(os.listdir(tmp_path / "charts")) == ["a_v1.png", "a_v2.png"]
@@ -0,0 +1,174 @@
+import ast
+import io
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+import pytest
+from PIL import Image
+
+from src import config
+from src import executor
+from src import pyplot_state
+
+
+def _chart_code(width: int) -> str:
+    # Cada paso de pyplot usa la figura "actual": si los hilos la compartieran,
+    # un hilo guardaría la figura de otro (con otro tamaño)
+    return (
+        "<execute_python>\nimport matplotlib.pyplot as plt\n"
+        f"plt.figure(figsize=({width}, 2))\n"
+        "for i in range(30):\n    plt.plot(df['age'] + i)\n"
+        "plt.title('t')\n"
+        f"plt.savefig('chart_{width}.png', dpi=50)\n"
+        "plt.close()\n</execute_python>"
+    )
+
+
+def test_ejecuciones_en_paralelo_no_comparten_figura(df):
+    def run(width):
+        figures = {}
+        assert executor.extract_and_execute_code(_chart_code(width), df, figures=figures)
+        return width, Image.open(io.BytesIO(figures[f"chart_{width}.png"])).size
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(run, [2, 3, 4, 5, 6, 7, 8, 9] * 3))
+
+    assert all(size == (width * 50, 100) for width, size in results)
+
+
+def test_cada_hilo_ve_solo_sus_figuras():
+    barrier = threading.Barrier(2, timeout=5)
+    seen = {}
+
+    def run(name):
+        with pyplot_state.active():
+            fig = plt.figure()
+            barrier.wait()
+            seen[name] = (plt.gcf() is fig, plt.get_fignums())
+            barrier.wait()
+        seen[name] += (plt.get_fignums(),)
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Ambos hilos crean la figura 1, la ven como actual y al salir se cierra
+    assert seen == {"a": (True, [1], []), "b": (True, [1], [])}
+
+
+def test_mismos_rc_se_solapan():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def run():
+        with pyplot_state.active({"lines.linewidth": 3}):
+            # Si la compuerta serializara estos bloques, la barrera caducaría
+            barrier.wait()
+            return matplotlib.rcParams["lines.linewidth"]
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert list(pool.map(lambda _: run(), range(2))) == [3, 3]
+
+
+def test_codigo_que_cambia_rc_se_ejecuta_en_exclusiva():
+    inside = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def exclusive():
+        with pyplot_state.active({}, exclusive=True):
+            inside.set()
+            release.wait(5)
+            order.append("exclusive")
+
+    def shared():
+        inside.wait(5)
+        with pyplot_state.active({}):
+            order.append("shared")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(exclusive), pool.submit(shared)]
+        inside.wait(5)
+        release.set()
+        for future in futures:
+            future.result()
+
+    assert order == ["exclusive", "shared"]
+
+
+def test_los_rc_se_restauran_tras_cambiar_el_estilo(df):
+    facecolor = matplotlib.rcParams["axes.facecolor"]
+    code = (
+        "<execute_python>\nimport matplotlib.pyplot as plt\nplt.style.use('dark_background')\n"
+        "plt.plot(df['age'])\nplt.savefig('x.png')\n</execute_python>"
+    )
+
+    assert executor.extract_and_execute_code(code, df, figures={})
+    assert matplotlib.rcParams["axes.facecolor"] == facecolor
+
+
+def test_ejecuciones_con_el_mismo_estilo_se_solapan(df, monkeypatch):
+    code = (
+        "<execute_python>\nimport time\nimport matplotlib.pyplot as plt\nplt.style.use('ggplot')\n"
+        "time.sleep(0.5)\nplt.plot(df['age'])\nplt.savefig('x.png')\n</execute_python>"
+    )
+    facecolor = matplotlib.rcParams["axes.facecolor"]
+    enter = pyplot_state._gate.enter
+    inside = []
+
+    @contextmanager
+    def counting_enter(rc, exclusive=False):
+        with enter(rc, exclusive):
+            inside.append(pyplot_state._gate._active)
+            yield
+
+    monkeypatch.setattr(pyplot_state._gate, "enter", counting_enter)
+
+    def run(_):
+        figures = {}
+        assert executor.extract_and_execute_code(code, df, figures=figures)
+        return "x.png" in figures
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert list(pool.map(run, range(2))) == [True, True]
+
+    # En exclusiva nunca habría dos ejecuciones dentro de la compuerta
+    assert max(inside) == 2
+    assert matplotlib.rcParams["axes.facecolor"] == facecolor
+
+
+def test_el_estilo_se_aplica_antes_de_ejecutar():
+    rc = pyplot_state.style_rc(ast.parse("import matplotlib.pyplot as plt\nplt.style.use(['ggplot', 'bmh'])"))
+
+    assert rc["axes.facecolor"] == matplotlib.style.library["bmh"]["axes.facecolor"]
+    assert rc["axes.titlesize"] == matplotlib.style.library["ggplot"]["axes.titlesize"]
+
+
+@pytest.mark.parametrize(
+    ("code", "expected"),
+    [
+        ("plt.style.use('ggplot')", False),
+        ("from matplotlib import style\nstyle.use('ggplot')", False),
+        ("plt.style.use(name)", True),
+        ("plt.style.use('estilo_que_no_existe')", True),
+        ("if x:\n    plt.style.use('ggplot')", True),
+        ("plt.rcParams['font.size'] = 12", True),
+        ("matplotlib.rc('font', size=12)", True),
+        ("with plt.style.context('ggplot'):\n    pass", True),
+        ("plt.plot(df['x'])\nplt.savefig('a.png')", False),
+    ],
+)
+def test_deteccion_de_cambios_en_rc(code, expected):
+    assert pyplot_state.changes_rc(ast.parse(code)) is expected
+
+
+def test_sin_aislamiento_se_usa_el_estado_global(df, monkeypatch):
+    monkeypatch.setattr(config, "PYPLOT_THREAD_ISOLATION", False)
+    figures = {}
+
+    assert executor.extract_and_execute_code(_chart_code(3), df, figures=figures)
+    assert Image.open(io.BytesIO(figures["chart_3.png"])).size == (150, 100)
@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+from src import config
+from src import data_processing
+from src import shared_dataset
+from src.data_processing import load_configured_data, clear_data_cache
+
+pytestmark = pytest.mark.skipif(not shared_dataset.is_available(), reason="pyarrow no instalado")
+
+
+@pytest.fixture
+def shared_source(tmp_path, monkeypatch):
+    """CSV configurado con dataset compartido en un directorio temporal."""
+    csv_path = tmp_path / "ventas.csv"
+    csv_path.write_text("date,coffee_name,money\n2024-01-15,Latte,38.7\n2025-02-20,Mocha,33.5\n")
+    monkeypatch.setattr(config, "USE_MONGO_DB", False)
+    monkeypatch.setattr(config, "DATA_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "SHARED_DATASET_ENABLED", True)
+    monkeypatch.setattr(config, "SHARED_DATASET_DIR", tmp_path / "shared")
+    monkeypatch.setattr(config, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(config, "DATA_FILENAME", "ventas.csv")
+    _simular_nuevo_worker()
+    yield csv_path
+    _simular_nuevo_worker()
+
+
+def _simular_nuevo_worker():
+    """Olvida todo el estado de proceso, como un worker recién arrancado."""
+    clear_data_cache()
+    shared_dataset._mapped.update(dataset_version=None, df=None)
+
+
+def test_primer_worker_publica_y_usa_la_copia_mapeada(shared_source):
+    df = load_configured_data()
+
+    manifest = shared_dataset.read_manifest()
+    assert manifest["generation"] == 1
+    assert manifest["dataset_version"] == df.attrs["dataset_version"]
+    # Las columnas numéricas apuntan al archivo mapeado en modo solo lectura
+    assert not df["money"].to_numpy().flags.writeable
+
+
+def test_segundo_worker_mapea_sin_leer_la_fuente(shared_source, monkeypatch):
+    load_configured_data()
+    _simular_nuevo_worker()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("el segundo worker no debería leer el CSV")
+
+    monkeypatch.setattr(data_processing, "load_and_prepare_data", fail)
+    df = load_configured_data()
+
+    assert df["year"].tolist() == [2024, 2025]
+    assert df.attrs["logical_dtypes"]["year"] == "int32"
+
+
+def test_cambio_en_la_fuente_publica_una_nueva_generacion(shared_source):
+    version_1 = load_configured_data().attrs["dataset_version"]
+    shared_source.write_text("date,coffee_name,money\n2024-01-15,Latte,38.7\n")
+    stat = os.stat(shared_source)
+    os.utime(shared_source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    df = load_configured_data()
+
+    manifest = shared_dataset.read_manifest()
+    assert manifest["generation"] == 2
+    assert manifest["dataset_version"] != version_1
+    assert len(df) == 1
+    assert [p.name for p in (config.SHARED_DATASET_DIR).glob("dataset-*.arrow")] == [manifest["file"]]
+
+
+def test_otro_proceso_mapea_la_misma_generacion(shared_source):
+    version = load_configured_data().attrs["dataset_version"]
+
+    script = (
+        "from src import config, data_processing\n"
+        "from pathlib import Path\n"
+        f"config.SHARED_DATASET_ENABLED = True\n"
+        f"config.SHARED_DATASET_DIR = Path({str(config.SHARED_DATASET_DIR)!r})\n"
+        f"config.DATA_DIR = Path({str(config.DATA_DIR)!r})\n"
+        "config.DATA_FILENAME = 'ventas.csv'\n"
+        "data_processing.load_and_prepare_data = None\n"
+        "df = data_processing.load_configured_data()\n"
+        "print(df.attrs['dataset_version'], df['money'].to_numpy().flags.writeable)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True,
+        cwd=config.PROJECT_ROOT,
+    ).stdout.split()
+
+    assert output == [version, "False"]
+
+
+def test_sin_copy_on_write_cada_proceso_usa_su_copia(shared_source, monkeypatch):
+    monkeypatch.setattr(config, "DATAFRAME_COPY_ON_WRITE", False)
+
+    with pd.option_context("mode.copy_on_write", False):
+        df = load_configured_data()
+        # Sin mapeo de solo lectura, el código generado puede escribir en df
+        df.loc[0, "money"] = 0.0
+        df["money"] *= 2
+
+    assert shared_dataset.read_manifest() is None
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+from openai import OpenAI, AsyncOpenAI
+from PIL import Image
+
+from src import reflector
+from src import utils
+from src.utils import StreamingResponseParser
+
+CODE = "<execute_python>\nprint('hola')\n</execute_python>"
+
+
+# ---------- Tests para StreamingResponseParser ----------
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 1000])
+def test_parser_detecta_el_bloque_con_cualquier_troceado(size):
+    text = "Preambulo " + CODE + "\nresto"
+    parser = StreamingResponseParser()
+    events = []
+    for i in range(0, len(text), size):
+        events += parser.feed(text[i:i + size])
+
+    assert events == ["code"]
+    assert parser.code == CODE
+    assert parser.text[:parser.code_end].endswith("</execute_python>")
+
+
+def test_parser_entrega_feedback_en_cuanto_acaba_la_linea():
+    parser = StreamingResponseParser()
+
+    assert parser.feed('{"feedback": "Mejor ') == []
+    assert parser.feed('color"}\n<execute_python>') == ["feedback"]
+    assert parser.feedback == "Mejor color"
+    assert parser.feed("x = 1</execute_python>") == ["code"]
+
+
+def test_parser_ignora_primera_linea_que_no_es_json():
+    parser = StreamingResponseParser()
+    parser.feed("Aqui tienes el codigo:\n" + CODE)
+
+    assert parser.feedback is None
+    assert parser.code == CODE
+
+
+# ---------- Servidor local de streaming (API Responses por SSE) ----------
+
+class FakeStreamingServer:
+    """
+    Servidor HTTP local que responde a /v1/responses con eventos SSE
+    'response.output_text.delta'. `script` es una lista de fragmentos de texto,
+    de números (pausas en segundos) o de diccionarios (eventos tal cual, p. ej.
+    'response.failed'). Si hay `scripts`, cada petición consume el primero.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.scripts = []
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                server.requests += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                script = server.scripts.pop(0) if server.scripts else server.script
+                try:
+                    for n, item in enumerate(script):
+                        if isinstance(item, (int, float)):
+                            time.sleep(item)
+                            continue
+                        if isinstance(item, dict):
+                            event = {"sequence_number": n, **item}
+                        else:
+                            event = {"type": "response.output_text.delta", "delta": item, "item_id": "msg",
+                                     "output_index": 0, "content_index": 0, "sequence_number": n, "logprobs": []}
+                        self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # El cliente dejó de leer al cerrarse el bloque de código
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def stream_server(monkeypatch):
+    server = FakeStreamingServer()
+    monkeypatch.setattr(utils, "openai_client", OpenAI(api_key="test", base_url=server.base_url))
+    monkeypatch.setattr(utils, "openai_async_client", AsyncOpenAI(api_key="test", base_url=server.base_url))
+    yield server
+    server.close()
+
+
+def test_stream_response_vuelve_al_cerrarse_el_codigo(stream_server):
+    stream_server.script = ["<execute_", "python>\nx = 1\n</execute", "_python>", 2.0, "\nTexto que no se espera"]
+
+    start = time.perf_counter()
+    text = utils.stream_response("m", "prompt")
+
+    assert time.perf_counter() - start < 1.5
+    assert text == "<execute_python>\nx = 1\n</execute_python>"
+
+
+def test_respuesta_por_streaming_se_guarda_en_cache(stream_server):
+    stream_server.script = [CODE]
+    utils.stream_response("m", "prompt")
+    utils.stream_response("m", "prompt")
+
+    assert stream_server.requests == 1
+
+
+def _failed(code: str) -> dict:
+    return {"type": "response.failed",
+            "response": {"id": "r", "status": "failed", "error": {"code": code, "message": "fallo"}}}
+
+
+def test_stream_con_error_de_servidor_se_reintenta(stream_server, monkeypatch):
+    monkeypatch.setattr(utils.config, "LLM_RETRY_BASE_DELAY", 0)
+    stream_server.scripts = [["<execute_python>\nx = ", _failed("server_error")], [CODE]]
+
+    assert utils.stream_response("m", "prompt") == CODE
+    assert stream_server.requests == 2
+
+
+@pytest.mark.parametrize("event", [_failed("invalid_prompt"), {"type": "error", "code": "invalid_prompt", "message": "fallo"}])
+def test_stream_con_error_no_transitorio_lanza_y_no_se_guarda(stream_server, event):
+    stream_server.script = ["<execute_python>\nx = ", event]
+
+    for _ in range(2):
+        with pytest.raises(openai.APIError, match="invalid_prompt"):
+            utils.stream_response("m", "prompt")
+    assert stream_server.requests == 2
+
+
+def test_stream_incompleto_no_se_guarda_en_cache(stream_server):
+    stream_server.script = ["<execute_python>\nx = 1", {"type": "response.incomplete", "response": {"id": "r", "status": "incomplete"}}]
+
+    assert utils.stream_response("m", "prompt") == "<execute_python>\nx = 1"
+    utils.stream_response("m", "prompt")
+    assert stream_server.requests == 2
+
+
+def test_reflector_entrega_feedback_antes_que_el_codigo(stream_server, tmp_path):
+    chart = tmp_path / "v1.png"
+    Image.new("RGB", (4, 4)).save(chart)
+    stream_server.script = ['{"feedback": "Añade ', 'etiquetas"}\n', 0.6, CODE]
+    start = time.perf_counter()
+    seen = []
+
+    feedback, code = reflector.reflect_on_image_and_regenerate(
+        str(chart), "Ventas", "m", str(tmp_path / "v2.png"), CODE, "- a: int",
+        stream=True, on_feedback=lambda text: seen.append((text, time.perf_counter() - start)),
+    )
+
+    assert feedback == "Añade etiquetas"
+    assert code == CODE
+    assert seen[0][0] == "Añade etiquetas"
+    assert seen[0][1] < time.perf_counter() - start - 0.4
+    assert len(seen) == 1
+
+
+def test_stream_response_async(stream_server):
+    stream_server.script = ['{"feedback": "ok"}\n', CODE, 2.0, "cola"]
+    seen = []
+
+    start = time.perf_counter()
+    text = asyncio.run(utils.stream_response_async("m", "prompt", ("image/png", "aaaa"), seen.append))
+
+    assert time.perf_counter() - start < 1.5
+    assert seen == ["ok"]
+    assert text.endswith("</execute_python>")
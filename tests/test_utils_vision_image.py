@@ -0,0 +1,117 @@
+import base64
+import io
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pytest
+from PIL import Image
+
+from src import config
+from src import reflector
+from src import utils
+
+
+@pytest.fixture
+def chart(tmp_path):
+    """Gráfico PNG a 300 dpi como los que genera el workflow (1920x1440 px)."""
+    path = tmp_path / "v1.png"
+    fig, ax = plt.subplots()
+    ax.plot(range(50), [i * i for i in range(50)])
+    ax.set_title("Ventas por mes")
+    fig.savefig(path, dpi=300)
+    plt.close(fig)
+    return path
+
+
+def _decode(result):
+    return Image.open(io.BytesIO(base64.b64decode(result["b64"])))
+
+
+def test_imagen_se_reduce_y_recomprime_sin_tocar_el_original(chart):
+    original = chart.read_bytes()
+    result = utils.prepare_image_for_vision(str(chart), max_edge=1024, image_format="webp")
+
+    assert chart.read_bytes() == original
+    assert result["media_type"] == "image/webp"
+    assert _decode(result).size == (1024, 768) == (result["width"], result["height"])
+    assert result["original_bytes"] == len(original)
+    assert result["bytes_saved"] == len(original) - result["sent_bytes"] > 0
+
+
+def test_detalle_auto_elige_low_para_imagenes_pequenas(chart):
+    small = utils.prepare_image_for_vision(str(chart), max_edge=512, detail="auto")
+    large = utils.prepare_image_for_vision(str(chart), max_edge=1024, detail="auto")
+
+    assert small["detail"] == "low"
+    assert small["sent_tokens"] == utils.VISION_BASE_TOKENS
+    assert small["tokens_saved"] == small["original_tokens"] - utils.VISION_BASE_TOKENS > 0
+    assert large["detail"] == "high"
+
+
+def test_jpeg_aplana_la_transparencia(tmp_path):
+    path = tmp_path / "alpha.png"
+    Image.new("RGBA", (800, 600), (255, 0, 0, 0)).save(path)
+
+    result = utils.prepare_image_for_vision(str(path), max_edge=400, image_format="jpeg")
+
+    image = _decode(result)
+    assert result["media_type"] == "image/jpeg"
+    assert image.mode == "RGB" and image.size == (400, 300)
+    assert image.getpixel((10, 10))[1] > 240  # Fondo blanco, no negro
+
+
+def test_imagen_pequena_se_envia_tal_cual_si_recomprimir_no_compensa(tmp_path, monkeypatch):
+    path = tmp_path / "tiny.png"
+    Image.new("RGB", (4, 4)).save(path)
+    monkeypatch.setattr(config, "VISION_IMAGE_FORMAT", "png")
+
+    result = utils.prepare_image_for_vision(str(path))
+
+    assert base64.b64decode(result["b64"]) == path.read_bytes()
+    assert result["bytes_saved"] == 0
+
+
+def test_formato_no_soportado(chart):
+    with pytest.raises(ValueError):
+        utils.prepare_image_for_vision(str(chart), image_format="bmp")
+
+
+@pytest.mark.parametrize("size, detail, tokens", [
+    ((1920, 1440), "high", 85 + 170 * 4),  # Se reduce a 1024x768: 2x2 teselas
+    ((512, 512), "high", 85 + 170 * 1),
+    ((4096, 1024), "high", 85 + 170 * 4),  # 2048x512 (no se amplía): 4x1 teselas
+    ((1920, 1440), "low", 85),
+])
+def test_estimacion_de_tokens(size, detail, tokens):
+    assert utils.estimate_image_tokens(*size, detail=detail) == tokens
+
+
+def test_reflector_envia_la_imagen_reducida_e_informa(chart, monkeypatch):
+    sent = {}
+
+    def image_openai_call(model_name, prompt, media_type, b64, detail="auto"):
+        sent.update(media_type=media_type, b64=b64, detail=detail)
+        return '{"feedback": "Bien"}\n<execute_python>x = 1</execute_python>'
+
+    monkeypatch.setattr(utils, "image_openai_call", image_openai_call)
+    monkeypatch.setattr(config, "VISION_MAX_EDGE", 512)
+    info = {}
+
+    reflector.reflect_on_image_and_regenerate(
+        str(chart), "Ventas", "m", "v2.png", "codigo", "- a: int", image_info=info,
+    )
+
+    assert sent["detail"] == "low" == info["detail"]
+    assert max(_decode(sent).size) == 512
+    assert "b64" not in info and info["bytes_saved"] > 0
+
+
+def test_reflector_sin_preprocesado_envia_el_archivo(chart, monkeypatch):
+    sent = {}
+    monkeypatch.setattr(utils, "image_openai_call", lambda m, p, media_type, b64, detail="auto": sent.update(b64=b64) or "x")
+    monkeypatch.setattr(config, "VISION_PREPROCESS_ENABLED", False)
+
+    reflector.reflect_on_image_and_regenerate(str(chart), "Ventas", "m", "v2.png", "codigo", "- a: int")
+
+    assert base64.b64decode(sent["b64"]) == chart.read_bytes()